@@ -0,0 +1,494 @@
+"""
+In-process benchmark of every service endpoint.
+
+Each service app is built with ``create_app()`` and served through
+``httpx.ASGITransport``: no sockets, no uvicorn, so the numbers measure
+the application itself. Services calling each other (sales, reviews,
+analytics, auth) are routed in-process too. Databases are SQLite files
+seeded with ``--rows`` rows per main table and reused between runs from
+``--workdir``.
+
+    python profiling_scripts/benchmark_endpoints.py run --rows 100k --concurrency 1 8 32
+    python profiling_scripts/benchmark_endpoints.py compare baseline.json results.json
+
+``compare`` exits with status 1 when an endpoint's p50 or p99 latency grew,
+or its throughput dropped, by more than ``--threshold``.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+SEED = 42
+SEED_CHUNK = 10000
+BENCHMARK_PASSWORD = "benchmark-password"
+CATEGORIES = ("food", "clothes", "accessories", "electronics")
+# Module constants holding other services' base URLs, rewritten to in-process hosts
+SERVICE_URL_SETTINGS = {
+    "CUSTOMER_SERVICE_URL": "customer",
+    "INVENTORY_SERVICE_URL": "inventory",
+    "SALES_SERVICE_URL": "sales",
+}
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: Callable[[random.Random, int], str]
+    body: Optional[Callable[[random.Random, int], Any]] = None
+    form: bool = False
+
+
+def _user(rng: random.Random, rows: int) -> str:
+    return f"user{rng.randrange(rows)}"
+
+
+def _item(rng: random.Random, rows: int) -> int:
+    return rng.randrange(rows) + 1
+
+
+def seed_customer(module, rows: int, rng: random.Random):
+    from services.auth.auth_service import pwd_context
+
+    # One real hash: every login verifies the same user's password
+    password_hash = pwd_context.hash(BENCHMARK_PASSWORD)
+    _bulk_insert(module.database, module.Customer, rows, lambda i: {
+        "full_name": f"Customer {i}", "username": f"user{i}", "email": f"user{i}@example.com",
+        "password": password_hash if i == 0 else "x", "age": 18 + i % 60,
+        "wallet_balance": 1e9, "is_active": i % 10 != 9, "role": "customer", "preferences": {}
+    })
+    with Session(module.database.engine) as db:
+        module.reconcile_customer_aggregates(db)
+
+
+def seed_inventory(module, rows: int, rng: random.Random):
+    _bulk_insert(module.database, module.Item, rows, lambda i: {
+        "id": i + 1, "name": f"Item {i}", "category": CATEGORIES[i % len(CATEGORIES)],
+        "price": round(rng.uniform(1, 500), 2), "description": "Benchmark item", "stock_count": 10 ** 9
+    })
+
+
+def seed_sales(module, rows: int, rng: random.Random):
+    start = datetime.utcnow() - timedelta(days=90)
+    step = 90 * 86400 / rows
+
+    def purchase(i):
+        quantity, price = rng.randint(1, 5), round(rng.uniform(1, 500), 2)
+        return {
+            "customer_username": _user(rng, rows), "item_id": _item(rng, rows), "item_name": "Item",
+            "quantity": quantity, "price_per_item": price, "total_price": quantity * price,
+            "purchase_date": start + timedelta(seconds=i * step)
+        }
+    _bulk_insert(module.database, module.Purchase, rows, purchase)
+
+
+def seed_reviews(module, rows: int, rng: random.Random):
+    start = datetime.utcnow() - timedelta(days=365)
+    # ~20 reviews per item so product listings have several pages
+    items = max(rows // 20, 1)
+    _bulk_insert(module.database, module.Review, rows, lambda i: {
+        "item_id": rng.randrange(items) + 1, "customer_username": _user(rng, rows),
+        "rating": rng.randint(1, 5), "comment": "Benchmark review", "status": module.ReviewStatus.APPROVED,
+        "created_at": start + timedelta(seconds=i), "updated_at": start + timedelta(seconds=i)
+    })
+    with module.database.engine.begin() as conn:
+        module.rebuild_review_summaries(conn)
+
+
+def _bulk_insert(database, model, rows: int, make_row: Callable[[int], dict]):
+    with database.engine.begin() as conn:
+        for start in range(0, rows, SEED_CHUNK):
+            conn.execute(insert(model), [make_row(i) for i in range(start, min(start + SEED_CHUNK, rows))])
+
+
+SERVICES: Dict[str, dict] = {
+    "customer": {
+        "seed": seed_customer,
+        "depends_on": [],
+        "endpoints": [
+            Endpoint("GET /customers/{username}", "GET", lambda r, n: f"/customers/{_user(r, n)}"),
+            Endpoint("GET /customers/", "GET", lambda r, n: "/customers/?fields=username,wallet_balance"),
+            Endpoint("GET /customers/metrics", "GET", lambda r, n: "/customers/metrics"),
+            Endpoint("POST /customers/batch", "POST", lambda r, n: "/customers/batch",
+                     lambda r, n: {"usernames": [_user(r, n) for _ in range(50)]}),
+            Endpoint("POST /customers/{username}/charge", "POST",
+                     lambda r, n: f"/customers/{_user(r, n)}/charge?amount=1"),
+        ],
+    },
+    "inventory": {
+        "seed": seed_inventory,
+        "depends_on": [],
+        "endpoints": [
+            Endpoint("GET /items/{item_id}", "GET", lambda r, n: f"/items/{_item(r, n)}"),
+            Endpoint("GET /items/", "GET", lambda r, n: "/items/?fields=id,name,price"),
+            Endpoint("POST /items/{item_id}/add-stock", "POST",
+                     lambda r, n: f"/items/{_item(r, n)}/add-stock?quantity=1"),
+        ],
+    },
+    "sales": {
+        "seed": seed_sales,
+        "depends_on": ["customer", "inventory"],
+        "endpoints": [
+            Endpoint("GET /purchases/{customer_username}", "GET", lambda r, n: f"/purchases/{_user(r, n)}"),
+            Endpoint("GET /sales/feed", "GET", lambda r, n: f"/sales/feed?after_id={r.randrange(n)}&limit=1000"),
+            Endpoint("POST /sales/", "POST", lambda r, n: "/sales/",
+                     lambda r, n: {"customer_username": _user(r, n), "item_id": _item(r, n), "quantity": 1}),
+        ],
+    },
+    "reviews": {
+        "seed": seed_reviews,
+        "depends_on": ["customer", "inventory"],
+        "endpoints": [
+            Endpoint("GET /reviews/product/{item_id}", "GET",
+                     lambda r, n: f"/reviews/product/{r.randrange(max(n // 20, 1)) + 1}"),
+            Endpoint("GET /reviews/product/{item_id}/stats", "GET",
+                     lambda r, n: f"/reviews/product/{r.randrange(max(n // 20, 1)) + 1}/stats"),
+            Endpoint("GET /reviews/customer/{customer_username}", "GET",
+                     lambda r, n: f"/reviews/customer/{_user(r, n)}"),
+            Endpoint("GET /reviews/{review_id}", "GET", lambda r, n: f"/reviews/{r.randrange(n) + 1}"),
+            Endpoint("GET /reviews/stats", "GET", lambda r, n: "/reviews/stats?" + "&".join(
+                f"item_ids={r.randrange(max(n // 20, 1)) + 1}" for _ in range(50)
+            )),
+        ],
+    },
+    "analytics": {
+        "seed": None,
+        "depends_on": ["customer", "inventory", "sales"],
+        "endpoints": [
+            Endpoint("GET /analytics/dashboard", "GET", lambda r, n: "/analytics/dashboard?time_range=7d"),
+            Endpoint("GET /analytics/trends", "GET", lambda r, n: "/analytics/trends?metric=revenue&time_range=30d"),
+            Endpoint("GET /analytics/top-selling", "GET", lambda r, n: "/analytics/top-selling?time_range=30d"),
+            Endpoint("GET /analytics/active-customers", "GET",
+                     lambda r, n: "/analytics/active-customers?time_range=30d"),
+            Endpoint("GET /analytics/percentiles", "GET", lambda r, n: "/analytics/percentiles?time_range=30d"),
+        ],
+    },
+    "auth": {
+        "seed": None,
+        "depends_on": ["customer"],
+        "endpoints": [
+            Endpoint("GET /revocations", "GET", lambda r, n: "/revocations"),
+            Endpoint("POST /token", "POST", lambda r, n: "/token",
+                     lambda r, n: {"username": "user0", "password": BENCHMARK_PASSWORD}, form=True),
+        ],
+    },
+}
+
+
+def parse_rows(value: str) -> int:
+    """``"1000"``, ``"10k"`` or ``"1m"`` as a row count."""
+    match = re.fullmatch(r"(\d+)([km]?)", value.strip().lower())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"invalid row count: {value}")
+    return int(match.group(1)) * {"": 1, "k": 1000, "m": 1000000}[match.group(2)]
+
+
+def service_module(service: str):
+    return importlib.import_module(f"services.{service}.{service}_service")
+
+
+def required_services(services: List[str]) -> List[str]:
+    ordered = []
+
+    def visit(service):
+        for dependency in SERVICES[service]["depends_on"]:
+            visit(dependency)
+        if service not in ordered:
+            ordered.append(service)
+    for service in services:
+        visit(service)
+    return ordered
+
+
+@contextmanager
+def patched_modules(services: List[str], workdir: str):
+    """
+    Point each service module's database at ``workdir`` and its peer URLs
+    at in-process hosts, restoring everything afterwards.
+    """
+    saved = []
+    try:
+        for service in services:
+            module = service_module(service)
+            database = getattr(module, "database", None)
+            if database is not None:
+                saved.append((database, {
+                    name: getattr(database, name) for name in ("url", "_engine", "_sessionmaker", "_schema_ready")
+                }))
+                database.url = f"sqlite:///{os.path.join(workdir, service)}.db"
+                database._engine, database._sessionmaker, database._schema_ready = None, None, False
+            for setting, host in SERVICE_URL_SETTINGS.items():
+                if hasattr(module, setting):
+                    saved.append((module, {setting: getattr(module, setting)}))
+                    setattr(module, setting, f"http://{host}")
+        yield
+    finally:
+        for target, values in reversed(saved):
+            if getattr(target, "_engine", None) is not None and "_engine" in values:
+                target.dispose()
+            for name, value in values.items():
+                setattr(target, name, value)
+
+
+def seed_databases(services: List[str], rows: int, workdir: str):
+    """Seed each service database once per ``rows``; reruns reuse the files."""
+    manifest_path = os.path.join(workdir, "seed.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    for service in services:
+        seed = SERVICES[service]["seed"]
+        if seed is None or manifest.get(service) == rows:
+            continue
+        module = service_module(service)
+        db_path = os.path.join(workdir, f"{service}.db")
+        module.database.dispose()
+        module.database._engine, module.database._sessionmaker = None, None
+        module.database._schema_ready = False
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        started = time.perf_counter()
+        module.database.ensure_schema()
+        seed(module, rows, random.Random(SEED))
+        print(f"seeded {service} with {rows} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        manifest[service] = rows
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+
+
+class InProcessNetwork(httpx.AsyncBaseTransport):
+    """Dispatches requests by host name to in-process ASGI apps."""
+
+    def __init__(self, apps: Dict[str, Any]):
+        self.transports = {
+            host: httpx.ASGITransport(app=app, raise_app_exceptions=False) for host, app in apps.items()
+        }
+
+    async def handle_async_request(self, request):
+        transport = self.transports.get(request.url.host)
+        if transport is None:
+            raise httpx.ConnectError(f"No in-process service for {request.url.host}", request=request)
+        return await transport.handle_async_request(request)
+
+
+@contextmanager
+def in_process_network(apps: Dict[str, Any]):
+    """Make every ``httpx.AsyncClient`` without an explicit transport use ``InProcessNetwork``."""
+    network = InProcessNetwork(apps)
+    original_init = httpx.AsyncClient.__init__
+
+    def init(self, *args, **kwargs):
+        kwargs.setdefault("transport", network)
+        original_init(self, *args, **kwargs)
+
+    httpx.AsyncClient.__init__ = init
+    try:
+        yield network
+    finally:
+        httpx.AsyncClient.__init__ = original_init
+
+
+def summarise(latencies: List[float]) -> dict:
+    ordered = sorted(latencies)
+
+    def percentile(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 3)
+
+    return {
+        "mean": round(statistics.fmean(ordered) * 1000, 3),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def measure(client: httpx.AsyncClient, endpoint: Endpoint, rows: int, concurrency: int,
+                  requests: int, warmup: int) -> dict:
+    rng = random.Random(SEED)
+
+    async def send():
+        kwargs = {}
+        if endpoint.body is not None:
+            kwargs["data" if endpoint.form else "json"] = endpoint.body(rng, rows)
+        started = time.perf_counter()
+        response = await client.request(endpoint.method, endpoint.path(rng, rows), **kwargs)
+        return time.perf_counter() - started, response.status_code
+
+    for _ in range(warmup):
+        await send()
+
+    latencies, statuses = [], {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            latency, status = await send()
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": summarise(latencies),
+    }
+
+
+async def run_benchmarks(services: List[str], rows: int, concurrency_levels: List[int], requests: int,
+                         warmup: int, workdir: str, endpoint_filter: Optional[str] = None) -> List[dict]:
+    booted = required_services(services)
+    results = []
+    with patched_modules(booted, workdir):
+        seed_databases(booted, rows, workdir)
+        apps = {service: service_module(service).create_app() for service in booted}
+        async with AsyncExitStack() as stack:
+            for app in apps.values():
+                await stack.enter_async_context(app.router.lifespan_context(app))
+            with in_process_network(apps):
+                for service in services:
+                    # Unhandled errors become 500s and are counted, rather than aborting the run
+                    transport = httpx.ASGITransport(app=apps[service], raise_app_exceptions=False)
+                    async with httpx.AsyncClient(transport=transport, base_url=f"http://{service}") as client:
+                        for endpoint in SERVICES[service]["endpoints"]:
+                            if endpoint_filter and not re.search(endpoint_filter, endpoint.name):
+                                continue
+                            for concurrency in concurrency_levels:
+                                result = await measure(client, endpoint, rows, concurrency, requests, warmup)
+                                results.append({"service": service, "endpoint": endpoint.name, **result})
+                                print_result(results[-1])
+    return results
+
+
+def print_result(result: dict):
+    latency = result["latency_ms"]
+    print(f"{result['service']:<10}{result['endpoint']:<42}{result['concurrency']:>5}"
+          f"{result['throughput_rps']:>10.1f}{latency['p50']:>10.2f}{latency['p99']:>10.2f}"
+          f"{result['errors']:>8}", flush=True)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> List[dict]:
+    """Rows of the two runs side by side; ``regressed`` marks changes past ``threshold``."""
+    def key(result):
+        return result["service"], result["endpoint"], result["concurrency"]
+
+    base = {key(result): result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = base.get(key(result))
+        if before is None:
+            continue
+        changes = {
+            "p50": result["latency_ms"]["p50"] / max(before["latency_ms"]["p50"], 1e-9) - 1,
+            "p99": result["latency_ms"]["p99"] / max(before["latency_ms"]["p99"], 1e-9) - 1,
+            "throughput": result["throughput_rps"] / max(before["throughput_rps"], 1e-9) - 1,
+        }
+        rows.append({
+            "service": result["service"], "endpoint": result["endpoint"], "concurrency": result["concurrency"],
+            "changes": {name: round(change, 4) for name, change in changes.items()},
+            "regressed": (changes["p50"] > threshold or changes["p99"] > threshold
+                          or changes["throughput"] < -threshold
+                          or result["errors"] > before["errors"]),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark service endpoints in-process")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="benchmark endpoints and write results as JSON")
+    run.add_argument("services", nargs="*", default=list(SERVICES))
+    run.add_argument("--rows", type=parse_rows, default=parse_rows("10k"),
+                     help="rows per seeded table, e.g. 1k, 100k or 1m")
+    run.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    run.add_argument("--requests", type=int, default=200, help="measured requests per level")
+    run.add_argument("--warmup", type=int, default=20)
+    run.add_argument("--endpoints", help="only endpoints whose name matches this regex")
+    run.add_argument("--workdir", default=os.path.join(project_root, "profiling_results", "benchmark_db"),
+                     help="where seeded databases are kept between runs")
+    run.add_argument("--output", help="results file (default profiling_results/benchmark_<rows>.json)")
+
+    compare = commands.add_parser("compare", help="flag regressions against a baseline run")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.10,
+                         help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare_results(baseline, current, args.threshold)
+        print(f"{'service':<10}{'endpoint':<42}{'conc':>5}{'p50':>9}{'p99':>9}{'rps':>9}")
+        for row in rows:
+            changes = row["changes"]
+            print(f"{row['service']:<10}{row['endpoint']:<42}{row['concurrency']:>5}"
+                  f"{changes['p50']:>+9.1%}{changes['p99']:>+9.1%}{changes['throughput']:>+9.1%}"
+                  f"{'  REGRESSION' if row['regressed'] else ''}")
+        sys.exit(1 if any(row["regressed"] for row in rows) else 0)
+
+    unknown = set(args.services) - set(SERVICES)
+    if unknown:
+        parser.error(f"unknown services: {', '.join(sorted(unknown))}")
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"{'service':<10}{'endpoint':<42}{'conc':>5}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    results = asyncio.run(run_benchmarks(
+        args.services, args.rows, args.concurrency, args.requests, args.warmup, args.workdir, args.endpoints
+    ))
+    output = args.output or os.path.join(project_root, "profiling_results", f"benchmark_{args.rows}.json")
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "rows": args.rows, "requests": args.requests, "concurrency": args.concurrency,
+                "revision": git_revision(), "python": platform.python_version(),
+                "platform": platform.platform(), "created_at": datetime.utcnow().isoformat()
+            },
+            "results": results
+        }, f, indent=2)
+    print(f"wrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
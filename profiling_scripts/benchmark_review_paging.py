@@ -0,0 +1,95 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from services.reviews.reviews_service import (
+    Base, Review, ReviewSort, ReviewStatus, encode_cursor, paginate_reviews
+)
+
+ITEM_ID = 1
+
+
+def seed(session, reviews: int):
+    start = datetime(2024, 1, 1)
+    rng = random.Random(42)
+    session.bulk_insert_mappings(Review, [
+        {
+            "item_id": ITEM_ID,
+            "customer_username": f"customer{i % 1000}",
+            "rating": rng.randint(1, 5),
+            "comment": "Benchmark review",
+            "status": ReviewStatus.APPROVED,
+            "created_at": start + timedelta(seconds=i)
+        }
+        for i in range(reviews)
+    ])
+    session.commit()
+
+
+def base_query(session):
+    return session.query(Review).filter(
+        Review.item_id == ITEM_ID, Review.status == ReviewStatus.APPROVED
+    )
+
+
+def time_call(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare keyset and OFFSET paging of product reviews")
+    parser.add_argument("--reviews", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sort", choices=[s.value for s in ReviewSort], default="created_at")
+    args = parser.parse_args()
+    sort = ReviewSort(args.sort)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{workdir}/reviews.db")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        seed(session, args.reviews)
+
+        # Find the cursor at each depth by walking the sort order once.
+        column = Review.created_at if sort == ReviewSort.CREATED_AT else Review.rating
+        ordered = base_query(session).order_by(column.desc(), Review.id.desc())
+        depths = [0, args.reviews // 10, args.reviews // 2, args.reviews - args.page_size - 1]
+
+        print(f"{'offset':>10}{'OFFSET ms':>12}{'keyset ms':>12}")
+        for depth in depths:
+            cursor = encode_cursor(sort, ordered.offset(depth).first()) if depth else None
+            offset_ms = time_call(
+                lambda: ordered.offset(depth + 1 if depth else 0).limit(args.page_size).all(),
+                args.repeat
+            )
+            keyset_ms = time_call(
+                lambda: paginate_reviews(base_query(session), sort, cursor, args.page_size, Response()),
+                args.repeat
+            )
+            print(f"{depth:>10}{offset_ms:>12.2f}{keyset_ms:>12.2f}")
+
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from services.reviews.scoring import ScoringConfig, score_comments
+
+WORDS = (
+    "great quality fast shipping love it works fine broke after week would buy again "
+    "terrible battery comfortable fits perfectly colour faded cheap price value"
+).split()
+SPAM = ["scam", "casino", "http://deals.example", "www.win.example", "CLICK", "NOW"]
+
+
+def make_comments(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    comments = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(5, 60))
+        if rng.random() < 0.2:
+            words += rng.choices(SPAM, k=rng.randint(1, 6))
+        comments.append(" ".join(words))
+    return comments
+
+
+def measure_serial(comments, batch_size: int, config: dict) -> float:
+    t0 = time.perf_counter()
+    for i in range(0, len(comments), batch_size):
+        score_comments(comments[i:i + batch_size], config)
+    return len(comments) / (time.perf_counter() - t0)
+
+
+def measure_pool(comments, batch_size: int, workers: int, config: dict) -> float:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pool.submit(score_comments, comments[:1], config).result()  # warm the workers
+        t0 = time.perf_counter()
+        futures = [
+            pool.submit(score_comments, comments[i:i + batch_size], config)
+            for i in range(0, len(comments), batch_size)
+        ]
+        for future in futures:
+            future.result()
+        return len(comments) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure review scoring throughput")
+    parser.add_argument("--comments", type=int, default=50000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 50, 200, 1000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    comments = make_comments(args.comments)
+    config = ScoringConfig().to_dict()
+    print(f"{'batch':>8}{'serial/s':>14}{f'pool({args.workers})/s':>14}")
+    for batch_size in args.batch_sizes:
+        serial = measure_serial(comments, batch_size, config)
+        pooled = measure_pool(comments, batch_size, args.workers, config)
+        print(f"{batch_size:>8}{serial:>14.0f}{pooled:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
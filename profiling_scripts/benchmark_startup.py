@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+SERVICES = ["customer", "inventory", "sales", "reviews", "analytics", "auth"]
+
+# Runs in a fresh interpreter so every sample is a true cold start.
+PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+module = __import__("services.{service}.{service}_service", fromlist=["create_app"])
+t1 = time.perf_counter()
+app = module.create_app()
+t2 = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+t3 = asyncio.run(startup())
+print(json.dumps({{"import": t1 - t0, "create_app": t2 - t1, "lifespan": t3 - t2}}))
+"""
+
+
+def measure_service(service: str, runs: int, warm_db: bool) -> dict:
+    """Time import, app construction and lifespan startup over ``runs`` cold starts."""
+    samples = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PYTHONPATH=project_root)
+        for run in range(runs + (1 if warm_db else 0)):
+            result = subprocess.run(
+                [sys.executable, "-c", PROBE.format(service=service)],
+                cwd=workdir, env=env, capture_output=True, text=True, check=True
+            )
+            if warm_db and run == 0:
+                # First start creates the schema; steady-state respawns don't.
+                continue
+            samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    return {
+        phase: {
+            "median_ms": statistics.median(s[phase] for s in samples) * 1000,
+            "max_ms": max(s[phase] for s in samples) * 1000
+        }
+        for phase in ("import", "create_app", "lifespan")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of each service")
+    parser.add_argument("services", nargs="*", default=SERVICES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold-db", action="store_true",
+                        help="include the first start against an empty database")
+    parser.add_argument("--json", dest="json_output", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'service':<12}{'import':>12}{'create_app':>12}{'lifespan':>12}   (median ms)")
+    for service in args.services:
+        results[service] = measure_service(service, args.runs, warm_db=not args.cold_db)
+        row = results[service]
+        print(f"{service:<12}"
+              f"{row['import']['median_ms']:>12.1f}"
+              f"{row['create_app']['median_ms']:>12.1f}"
+              f"{row['lifespan']['median_ms']:>12.1f}")
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Assemble end-to-end traces from several services' NDJSON span exports.
+
+Each service keeps only its own spans, so ``/admin/traces/{trace_id}`` on
+sales stops at the client span calling inventory. Pointing every service's
+``TRACE_EXPORT_PATH`` at its own file and merging those files by trace id
+gives the whole trace and its critical path across services.
+
+    python profiling_scripts/merge_traces.py traces/*.ndjson
+    python profiling_scripts/merge_traces.py traces/*.ndjson --trace <trace_id>
+
+Without ``--trace`` the slowest traces are listed; with it, the trace's
+spans and critical path are printed as JSON.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Dict, Iterable, List
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from utils.tracing import critical_path, trace_summaries
+
+logger = logging.getLogger(__name__)
+
+
+def load_spans(paths: Iterable[str]) -> Dict[str, List[dict]]:
+    """Spans from every file, grouped by trace id and sorted by start time."""
+    traces: Dict[str, List[dict]] = {}
+    seen = set()
+    for path in paths:
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    # A service may still be writing its last line
+                    logger.warning("Skipping malformed span at %s:%d", path, number)
+                    continue
+                if (span["trace_id"], span["span_id"]) in seen:
+                    continue
+                seen.add((span["trace_id"], span["span_id"]))
+                traces.setdefault(span["trace_id"], []).append(span)
+    for spans in traces.values():
+        spans.sort(key=lambda span: span["start_time"])
+    return traces
+
+
+def assemble_trace(traces: Dict[str, List[dict]], trace_id: str) -> dict:
+    spans = traces.get(trace_id, [])
+    return {
+        "trace_id": trace_id,
+        "services": sorted({span["service"] for span in spans if span["service"]}),
+        "spans": spans,
+        "critical_path": critical_path(spans)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge services' NDJSON span files into whole traces")
+    parser.add_argument("files", nargs="+", help="NDJSON files written through TRACE_EXPORT_PATH")
+    parser.add_argument("--trace", help="print this trace's spans and critical path as JSON")
+    parser.add_argument("--limit", type=int, default=20, help="traces to list without --trace")
+    args = parser.parse_args()
+
+    traces = load_spans(args.files)
+    if args.trace:
+        if args.trace not in traces:
+            parser.error(f"trace {args.trace} not found")
+        print(json.dumps(assemble_trace(traces, args.trace), indent=2))
+        return
+
+    spans = (span for trace in traces.values() for span in trace)
+    print(f"{'trace_id':<34}{'ms':>10}  name")
+    for summary in trace_summaries(spans, args.limit):
+        print(f"{summary['trace_id']:<34}{summary['duration_ms']:>10.1f}  {summary['name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+def to_epoch_seconds(timestamps: Sequence) -> np.ndarray:
+    """Convert ISO strings or naive UTC datetimes to int64 epoch seconds."""
+    return np.array(timestamps, dtype="datetime64[us]").astype("datetime64[s]").astype(np.int64)
+
+
+def from_epoch_seconds(seconds: int) -> datetime:
+    return datetime.utcfromtimestamp(int(seconds))
+
+
+class PurchaseFactStore:
+    """
+    Append-only, in-memory columnar store of purchase facts.
+
+    Each fact (timestamp, item, customer, quantity, amount) lives in parallel
+    NumPy arrays kept sorted by timestamp, so a time range is two binary
+    searches. Running prefix sums of amount and quantity make range totals
+    O(1); per-bucket aggregates are single ``bincount`` calls over the range
+    slice. Customer usernames are interned to integer codes.
+
+    Not thread-safe: load and query it from the event loop thread.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.size = 0
+        self.last_id = 0
+        self._customer_codes: Dict[str, int] = {}
+        self.customers: List[str] = []
+        # Id of each customer's first purchase, indexed by customer code
+        self._first_purchase_ids: List[int] = []
+        self._allocate(initial_capacity)
+
+    def _allocate(self, capacity: int):
+        def grow(name, dtype, extra=0):
+            array = np.zeros(capacity + extra, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                array[:len(old)] = old
+            setattr(self, name, array)
+
+        grow("timestamps", np.int64)
+        grow("item_ids", np.int64)
+        grow("customer_ids", np.int32)
+        grow("quantities", np.int64)
+        grow("amounts", np.float64)
+        # cum_*[i] is the total over facts [0, i)
+        grow("cum_amounts", np.float64, extra=1)
+        grow("cum_quantities", np.int64, extra=1)
+        self.capacity = capacity
+
+    def _customer_code(self, username: str, purchase_id: int) -> int:
+        code = self._customer_codes.get(username)
+        if code is None:
+            code = self._customer_codes[username] = len(self.customers)
+            self.customers.append(username)
+            self._first_purchase_ids.append(purchase_id)
+        return code
+
+    def is_first_purchase(self, username: str, purchase_id: int) -> bool:
+        """Whether ``purchase_id`` is the earliest purchase seen for ``username``."""
+        code = self._customer_codes.get(username)
+        return code is not None and self._first_purchase_ids[code] == purchase_id
+
+    def append(self, rows: Sequence[dict]) -> int:
+        """
+        Add purchase rows as served by the sales feed (``id``,
+        ``purchase_date``, ``customer_username``, ``item_id``, ``quantity``,
+        ``total_price``). Rows at or below ``last_id`` are ignored, so
+        overlapping pages are harmless. Returns the number of facts added.
+        """
+        rows = [row for row in rows if row["id"] > self.last_id]
+        if not rows:
+            return 0
+
+        n = len(rows)
+        timestamps = to_epoch_seconds([row["purchase_date"] for row in rows])
+        order = np.argsort(timestamps, kind="stable")
+        columns = {
+            "timestamps": timestamps[order],
+            "item_ids": np.array([row["item_id"] for row in rows], dtype=np.int64)[order],
+            "customer_ids": np.array(
+                [self._customer_code(row["customer_username"], row["id"]) for row in rows],
+                dtype=np.int32
+            )[order],
+            "quantities": np.array([row["quantity"] or 0 for row in rows], dtype=np.int64)[order],
+            "amounts": np.array([row["total_price"] or 0.0 for row in rows], dtype=np.float64)[order],
+        }
+
+        if self.size + n > self.capacity:
+            self._allocate(max(self.capacity * 2, self.size + n))
+
+        start, end = self.size, self.size + n
+        for name, values in columns.items():
+            getattr(self, name)[start:end] = values
+        self.size = end
+        self.last_id = max(row["id"] for row in rows)
+
+        if start and columns["timestamps"][0] < self.timestamps[start - 1]:
+            # Late-arriving facts: restore timestamp order over everything.
+            self._resort()
+        else:
+            self._update_prefix_sums(start)
+        return n
+
+    def _resort(self):
+        order = np.argsort(self.timestamps[:self.size], kind="stable")
+        for name in ("timestamps", "item_ids", "customer_ids", "quantities", "amounts"):
+            column = getattr(self, name)
+            column[:self.size] = column[:self.size][order]
+        self._update_prefix_sums(0)
+
+    def _update_prefix_sums(self, start: int):
+        end = self.size
+        self.cum_amounts[start + 1:end + 1] = self.cum_amounts[start] + np.cumsum(self.amounts[start:end])
+        self.cum_quantities[start + 1:end + 1] = (
+            self.cum_quantities[start] + np.cumsum(self.quantities[start:end])
+        )
+
+    def range_slice(self, start: datetime, end: datetime) -> slice:
+        """Index range of facts with ``start <= timestamp < end``."""
+        timestamps = self.timestamps[:self.size]
+        lo, hi = np.searchsorted(timestamps, to_epoch_seconds([start, end]))
+        return slice(int(lo), int(hi))
+
+    def summary(self, start: datetime, end: datetime) -> dict:
+        window = self.range_slice(start, end)
+        orders = window.stop - window.start
+        revenue = float(self.cum_amounts[window.stop] - self.cum_amounts[window.start])
+        return {
+            "total_revenue": revenue,
+            "total_orders": orders,
+            "total_units": int(self.cum_quantities[window.stop] - self.cum_quantities[window.start]),
+            "average_order_value": revenue / orders if orders else 0.0
+        }
@@ -0,0 +1,200 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.analytics.fact_store import to_epoch_seconds
+from services.analytics.rollups import BUCKET_SECONDS, bucket_starts
+
+_HEADER = np.dtype([("capacity", "<i8"), ("total", "<i8")])
+_ENTRY = np.dtype([("item", "<i8"), ("count", "<i8"), ("error", "<i8")])
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters summary (Metwally et al.) of units per item.
+
+    At most ``capacity`` items are tracked. When a new item arrives while
+    the summary is full, it replaces the item with the smallest count and
+    inherits that count as its ``error``. For a summary of ``total`` units:
+
+    * every estimate overcounts by at most its ``error`` and
+      ``error <= total / capacity``, so ``count - error`` is a guaranteed
+      lower bound on the true units;
+    * every item with more than ``total / capacity`` true units is tracked.
+
+    Summaries merge (``merge``) with the same guarantees over the combined
+    total, so per-window or per-worker summaries can be combined freely.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[int, int] = {}
+        self.errors: Dict[int, int] = {}
+
+    def add(self, item: int, weight: int = 1):
+        self.total += weight
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+        else:
+            evicted = min(self.counts, key=self.counts.__getitem__)
+            floor = self.counts.pop(evicted)
+            del self.errors[evicted]
+            self.counts[item] = floor + weight
+            self.errors[item] = floor
+
+    @property
+    def floor(self) -> int:
+        """Upper bound on the true count of any untracked item."""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def top(self, k: int) -> List[dict]:
+        ranked = sorted(self.counts.items(), key=lambda entry: (-entry[1], entry[0]))[:k]
+        return [
+            {"item_id": item, "units_sold": count, "max_overcount": self.errors[item]}
+            for item, count in ranked
+        ]
+
+    @classmethod
+    def merge(cls, summaries: Sequence["SpaceSaving"], capacity: Optional[int] = None) -> "SpaceSaving":
+        """
+        Combine summaries into one of ``capacity`` items (default: the
+        largest input capacity). An item missing from a full summary may
+        still have up to that summary's ``floor`` units there, so the floor
+        is added to both its count and its error.
+        """
+        capacity = capacity or max((s.capacity for s in summaries), default=256)
+        merged = cls(capacity)
+        merged.total = sum(s.total for s in summaries)
+        summaries = [s for s in summaries if s.counts]
+        if not summaries:
+            return merged
+
+        floors = [s.floor for s in summaries]
+        items = np.concatenate([np.fromiter(s.counts, dtype=np.int64) for s in summaries])
+        counts = np.concatenate([np.fromiter(s.counts.values(), dtype=np.int64) for s in summaries])
+        errors = np.concatenate([
+            np.fromiter((s.errors[item] for item in s.counts), dtype=np.int64) for s in summaries
+        ])
+        entry_floors = np.repeat(floors, [len(s.counts) for s in summaries])
+
+        unique, inverse = np.unique(items, return_inverse=True)
+        missing_floor = sum(floors) - np.bincount(inverse, weights=entry_floors)
+        merged_counts = np.bincount(inverse, weights=counts) + missing_floor
+        merged_errors = np.bincount(inverse, weights=errors) + missing_floor
+
+        keep = np.argsort(-merged_counts, kind="stable")[:capacity]
+        merged.counts = dict(zip(unique[keep].tolist(), merged_counts[keep].astype(np.int64).tolist()))
+        merged.errors = dict(zip(unique[keep].tolist(), merged_errors[keep].astype(np.int64).tolist()))
+        return merged
+
+    def to_bytes(self) -> bytes:
+        entries = np.array(
+            [(item, count, self.errors[item]) for item, count in self.counts.items()], dtype=_ENTRY
+        )
+        return np.array([(self.capacity, self.total)], dtype=_HEADER).tobytes() + entries.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SpaceSaving":
+        header = np.frombuffer(data[:_HEADER.itemsize], dtype=_HEADER)[0]
+        entries = np.frombuffer(data[_HEADER.itemsize:], dtype=_ENTRY)
+        summary = cls(int(header["capacity"]))
+        summary.total = int(header["total"])
+        summary.counts = dict(zip(entries["item"].tolist(), entries["count"].tolist()))
+        summary.errors = dict(zip(entries["item"].tolist(), entries["error"].tolist()))
+        return summary
+
+
+class WindowedHeavyHitters:
+    """
+    Space-Saving summaries of units sold per item, one per hour and per day.
+
+    ``add_rows`` folds sales feed rows into their windows and marks them
+    dirty for the next persist. ``top`` answers a range query by merging the
+    day windows fully inside the range with hour windows at its edges, so a
+    30-day query merges about 30 + 48 summaries. Ranges are widened to whole
+    hours; edges older than ``hour_retention`` seconds use whole days.
+    """
+
+    RESOLUTIONS = ("hour", "day")
+
+    def __init__(self, capacity: int = 256, hour_retention: int = 7 * 86400):
+        self.capacity = capacity
+        self.hour_retention = hour_retention
+        self.windows: Dict[Tuple[str, int], SpaceSaving] = {}
+        self.dirty: set = set()
+        self.last_id = 0
+
+    def add_rows(self, rows: Sequence[dict]):
+        rows = [row for row in rows if row["id"] > self.last_id]
+        if not rows:
+            return
+        seconds = to_epoch_seconds([row["purchase_date"] for row in rows])
+        items = np.array([row["item_id"] for row in rows], dtype=np.int64)
+        units = np.array([row["quantity"] or 0 for row in rows], dtype=np.int64)
+        for resolution in self.RESOLUTIONS:
+            # Pre-aggregate per (window, item) so each summary sees one update per item
+            keys, inverse = np.unique(
+                np.stack([bucket_starts(resolution, seconds), items], axis=1),
+                axis=0, return_inverse=True
+            )
+            totals = np.bincount(inverse.ravel(), weights=units, minlength=len(keys))
+            for (window, item), weight in zip(keys.tolist(), totals.astype(np.int64).tolist()):
+                key = (resolution, window)
+                summary = self.windows.get(key)
+                if summary is None:
+                    summary = self.windows[key] = SpaceSaving(self.capacity)
+                summary.add(item, weight)
+                self.dirty.add(key)
+        self.last_id = max(row["id"] for row in rows)
+
+    def load(self, records: Iterable[Tuple[str, int, bytes]]):
+        for resolution, window, data in records:
+            self.windows[(resolution, window)] = SpaceSaving.from_bytes(data)
+
+    def take_dirty(self) -> List[Tuple[str, int, bytes]]:
+        dirty = [(key[0], key[1], self.windows[key].to_bytes()) for key in self.dirty if key in self.windows]
+        self.dirty = set()
+        return dirty
+
+    def prune(self, cutoffs: Dict[str, int]):
+        """Forget windows starting before ``cutoffs[resolution]`` (epoch seconds)."""
+        for key in [key for key in self.windows if key[0] in cutoffs and key[1] < cutoffs[key[0]]]:
+            del self.windows[key]
+            self.dirty.discard(key)
+
+    def plan_windows(self, start: int, end: int, now: int) -> List[Tuple[str, int]]:
+        hour, day = BUCKET_SECONDS["hour"], BUCKET_SECONDS["day"]
+        first_hour = start // hour * hour
+        end_hour = -(-end // hour) * hour
+        first_day = -(-first_hour // day) * day
+        end_day = end_hour // day * day
+        oldest_hour = (now - self.hour_retention) // hour * hour
+
+        windows = []
+        if first_day < end_day:
+            edges = list(range(first_hour, first_day, hour)) + list(range(end_day, end_hour, hour))
+            windows += [("day", d) for d in range(first_day, end_day, day)]
+        else:
+            edges = list(range(first_hour, end_hour, hour))
+        for h in edges:
+            key = ("hour", h) if h >= oldest_hour else ("day", h // day * day)
+            if key not in windows:
+                windows.append(key)
+        return windows
+
+    def top(self, start: int, end: int, now: int, k: int) -> dict:
+        summaries = [
+            self.windows[key] for key in self.plan_windows(start, end, now) if key in self.windows
+        ]
+        merged = SpaceSaving.merge(summaries, self.capacity)
+        return {
+            "items": merged.top(k),
+            "total_units": merged.total,
+            # No item outside "items" can have sold more than this
+            "max_untracked_units": merged.floor,
+            "error_bound": merged.total // self.capacity
+        }
@@ -0,0 +1,128 @@
+import math
+from typing import Optional, Sequence
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Bins kept per sketch; with 1% accuracy that spans values over 17 orders of
+# magnitude before the lowest bins are collapsed together.
+MAX_BINS = 2048
+# Values at or below this (including zero and missing prices) land in the zero bin
+MIN_INDEXABLE_VALUE = 1e-9
+
+_HEADER = np.dtype([
+    ("relative_accuracy", "<f8"), ("count", "<i8"), ("zero_count", "<i8"), ("sum", "<f8"),
+    ("min", "<f8"), ("max", "<f8"), ("offset", "<i4"), ("bin_width", "<i4")
+])
+
+
+class DDSketch:
+    """
+    DDSketch quantile summary (Masson et al.) with relative-error guarantees.
+
+    Positive values go to logarithmic bins ``(gamma ** (k - 1), gamma ** k]``
+    with ``gamma = (1 + a) / (1 - a)``, so any quantile is returned within a
+    relative error ``a`` of the true value, however skewed the data. Bins
+    are kept as one contiguous count array starting at key ``offset``.
+    Sketches with the same accuracy merge exactly by adding bin counts, so
+    per-bucket sketches combine over any range.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.offset = 0
+        self.bins = np.zeros(0, dtype=np.int64)
+
+    def _extend(self, low: int, high: int):
+        """Make bins cover keys ``low..high``, collapsing the lowest past MAX_BINS."""
+        if self.bins.size:
+            low, high = min(low, self.offset), max(high, self.offset + self.bins.size - 1)
+        new_offset = max(low, high - MAX_BINS + 1)
+        bins = np.zeros(high - new_offset + 1, dtype=np.int64)
+        if self.bins.size:
+            keys = np.arange(self.offset, self.offset + self.bins.size)
+            np.add.at(bins, np.maximum(keys, new_offset) - new_offset, self.bins)
+        self.offset, self.bins = new_offset, bins
+
+    def add(self, values: Sequence[float]):
+        values = np.asarray(values, dtype=np.float64)
+        if not values.size:
+            return
+        self.count += values.size
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > MIN_INDEXABLE_VALUE]
+        self.zero_count += values.size - positive.size
+        if positive.size:
+            keys = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            self._extend(int(keys.min()), int(keys.max()))
+            np.add.at(self.bins, np.maximum(keys, self.offset) - self.offset, 1)
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches of different accuracy")
+        if not other.count:
+            return
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.bins.size:
+            self._extend(other.offset, other.offset + other.bins.size - 1)
+            keys = np.arange(other.offset, other.offset + other.bins.size)
+            np.add.at(self.bins, np.maximum(keys, self.offset) - self.offset, other.bins)
+
+    @classmethod
+    def union(cls, sketches: Sequence["DDSketch"],
+              relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> "DDSketch":
+        merged = cls(sketches[0].relative_accuracy if sketches else relative_accuracy)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile ``q`` (0..1), or None for an empty sketch."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        index = int(np.searchsorted(np.cumsum(self.bins), rank - self.zero_count, side="right"))
+        value = 2 * self.gamma ** (self.offset + index) / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def to_bytes(self) -> bytes:
+        bin_dtype = "<u4" if not self.bins.size or self.bins.max() < 2 ** 32 else "<i8"
+        header = np.array([(
+            self.relative_accuracy, self.count, self.zero_count, self.sum,
+            self.min, self.max, self.offset, np.dtype(bin_dtype).itemsize
+        )], dtype=_HEADER)
+        return header.tobytes() + self.bins.astype(bin_dtype).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "DDSketch":
+        if not data:
+            return cls()
+        header = np.frombuffer(data[:_HEADER.itemsize], dtype=_HEADER)[0]
+        sketch = cls(float(header["relative_accuracy"]))
+        sketch.count = int(header["count"])
+        sketch.zero_count = int(header["zero_count"])
+        sketch.sum = float(header["sum"])
+        sketch.min = float(header["min"])
+        sketch.max = float(header["max"])
+        sketch.offset = int(header["offset"])
+        bin_dtype = "<u4" if header["bin_width"] == 4 else "<i8"
+        sketch.bins = np.frombuffer(data[_HEADER.itemsize:], dtype=bin_dtype).astype(np.int64)
+        return sketch
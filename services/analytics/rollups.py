@@ -0,0 +1,204 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.analytics.fact_store import from_epoch_seconds, to_epoch_seconds
+from services.analytics.hyperloglog import HyperLogLog, hash_keys
+from services.analytics.quantiles import DDSketch
+
+# Finest first. Month buckets are calendar months, the others fixed widths.
+RESOLUTIONS = ("minute", "hour", "day", "month")
+BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+APPROX_BUCKET_SECONDS = {**BUCKET_SECONDS, "month": 30 * 86400}
+
+ROLLUP_MEASURES = ("revenue", "orders", "units", "new_customers")
+# Mergeable sketches stored as bytes next to the measures
+ROLLUP_SKETCHES = {"customers": HyperLogLog, "order_values": DDSketch, "order_quantities": DDSketch}
+# Sketches also kept per (bucket, item category)
+CATEGORY_SKETCHES = ("order_values", "order_quantities")
+
+
+def bucket_starts(resolution: str, seconds: np.ndarray) -> np.ndarray:
+    """Start of the containing ``resolution`` bucket for each epoch second."""
+    if resolution == "month":
+        months = seconds.astype("datetime64[s]").astype("datetime64[M]")
+        return months.astype("datetime64[s]").astype(np.int64)
+    width = BUCKET_SECONDS[resolution]
+    return seconds // width * width
+
+
+def bucket_sequence(resolution: str, start: datetime, end: datetime) -> np.ndarray:
+    """Starts of every ``resolution`` bucket overlapping ``[start, end)``."""
+    first, last = bucket_starts(resolution, to_epoch_seconds([start, end - timedelta(seconds=1)]))
+    if resolution == "month":
+        months = np.arange(
+            first.astype("datetime64[s]").astype("datetime64[M]"),
+            last.astype("datetime64[s]").astype("datetime64[M]") + 1
+        )
+        return months.astype("datetime64[s]").astype(np.int64)
+    return np.arange(first, last + 1, BUCKET_SECONDS[resolution], dtype=np.int64)
+
+
+def next_bucket_start(resolution: str, start: int) -> int:
+    if resolution == "month":
+        month = np.datetime64(start, "s").astype("datetime64[M]") + 1
+        return int(month.astype("datetime64[s]").astype(np.int64))
+    return start + BUCKET_SECONDS[resolution]
+
+
+def _groups(inverse: np.ndarray, groups: int) -> List[np.ndarray]:
+    """Row indices of each group ``0..groups-1`` given each row's group."""
+    order = np.argsort(inverse, kind="stable")
+    return np.split(order, np.cumsum(np.bincount(inverse, minlength=groups))[:-1])
+
+
+def _order_sketches(values: np.ndarray, quantities: np.ndarray, groups: List[np.ndarray]) -> dict:
+    sketches = {"order_values": [], "order_quantities": []}
+    for rows_in_group in groups:
+        for name, column in (("order_values", values), ("order_quantities", quantities)):
+            sketch = DDSketch()
+            sketch.add(column[rows_in_group])
+            sketches[name].append(sketch)
+    return sketches
+
+
+def aggregate(rows: List[dict], new_customer: List[bool]) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Sum ``rows`` (sales feed rows) into buckets at every resolution.
+
+    Returns ``{resolution: {"bucket_starts": ..., measure: ..., sketch: [...]}}``
+    with one entry per distinct bucket touched by the rows, for every
+    measure in ``ROLLUP_MEASURES`` and sketch in ``ROLLUP_SKETCHES``:
+    ``customers`` sketches the bucket's buyers and ``order_values`` /
+    ``order_quantities`` the distribution of order totals and quantities.
+    """
+    seconds = to_epoch_seconds([row["purchase_date"] for row in rows])
+    measures = {
+        "revenue": np.array([row["total_price"] or 0.0 for row in rows], dtype=np.float64),
+        "orders": np.ones(len(rows), dtype=np.int64),
+        "units": np.array([row["quantity"] or 0 for row in rows], dtype=np.int64),
+        "new_customers": np.array(new_customer, dtype=np.int64)
+    }
+    register, rank = HyperLogLog.register_updates(hash_keys([row["customer_username"] for row in rows]))
+    result = {}
+    for resolution in RESOLUTIONS:
+        starts, inverse = np.unique(bucket_starts(resolution, seconds), return_inverse=True)
+        result[resolution] = {"bucket_starts": starts}
+        for name, values in measures.items():
+            result[resolution][name] = np.bincount(inverse, weights=values, minlength=len(starts))
+        groups = _groups(inverse, len(starts))
+        sketches = []
+        for rows_in_bucket in groups:
+            sketch = HyperLogLog()
+            sketch.update(register[rows_in_bucket], rank[rows_in_bucket])
+            sketches.append(sketch)
+        result[resolution]["customers"] = sketches
+        result[resolution].update(_order_sketches(measures["revenue"], measures["units"], groups))
+    return result
+
+
+def aggregate_by_category(rows: List[dict], categories: List[str]) -> Dict[str, dict]:
+    """
+    Order value and quantity sketches per (bucket, category) at every
+    resolution: ``{resolution: {"bucket_starts": [...], "categories": [...],
+    "order_values": [...], "order_quantities": [...]}}``, one entry per pair.
+    """
+    seconds = to_epoch_seconds([row["purchase_date"] for row in rows])
+    values = np.array([row["total_price"] or 0.0 for row in rows], dtype=np.float64)
+    quantities = np.array([row["quantity"] or 0 for row in rows], dtype=np.int64)
+    names, category_codes = np.unique(np.array(categories, dtype=str), return_inverse=True)
+    result = {}
+    for resolution in RESOLUTIONS:
+        keys, inverse = np.unique(
+            np.stack([bucket_starts(resolution, seconds), category_codes.ravel()], axis=1),
+            axis=0, return_inverse=True
+        )
+        result[resolution] = {
+            "bucket_starts": keys[:, 0].tolist(),
+            "categories": names[keys[:, 1]].tolist(),
+            **_order_sketches(values, quantities, _groups(inverse.ravel(), len(keys)))
+        }
+    return result
+
+
+def cover_buckets(start: int, end: int, now: int, retention: Dict[str, Optional[timedelta]],
+                  resolutions: Sequence[str] = RESOLUTIONS) -> List[Tuple[str, int]]:
+    """
+    Few rollup buckets that together cover ``[start, end)`` (epoch seconds).
+
+    Whole buckets of the coarsest resolution inside the range come first,
+    then ever finer ones toward the edges, so a 90-day range needs a couple
+    of months, up to ~60 days and up to ~48 hours. The range is widened to
+    whole buckets of the finest resolution still retained at each edge.
+    """
+    reference = from_epoch_seconds(now)
+    cutoffs = {}
+    for resolution in resolutions:
+        cutoff = retention_cutoff(resolution, reference, retention)
+        cutoffs[resolution] = None if cutoff is None else int(to_epoch_seconds([cutoff])[0])
+
+    def floor(resolution, t):
+        return int(bucket_starts(resolution, np.array([t], dtype=np.int64))[0])
+
+    def ceil(resolution, t):
+        first = floor(resolution, t)
+        return first if first == t else next_bucket_start(resolution, first)
+
+    def retained(levels, t):
+        return [r for r in levels if cutoffs[r] is None or floor(r, t) >= cutoffs[r]]
+
+    def widen(resolution, lo, hi):
+        buckets, bucket = [], floor(resolution, lo)
+        while bucket < hi:
+            buckets.append((resolution, bucket))
+            bucket = next_bucket_start(resolution, bucket)
+        return buckets
+
+    def cover(lo, hi, levels):
+        if lo >= hi:
+            return []
+        resolution, finer = levels[0], levels[1:]
+        first, last = ceil(resolution, lo), floor(resolution, hi)
+        if first >= last:
+            finer = retained(finer, lo)
+            return cover(lo, hi, finer) if finer else widen(resolution, lo, hi)
+        left, right = retained(finer, lo), retained(finer, last)
+        return (
+            (cover(lo, first, left) if left else widen(resolution, lo, first))
+            + widen(resolution, first, last)
+            + (cover(last, hi, right) if right else widen(resolution, last, hi))
+        )
+
+    coarse_to_fine = [r for r in RESOLUTIONS[::-1] if r in resolutions]
+    return cover(start, end, retained(coarse_to_fine, start) or coarse_to_fine[:1])
+
+
+def plan_resolution(start: datetime, end: datetime, now: datetime,
+                    retention: Dict[str, Optional[timedelta]], max_points: int) -> str:
+    """
+    Pick the rollup resolution for a trend query over ``[start, end)``.
+
+    Only resolutions whose retention still covers ``start`` qualify. Among
+    those, the finest one that needs at most ``max_points`` buckets is used,
+    so the query reads at most ``max_points`` rows; if every qualifying
+    resolution needs more, the coarsest is used.
+    """
+    span = (end - start).total_seconds()
+    covering = [
+        resolution for resolution in RESOLUTIONS
+        if retention.get(resolution) is None or now - retention[resolution] <= start
+    ]
+    for resolution in covering:
+        if span / APPROX_BUCKET_SECONDS[resolution] <= max_points:
+            return resolution
+    return covering[-1] if covering else RESOLUTIONS[-1]
+
+
+def retention_cutoff(resolution: str, now: datetime,
+                     retention: Dict[str, Optional[timedelta]]) -> Optional[datetime]:
+    """Buckets starting before the returned time have aged out, if any do."""
+    keep = retention.get(resolution)
+    if keep is None:
+        return None
+    return from_epoch_seconds(bucket_starts(resolution, to_epoch_seconds([now - keep]))[0])
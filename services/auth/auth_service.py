@@ -1,20 +1,72 @@
-from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Security
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import logging
+import os
+import time
+import uuid
+import httpx
+from utils.auth import (
+    JWTVerifier, RevocationList, load_signing_keys, active_key_id,
+    service_auth_headers, setup_jwt_auth, require_user
+)
+from utils.db_optimization import setup_query_profiler
+from utils.metrics import setup_metrics
+from utils.tracing import setup_tracing
+from .hashing import PasswordHasher, PasswordPoolBusy, LoginThrottle
+
+logger = logging.getLogger(__name__)
 
 # Security configuration
-SECRET_KEY = "your-secret-key"
+SIGNING_KEYS = load_signing_keys()
+ACTIVE_KEY_ID = active_key_id(SIGNING_KEYS)
+SECRET_KEY = SIGNING_KEYS[ACTIVE_KEY_ID]
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Service URLs
+CUSTOMER_SERVICE_URL = "http://localhost:8000"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Existing customer rows may still hold plaintext passwords; they verify
+# through the deprecated "plaintext" scheme and are rehashed to bcrypt on
+# their next successful login, as are hashes made with outdated rounds.
+pwd_context = CryptContext(
+    schemes=["bcrypt", "plaintext"],
+    deprecated=["plaintext"],
+    bcrypt__rounds=BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-app = FastAPI()
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=int(os.getenv("PASSWORD_POOL_WORKERS", os.cpu_count() or 2)),
+    max_pending=int(os.getenv("PASSWORD_POOL_MAX_PENDING", "32"))
+)
+login_throttle = LoginThrottle(
+    max_failures=int(os.getenv("LOGIN_MAX_FAILURES", "5")),
+    lockout_seconds=float(os.getenv("LOGIN_LOCKOUT_SECONDS", "300"))
+)
+
+# Verified against when the user does not exist, so unknown usernames cost
+# the same bcrypt work as wrong passwords; see dummy_password_hash.
+_dummy_password_hash: Optional[str] = None
+
+# Keeps fire-and-forget rehash tasks referenced until they finish.
+_background_tasks = set()
+
+# Revoked token ids mapped to their expiry; served to the other services'
+# verifiers through GET /revocations.
+revoked_tokens = {}
+revocations = RevocationList()
+
+router = APIRouter()
 
 class Token(BaseModel):
     access_token: str
@@ -26,13 +78,116 @@ class TokenData(BaseModel):
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    encoded_jwt = jwt.encode(
+        to_encode, SECRET_KEY, algorithm=ALGORITHM, headers={"kid": ACTIVE_KEY_ID}
+    )
     return encoded_jwt
 
-@app.post("/token", response_model=Token)
+def _live_revocations():
+    now = time.time()
+    for token_id in [t for t, exp in revoked_tokens.items() if exp <= now]:
+        del revoked_tokens[token_id]
+    return list(revoked_tokens)
+
+async def dummy_password_hash() -> str:
+    """
+    A hash of a random password at the configured BCRYPT_ROUNDS, so its cost
+    matches real hashes. Made on the password pool on first use rather than
+    at import.
+    """
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = await password_hasher.hash(uuid.uuid4().hex)
+    return _dummy_password_hash
+
+async def fetch_credentials(username: str) -> Optional[dict]:
+    async with httpx.AsyncClient(headers=service_auth_headers("auth")) as client:
+        response = await client.get(f"{CUSTOMER_SERVICE_URL}/customers/{username}/credentials")
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise HTTPException(status_code=502, detail="Customer lookup failed")
+        return response.json()
+
+async def store_password_hash(username: str, password_hash: str):
+    try:
+        async with httpx.AsyncClient(headers=service_auth_headers("auth")) as client:
+            await client.put(
+                f"{CUSTOMER_SERVICE_URL}/customers/{username}/credentials",
+                json={"password_hash": password_hash}
+            )
+    except httpx.HTTPError:
+        # The old hash still verifies; the upgrade is retried on the next login.
+        logger.warning("Failed to store upgraded password hash for %s", username)
+
+@router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    # Verify credentials against database
-    # Return JWT token
-    access_token = create_access_token(data={"sub": form_data.username})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    """
+    Verify credentials against the customer store and issue a JWT.
+
+    bcrypt runs on ``password_hasher``'s process pool, so a burst of logins
+    doesn't stall the event loop. Callers get a 503 when the pool's queue is
+    full and a 429 while their username is locked out. Outdated hashes are
+    upgraded in the background after a successful login.
+    """
+    username = form_data.username
+    if login_throttle.is_locked(username):
+        raise HTTPException(status_code=429, detail="Too many failed login attempts")
+
+    credentials = await fetch_credentials(username)
+    try:
+        stored_hash = (credentials or {}).get("password") or await dummy_password_hash()
+        valid, new_hash = await password_hasher.verify_and_update(form_data.password, stored_hash)
+    except PasswordPoolBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication is temporarily overloaded",
+            headers={"Retry-After": "1"}
+        )
+
+    if not credentials or not valid or not credentials.get("is_active", True):
+        login_throttle.record_failure(username)
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    login_throttle.reset(username)
+    if new_hash:
+        task = asyncio.create_task(store_password_hash(username, new_hash))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    access_token = create_access_token(data={"sub": username})
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/token/revoke")
+async def revoke_token(user: dict = Depends(require_user)):
+    """Revoke the caller's token; other services reject it after their next refresh."""
+    revoked_tokens[user["jti"]] = user["exp"]
+    revocations.replace(_live_revocations())
+    return {"message": "Token revoked"}
+
+@router.get("/revocations")
+async def list_revocations():
+    """Ids of revoked tokens that have not expired yet."""
+    return {"revoked": _live_revocations()}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    password_hasher.shutdown()
+
+def create_app() -> FastAPI:
+    """Build the auth service app."""
+    app = FastAPI(lifespan=lifespan)
+    setup_jwt_auth(app, JWTVerifier(SIGNING_KEYS, algorithms=[ALGORITHM], revocations=revocations))
+    app.include_router(router)
+    setup_tracing(app, "auth")
+    setup_metrics(app, "auth")
+    setup_query_profiler(app, "auth")
+    return app
+
+app = create_app()
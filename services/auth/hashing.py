@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Worker-side cache of CryptContext objects, keyed by their serialised config.
+_contexts: Dict[str, CryptContext] = {}
+
+
+def _context(config_key: str) -> CryptContext:
+    context = _contexts.get(config_key)
+    if context is None:
+        context = _contexts[config_key] = CryptContext(**json.loads(config_key))
+    return context
+
+
+def _verify_and_update(config_key: str, password: str, stored_hash: str) -> Tuple[bool, Optional[str]]:
+    return _context(config_key).verify_and_update(password, stored_hash)
+
+
+def _hash(config_key: str, password: str) -> str:
+    return _context(config_key).hash(password)
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs ``CryptContext`` hashing and verification on a process pool so bcrypt
+    never blocks the event loop.
+
+    At most ``max_pending`` operations may be queued or running at once;
+    further calls raise ``PasswordPoolBusy`` immediately instead of piling up
+    behind the pool.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = 2, max_pending: int = 16):
+        self.config_key = json.dumps(context.to_dict(), sort_keys=True)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordPoolBusy()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, self.config_key, *args)
+        finally:
+            self.pending -= 1
+
+    async def verify_and_update(self, password: str, stored_hash: str) -> Tuple[bool, Optional[str]]:
+        """Return ``(valid, new_hash)``; ``new_hash`` is set when the stored hash is outdated."""
+        return await self._submit(_verify_and_update, password, stored_hash)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class LoginThrottle:
+    """
+    In-memory per-username failed-login counter.
+
+    After ``max_failures`` consecutive failures the username is locked for
+    ``lockout_seconds``. At most ``max_entries`` usernames are tracked; the
+    least recently touched entries are evicted first.
+    """
+
+    def __init__(self, max_failures: int = 5, lockout_seconds: float = 300, max_entries: int = 10000):
+        self.max_failures = max_failures
+        self.lockout_seconds = lockout_seconds
+        self.max_entries = max_entries
+        # username -> (consecutive failures, locked until)
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+
+    def is_locked(self, username: str) -> bool:
+        entry = self._entries.get(username)
+        if entry is None:
+            return False
+        failures, locked_until = entry
+        if locked_until and locked_until <= time.monotonic():
+            del self._entries[username]
+            return False
+        return failures >= self.max_failures
+
+    def record_failure(self, username: str):
+        failures = self._entries.pop(username, (0, 0.0))[0] + 1
+        locked_until = time.monotonic() + self.lockout_seconds if failures >= self.max_failures else 0.0
+        self._entries[username] = (failures, locked_until)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def reset(self, username: str):
+        self._entries.pop(username, None)
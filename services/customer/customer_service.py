@@ -1,36 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, Float, Enum, Boolean, JSON
+from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Column, Integer, String, Float, Boolean, JSON, func, case, update, select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel, ConfigDict
+from sqlalchemy.orm import declarative_base, Session
+from pydantic import BaseModel, ConfigDict, Field
 import enum
-from typing import Optional, List
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, Float, Enum, Boolean, JSON
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel, ConfigDict
-import enum
-from typing import Optional, List
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from .models import Customer, Base
-from .database import engine, SessionLocal
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from services.customer.models import Customer, Base
-from services.customer.database import get_db, init_db
-
-app = FastAPI()
-# Create tables
-Base.metadata.create_all(bind=engine)
+from typing import Optional, List, Dict
+from utils.auth import require_admin, require_service, setup_jwt_auth
+from utils.db_optimization import setup_query_profiler
+from utils.metrics import setup_metrics
+from utils.tracing import setup_tracing
+from utils.database import ServiceDatabase
+from utils.events import publish_deletion
+from utils.streaming import parse_fields, stream_rows
+
 # Database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./customers.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bump whenever a table is added so existing databases pick it up on startup.
+SCHEMA_VERSION = 2
 Base = declarative_base()
 
 
@@ -79,12 +66,26 @@ class Customer(Base):
     role = Column(String, default="customer")
     preferences = Column(JSON, default={})
 
+class CustomerAggregate(Base):
+    """
+    Running totals over the customers table, kept in step with every
+    create/update/delete so metrics never need a full table scan.
+
+    Each row is a named counter: ``total_customers``, ``active_customers``,
+    ``age_count``, ``age_sum`` and one ``age_bucket:<decade>`` row per
+    populated age decade.
+    """
+    __tablename__ = "customer_aggregates"
+
+    name = Column(String, primary_key=True)
+    value = Column(Float, default=0.0, nullable=False)
+
 # Pydantic Models for Request/Response
-class CustomerBase(BaseModel):
+class CustomerProfile(BaseModel):
+    """Customer fields safe to return from public routes; never the password."""
     username: str
     full_name: str
     email: str
-    password: str
     address: str | None = None
     age: int | None = None
     gender: str | None = None
@@ -97,6 +98,9 @@ class CustomerBase(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+class CustomerBase(CustomerProfile):
+    password: str
+
 class CustomerCreate(CustomerBase):
     pass
 
@@ -108,28 +112,142 @@ class CustomerUpdate(BaseModel):
     gender: Optional[Gender] = None
     marital_status: Optional[MaritalStatus] = None
 
-class CustomerResponse(CustomerBase):
+class CustomerResponse(CustomerProfile):
     id: int
     wallet_balance: float
     
     model_config = ConfigDict(from_attributes=True)
 
-# FastAPI app
-app = FastAPI()
+# Columns selectable through ``GET /customers/?fields=``; password hashes never are
+CUSTOMER_LIST_FIELDS = list(CustomerResponse.model_fields)
+
+# Upper bound on usernames per batch lookup; keeps the IN list well below
+# SQLite's bound-parameter limit.
+MAX_BATCH_LOOKUP_SIZE = 500
+
+class CustomerBatchRequest(BaseModel):
+    usernames: List[str] = Field(min_length=1, max_length=MAX_BATCH_LOOKUP_SIZE)
+
+class CustomerLookup(BaseModel):
+    exists: bool
+    is_active: bool = False
+    wallet_balance: float = 0.0
+
+class CustomerCredentials(BaseModel):
+    username: str
+    password: Optional[str] = None
+    is_active: bool = True
+
+class PasswordHashUpdate(BaseModel):
+    password_hash: str
+
+class CustomerMetricsResponse(BaseModel):
+    total_customers: int
+    active_customers: int
+    average_age: float
+    age_histogram: Dict[str, int]
+
+def backfill_customer_aggregates(conn):
+    """Version 2 added ``customer_aggregates``; fill it from existing customers."""
+    with Session(bind=conn) as db:
+        reconcile_customer_aggregates(db)
+
+database = ServiceDatabase(
+    "customer", SQLALCHEMY_DATABASE_URL, Base.metadata, schema_version=SCHEMA_VERSION,
+    migrations={2: backfill_customer_aggregates}
+)
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
+
+router = APIRouter()
+
+# Aggregate maintenance
+AGE_BUCKET_PREFIX = "age_bucket:"
+
+def _aggregate_contribution(is_active, age) -> Dict[str, float]:
+    """Counter deltas a single customer row contributes to the aggregates."""
+    deltas = {
+        "total_customers": 1,
+        "active_customers": 0 if is_active is False else 1
+    }
+    if age is not None:
+        deltas["age_count"] = 1
+        deltas["age_sum"] = age
+        deltas[f"{AGE_BUCKET_PREFIX}{age // 10 * 10}"] = 1
+    return deltas
+
+def apply_aggregate_deltas(db: Session, deltas: Dict[str, float]):
+    """
+    Add ``deltas`` to the aggregate counters inside the caller's transaction.
+
+    Counters are bumped with ``value = value + delta`` so concurrent writers
+    never overwrite each other; missing counters are inserted on first use.
+    """
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        result = db.execute(
+            update(CustomerAggregate)
+            .where(CustomerAggregate.name == name)
+            .values(value=CustomerAggregate.value + delta)
+        )
+        if result.rowcount == 0:
+            db.add(CustomerAggregate(name=name, value=delta))
+            db.flush()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+def _diff_contributions(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    return {
+        name: after.get(name, 0) - before.get(name, 0)
+        for name in set(before) | set(after)
+    }
+
+def reconcile_customer_aggregates(db: Session) -> Dict[str, float]:
+    """
+    Rebuild the aggregate counters from the customers table.
+
+    Intended to run periodically (or via ``POST /customers/metrics/reconcile``)
+    to repair drift from writes that bypassed the API. Returns the corrections
+    that were applied, keyed by counter name.
+    """
+    totals = db.query(
+        func.count(Customer.id),
+        func.sum(case((Customer.is_active.is_(False), 0), else_=1)),
+        func.count(Customer.age),
+        func.sum(Customer.age)
+    ).one()
+    expected = {
+        "total_customers": totals[0] or 0,
+        "active_customers": totals[1] or 0,
+        "age_count": totals[2] or 0,
+        "age_sum": totals[3] or 0
+    }
+    # Group by exact age (a few dozen distinct values) and fold into decades
+    # here, which keeps the query portable across SQLite and Postgres.
+    for age, count in db.query(Customer.age, func.count()).filter(
+        Customer.age.isnot(None)
+    ).group_by(Customer.age).all():
+        bucket = f"{AGE_BUCKET_PREFIX}{age // 10 * 10}"
+        expected[bucket] = expected.get(bucket, 0) + count
+
+    current = {row.name: row.value for row in db.query(CustomerAggregate).all()}
+    corrections = {
+        name: delta
+        for name, delta in _diff_contributions(current, expected).items()
+        if delta
+    }
+
+    db.query(CustomerAggregate).delete()
+    db.add_all(
+        CustomerAggregate(name=name, value=value)
+        for name, value in expected.items()
+        if value
+    )
+    db.commit()
+    return corrections
 
 # API Endpoints
-@app.post("/customers/", response_model=CustomerResponse)
+@router.post("/customers/", response_model=CustomerResponse)
 async def create_customer(customer: CustomerBase, db: Session = Depends(get_db)):
     """
     Create a new customer account.
@@ -162,6 +280,10 @@ async def create_customer(customer: CustomerBase, db: Session = Depends(get_db))
     db_customer = Customer(**customer.model_dump())
     try:
         db.add(db_customer)
+        db.flush()
+        apply_aggregate_deltas(
+            db, _aggregate_contribution(db_customer.is_active, db_customer.age)
+        )
         db.commit()
         db.refresh(db_customer)
         return db_customer
@@ -172,41 +294,152 @@ async def create_customer(customer: CustomerBase, db: Session = Depends(get_db))
             detail="Username or email already registered"
         )
 
-@app.delete("/customers/{username}")
+@router.delete("/customers/{username}")
 def delete_customer(username: str, db: Session = Depends(get_db)):
     customer = db.query(Customer).filter(Customer.username == username).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
+    removed = _aggregate_contribution(customer.is_active, customer.age)
     db.delete(customer)
+    apply_aggregate_deltas(db, {name: -delta for name, delta in removed.items()})
     db.commit()
+    publish_deletion("customer", username)
     return {"message": "Customer deleted successfully"}
 
-@app.put("/customers/{username}", response_model=CustomerResponse)
+@router.put("/customers/{username}", response_model=CustomerResponse)
 def update_customer(username: str, customer_update: CustomerUpdate, db: Session = Depends(get_db)):
     db_customer = db.query(Customer).filter(Customer.username == username).first()
     if not db_customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
+    before = _aggregate_contribution(db_customer.is_active, db_customer.age)
     update_data = customer_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_customer, key, value)
     
+    after = _aggregate_contribution(db_customer.is_active, db_customer.age)
+    apply_aggregate_deltas(db, _diff_contributions(before, after))
     db.commit()
     db.refresh(db_customer)
     return db_customer
-@app.get("/customers/", response_model=List[CustomerResponse])
-def get_all_customers(db: Session = Depends(get_db)):
-    return db.query(Customer).all()
 
-@app.get("/customers/{username}", response_model=CustomerResponse)
+@router.get(
+    "/customers/",
+    response_class=StreamingResponse,
+    responses={200: {"model": List[CustomerResponse]}}
+)
+def get_all_customers(fields: Optional[str] = None):
+    """
+    List customers, optionally restricted to a comma-separated ``fields`` set.
+
+    Only the requested columns are selected and rows are streamed to the
+    client in chunks, so large listings never materialise ORM entities or
+    per-row response models.
+    """
+    columns = [getattr(Customer, name) for name in parse_fields(fields, CUSTOMER_LIST_FIELDS)]
+    database.ensure_schema()
+    return stream_rows(database.engine, select(*columns).order_by(Customer.id))
+
+@router.get("/customers/metrics", response_model=CustomerMetricsResponse)
+def get_customer_metrics(db: Session = Depends(get_db)):
+    """
+    Return customer counts and age statistics.
+
+    Reads the maintained ``customer_aggregates`` counters instead of scanning
+    the customers table, so the cost is independent of the number of
+    customers.
+    """
+    counters = {row.name: row.value for row in db.query(CustomerAggregate).all()}
+    age_count = counters.get("age_count", 0)
+    buckets = sorted(
+        (int(name[len(AGE_BUCKET_PREFIX):]), int(value))
+        for name, value in counters.items()
+        if name.startswith(AGE_BUCKET_PREFIX) and value > 0
+    )
+    histogram = {f"{start}-{start + 9}": count for start, count in buckets}
+
+    return {
+        "total_customers": int(counters.get("total_customers", 0)),
+        "active_customers": int(counters.get("active_customers", 0)),
+        "average_age": counters.get("age_sum", 0) / age_count if age_count else 0.0,
+        "age_histogram": histogram
+    }
+
+@router.post("/customers/metrics/reconcile", dependencies=[Depends(require_admin)])
+def reconcile_customer_metrics(db: Session = Depends(get_db)):
+    """Recompute the metrics counters from the customers table (admin job)."""
+    corrections = reconcile_customer_aggregates(db)
+    return {"message": "Customer metrics reconciled", "corrections": corrections}
+
+@router.post("/customers/batch", response_model=Dict[str, CustomerLookup])
+def get_customers_batch(batch: CustomerBatchRequest, db: Session = Depends(get_db)):
+    """
+    Resolve many usernames with a single query.
+
+    Only the columns callers need for existence and balance checks are
+    selected, so no full ``Customer`` entities are loaded.
+
+    Args:
+        batch (CustomerBatchRequest): Usernames to look up (at most 500)
+        db (Session): Database session
+
+    Returns:
+        Dict[str, CustomerLookup]: One entry per requested username; unknown
+        usernames are reported with ``exists`` set to False.
+    """
+    usernames = list(dict.fromkeys(batch.usernames))
+    rows = db.query(
+        Customer.username, Customer.is_active, Customer.wallet_balance
+    ).filter(Customer.username.in_(usernames)).all()
+
+    found = {
+        row.username: {
+            "exists": True,
+            "is_active": bool(row.is_active),
+            "wallet_balance": row.wallet_balance or 0.0
+        }
+        for row in rows
+    }
+    return {username: found.get(username, {"exists": False}) for username in usernames}
+
+@router.get("/customers/{username}", response_model=CustomerResponse)
 def get_customer(username: str, db: Session = Depends(get_db)):
     customer = db.query(Customer).filter(Customer.username == username).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     return customer
 
-@app.post("/customers/{username}/charge")
+@router.get(
+    "/customers/{username}/credentials",
+    response_model=CustomerCredentials,
+    dependencies=[Depends(require_service)]
+)
+def get_customer_credentials(username: str, db: Session = Depends(get_db)):
+    """Return the stored password hash and account state; service tokens only."""
+    credentials = db.query(
+        Customer.username, Customer.password, Customer.is_active
+    ).filter(Customer.username == username).first()
+    if not credentials:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return {
+        "username": credentials.username,
+        "password": credentials.password,
+        "is_active": credentials.is_active is not False
+    }
+
+@router.put("/customers/{username}/credentials", dependencies=[Depends(require_service)])
+def update_customer_credentials(username: str, update_data: PasswordHashUpdate, db: Session = Depends(get_db)):
+    """Replace the stored password hash (used by the auth service to rehash on login); service tokens only."""
+    updated = db.query(Customer).filter(Customer.username == username).update(
+        {Customer.password: update_data.password_hash}, synchronize_session=False
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    db.commit()
+    return {"message": "Credentials updated successfully"}
+
+@router.post("/customers/{username}/charge")
 def charge_wallet(username: str, amount: float, db: Session = Depends(get_db)):
     customer = db.query(Customer).filter(Customer.username == username).first()
     if not customer:
@@ -215,7 +448,7 @@ def charge_wallet(username: str, amount: float, db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Wallet charged successfully", "new_balance": customer.wallet_balance}
 
-@app.post("/customers/{username}/deduct")
+@router.post("/customers/{username}/deduct")
 def deduct_from_wallet(username: str, amount: float, db: Session = Depends(get_db)):
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
@@ -231,9 +464,14 @@ def deduct_from_wallet(username: str, amount: float, db: Session = Depends(get_d
     db.commit()
     return {"message": f"Amount deducted successfully. New balance: ${customer.wallet_balance}"}
 
-def init_db():
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+def create_app() -> FastAPI:
+    """Build the customer service app; the schema is checked during lifespan startup."""
+    app = FastAPI(lifespan=database.lifespan)
+    setup_jwt_auth(app)
+    app.include_router(router)
+    setup_tracing(app, "customer")
+    setup_metrics(app, "customer")
+    setup_query_profiler(app, "customer")
+    return app
 
-# Call this when starting the application
-init_db()
+app = create_app()
@@ -1,9 +1,10 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+
+from utils.database import create_service_engine, database_url
 from .models import Base
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./customers.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_service_engine(database_url("customer", SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
@@ -1,22 +1,25 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, Float, Enum
-from sqlalchemy.orm import declarative_base  # Updated import
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Column, Integer, String, Float, select
+from sqlalchemy.orm import declarative_base, Session
 from pydantic import BaseModel, Field
 import enum
 from typing import Optional
 from sqlalchemy import Index
 from utils.cache import cache_response, invalidate_cache
+from utils.auth import setup_jwt_auth
+from utils.db_optimization import setup_query_profiler
+from utils.metrics import setup_metrics
+from utils.tracing import setup_tracing
+from utils.database import ServiceDatabase, setup_read_routing
+from utils.events import publish_deletion
+from utils.streaming import parse_fields, stream_rows
 from pydantic import ConfigDict
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from .models import Item, Base
-from .database import engine, SessionLocal
 
 # Database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./inventory.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bump whenever a table is added so existing databases pick it up on startup.
+SCHEMA_VERSION = 1
 Base = declarative_base()
 
 # Enum for Item Categories
@@ -78,22 +81,21 @@ class ItemResponse(ItemBase):
     
     model_config = ConfigDict(from_attributes=True)
 
-# FastAPI app
-app = FastAPI()
+# Columns selectable through ``GET /items/?fields=``
+ITEM_LIST_FIELDS = list(ItemResponse.model_fields)
+
+database = ServiceDatabase(
+    "inventory", SQLALCHEMY_DATABASE_URL, Base.metadata, schema_version=SCHEMA_VERSION
+)
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
+get_read_db = database.get_read_db
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+router = APIRouter()
 
 # API Endpoints
-@app.post("/items/", response_model=ItemResponse)
+@router.post("/items/", response_model=ItemResponse)
 @cache_response(expire_time_seconds=300)
 async def create_item(item: ItemCreate, db: Session = Depends(get_db)):
     """
@@ -129,7 +131,7 @@ async def create_item(item: ItemCreate, db: Session = Depends(get_db)):
     db.refresh(db_item)
     return db_item
 
-@app.put("/items/{item_id}", response_model=ItemResponse)
+@router.put("/items/{item_id}", response_model=ItemResponse)
 @cache_response(expire_time_seconds=300)
 async def update_item(item_id: int, item_update: ItemUpdate, db: Session = Depends(get_db)):
     db_item = db.query(Item).filter(Item.id == item_id).first()
@@ -147,7 +149,7 @@ async def update_item(item_id: int, item_update: ItemUpdate, db: Session = Depen
     invalidate_cache(f"get_item:{item_id}:*")
     return db_item
 
-@app.post("/items/{item_id}/deduct")
+@router.post("/items/{item_id}/deduct")
 def deduct_from_stock(item_id: int, quantity: int = 1, db: Session = Depends(get_db)):
     if quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be positive")
@@ -164,13 +166,25 @@ def deduct_from_stock(item_id: int, quantity: int = 1, db: Session = Depends(get
     return {"message": f"Stock updated successfully. New stock count: {db_item.stock_count}"}
 
 # Additional useful endpoints
-@app.get("/items/", response_model=list[ItemResponse])
-def get_all_items(db: Session = Depends(get_db)):
-    return db.query(Item).all()
+@router.get(
+    "/items/",
+    response_class=StreamingResponse,
+    responses={200: {"model": list[ItemResponse]}}
+)
+def get_all_items(fields: Optional[str] = None):
+    """
+    List items, optionally restricted to a comma-separated ``fields`` set.
 
-@app.get("/items/{item_id}", response_model=ItemResponse)
+    Only the requested columns are selected and rows are streamed in chunks
+    straight from the cursor.
+    """
+    columns = [getattr(Item, name) for name in parse_fields(fields, ITEM_LIST_FIELDS)]
+    database.ensure_schema()
+    return stream_rows(database.read_engine(), select(*columns).order_by(Item.id))
+
+@router.get("/items/{item_id}", response_model=ItemResponse)
 @cache_response(expire_time_seconds=300)
-async def get_item(item_id: int, db: Session = Depends(get_db)):
+async def get_item(item_id: int, db: Session = Depends(get_read_db)):
     """
     Retrieve item details by ID.
 
@@ -192,7 +206,7 @@ async def get_item(item_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Item not found")
     return db_item
 
-@app.delete("/items/{item_id}")
+@router.delete("/items/{item_id}")
 def delete_item(item_id: int, db: Session = Depends(get_db)):
     db_item = db.query(Item).filter(Item.id == item_id).first()
     if not db_item:
@@ -200,9 +214,10 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_item)
     db.commit()
+    publish_deletion("item", item_id)
     return {"message": "Item deleted successfully"}
 
-@app.post("/items/{item_id}/add-stock")
+@router.post("/items/{item_id}/add-stock")
 def add_to_stock(item_id: int, quantity: int = 1, db: Session = Depends(get_db)):
     if quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be positive")
@@ -214,3 +229,16 @@ def add_to_stock(item_id: int, quantity: int = 1, db: Session = Depends(get_db))
     db_item.stock_count += quantity
     db.commit()
     return {"message": f"Stock updated successfully. New stock count: {db_item.stock_count}"}
+
+def create_app() -> FastAPI:
+    """Build the inventory service app; the schema is checked during lifespan startup."""
+    app = FastAPI(lifespan=database.lifespan)
+    setup_jwt_auth(app)
+    app.include_router(router)
+    setup_tracing(app, "inventory")
+    setup_metrics(app, "inventory")
+    setup_query_profiler(app, "inventory")
+    setup_read_routing(app, database)
+    return app
+
+app = create_app()
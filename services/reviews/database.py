@@ -1,17 +1,15 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import os
 
+from utils.database import create_service_engine, database_url
+
 # Use in-memory database for testing
 if os.getenv("TESTING"):
     SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
 else:
-    SQLALCHEMY_DATABASE_URL = "sqlite:///./reviews.db"
+    SQLALCHEMY_DATABASE_URL = database_url("reviews", "sqlite:///./reviews.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+engine = create_service_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -20,4 +18,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
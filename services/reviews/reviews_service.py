@@ -1,45 +1,49 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel, Field, validator, ConfigDict, field_validator
-from datetime import datetime
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Response
+from sqlalchemy import (
+    Column, Integer, String, Float, DateTime, Index, and_, bindparam, case, func, insert, inspect, or_, select,
+    text, update
+)
+from sqlalchemy.orm import declarative_base, Session
+from pydantic import BaseModel, Field, ConfigDict
+from datetime import datetime, timedelta
 import httpx
 from typing import List, Optional
 from enum import Enum
-import re
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from .models import Review, Base
-from .database import engine, SessionLocal
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import declarative_base  # Updated import
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel, Field, validator, ConfigDict, field_validator
-from datetime import datetime
-import httpx
-from typing import List, Optional
-from enum import Enum
-import re
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from .models import Review, Base
-from .database import engine, SessionLocal
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from .models.review import Review, Base
-from .database import engine, SessionLocal, get_db
+import asyncio
+import base64
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from utils.batch_loader import BatchLoader
+from utils.cache import TTLCache
+from utils.auth import require_admin, service_auth_headers, setup_jwt_auth
+from utils.db_optimization import setup_query_profiler
+from utils.metrics import setup_metrics
+from utils.tracing import setup_tracing
+from utils.database import ServiceDatabase, setup_read_routing
+from utils.events import subscribe_deletions
+from services.reviews.scoring import (
+    APPROVE, DEFAULT_BLOCKED_TERMS, FLAG, ReviewScoringPipeline, ScoringConfig
+)
+
 # Database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./reviews.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bump whenever a table is added so existing databases pick it up on startup.
+SCHEMA_VERSION = 5
 Base = declarative_base()
 
 # Service URLs
 CUSTOMER_SERVICE_URL = "http://localhost:8000"
 INVENTORY_SERVICE_URL = "http://localhost:8001"
 
+# Existence checks for review submission. Deletion events evict positive
+# entries early; misses are cached briefly so a customer or item created just
+# after a failed check is picked up soon.
+EXISTS_TTL_SECONDS = 300
+MISSING_TTL_SECONDS = 30
+EXISTENCE_CACHE_SIZE = 50000
+
 # Review Status Enum
 class ReviewStatus(str, Enum):
     PENDING = "pending"
@@ -60,6 +64,51 @@ class Review(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     status = Column(String, default=ReviewStatus.PENDING)
     moderation_comment = Column(String, nullable=True)
+    # Moderation queue lease: the moderator holding the review and until when
+    claimed_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    # Set by the background scoring pipeline; NULL means not scored yet
+    auto_score = Column(Float, nullable=True)
+
+    # Keyset pagination indexes: equality filters first, then the sort key
+    # and id as tie-breaker, so every page is a single index range scan.
+    __table_args__ = (
+        Index('idx_reviews_item_status_created', 'item_id', 'status', 'created_at', 'id'),
+        Index('idx_reviews_item_status_rating', 'item_id', 'status', 'rating', 'id'),
+        Index('idx_reviews_customer_created', 'customer_username', 'created_at', 'id'),
+        # Moderation queue: oldest reviews of a status first
+        Index('idx_reviews_status_created', 'status', 'created_at', 'id'),
+    )
+
+class ReviewSort(str, Enum):
+    CREATED_AT = "created_at"
+    RATING = "rating"
+
+class ReviewSummary(Base):
+    """
+    Per-item totals over APPROVED reviews, kept in step with every review
+    write so rating statistics never scan the reviews table.
+
+    ``rating_<n>`` counts ratings in ``[n, n + 1)``; 5 counts exact fives.
+    """
+    __tablename__ = "review_summary"
+
+    item_id = Column(Integer, primary_key=True)
+    review_count = Column(Integer, default=0, nullable=False)
+    rating_sum = Column(Float, default=0.0, nullable=False)
+    rating_1 = Column(Integer, default=0, nullable=False)
+    rating_2 = Column(Integer, default=0, nullable=False)
+    rating_3 = Column(Integer, default=0, nullable=False)
+    rating_4 = Column(Integer, default=0, nullable=False)
+    rating_5 = Column(Integer, default=0, nullable=False)
+
+RATING_BUCKETS = range(1, 6)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# Upper bound on item ids per batch stats request
+MAX_STATS_BATCH_SIZE = 100
+MAX_CLAIM_BATCH_SIZE = 100
+MAX_BULK_MODERATION_SIZE = 1000
 
 # Pydantic Models
 class ReviewBase(BaseModel):
@@ -77,6 +126,16 @@ class ReviewModeration(BaseModel):
     status: ReviewStatus
     moderation_comment: Optional[str] = None
 
+class ModerationClaimRequest(BaseModel):
+    moderator: str = Field(min_length=1)
+    batch_size: int = Field(default=20, ge=1, le=MAX_CLAIM_BATCH_SIZE)
+    lease_seconds: int = Field(default=300, ge=10, le=3600)
+
+class BulkModerationRequest(ReviewModeration):
+    review_ids: List[int] = Field(min_length=1, max_length=MAX_BULK_MODERATION_SIZE)
+    # When set, reviews leased to another moderator are left untouched
+    moderator: Optional[str] = None
+
 class ReviewResponse(ReviewBase):
     id: int
     customer_username: str
@@ -84,35 +143,318 @@ class ReviewResponse(ReviewBase):
     
     model_config = ConfigDict(from_attributes=True)
 
-# FastAPI app
-app = FastAPI()
+def rebuild_review_summaries(conn):
+    """Recompute ``review_summary`` from the approved rows in ``reviews``."""
+    approved = Review.__table__.c
+    bucket_columns = [
+        func.sum(case(
+            (and_(approved.rating >= n, approved.rating < n + 1) if n < 5 else approved.rating >= 5, 1),
+            else_=0
+        ))
+        for n in RATING_BUCKETS
+    ]
+    conn.execute(ReviewSummary.__table__.delete())
+    conn.execute(
+        insert(ReviewSummary.__table__).from_select(
+            ["item_id", "review_count", "rating_sum"] + [f"rating_{n}" for n in RATING_BUCKETS],
+            select(
+                approved.item_id, func.count(), func.sum(approved.rating), *bucket_columns
+            ).where(approved.status == ReviewStatus.APPROVED.value).group_by(approved.item_id)
+        )
+    )
+
+def create_review_indexes(conn):
+    # create_all only builds indexes together with new tables, so existing
+    # reviews tables get them here.
+    for index in Review.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+def add_review_columns(conn):
+    # create_all doesn't alter existing tables; add columns introduced since.
+    existing = {column["name"] for column in inspect(conn).get_columns("reviews")}
+    for column in Review.__table__.columns:
+        if column.name not in existing:
+            conn.execute(text(
+                f"ALTER TABLE reviews ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+            ))
+    create_review_indexes(conn)
+
+database = ServiceDatabase(
+    "reviews", SQLALCHEMY_DATABASE_URL, Base.metadata, schema_version=SCHEMA_VERSION,
+    migrations={
+        2: rebuild_review_summaries,
+        3: create_review_indexes,
+        4: add_review_columns,
+        5: add_review_columns
+    }
+)
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
+get_read_db = database.get_read_db
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+router = APIRouter()
 
 # Helper functions
+async def fetch_customers_batch(usernames: List[str]) -> dict:
+    async with httpx.AsyncClient(headers=service_auth_headers("reviews")) as client:
+        response = await client.post(
+            f"{CUSTOMER_SERVICE_URL}/customers/batch",
+            json={"usernames": usernames}
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=502, detail="Customer lookup failed")
+        return response.json()
+
+customer_loader = BatchLoader(fetch_customers_batch, max_batch_size=500)
+
+existence_cache = TTLCache(max_entries=EXISTENCE_CACHE_SIZE)
+_deletion_subscriber = None
+_deletion_subscriber_lock = threading.Lock()
+
+def _on_deletion(entity: str, key):
+    existence_cache.invalidate((entity, key))
+
+def _ensure_deletion_subscriber():
+    global _deletion_subscriber
+    if _deletion_subscriber is None:
+        with _deletion_subscriber_lock:
+            if _deletion_subscriber is None:
+                _deletion_subscriber = subscribe_deletions(_on_deletion)
+
+async def _cached_exists(entity: str, key, lookup) -> Optional[bool]:
+    """
+    Answer whether ``entity`` ``key`` exists from ``existence_cache``, calling
+    ``lookup`` on a miss. ``lookup`` returns ``None`` when the owning service
+    gave no definite answer; that result is not cached.
+    """
+    _ensure_deletion_subscriber()
+    exists = existence_cache.get((entity, key))
+    if exists is None:
+        exists = await lookup(key)
+        if exists is not None:
+            ttl = EXISTS_TTL_SECONDS if exists else MISSING_TTL_SECONDS
+            existence_cache.set((entity, key), exists, ttl)
+    return exists
+
+async def customer_exists(username: str) -> bool:
+    customer = await customer_loader.load(username)
+    return bool(customer and customer.get("exists"))
+
+async def item_exists(item_id: int) -> Optional[bool]:
+    async with httpx.AsyncClient(headers=service_auth_headers("reviews")) as client:
+        response = await client.get(f"{INVENTORY_SERVICE_URL}/items/{item_id}")
+    if response.status_code == 404:
+        return False
+    return True if response.status_code == 200 else None
+
 async def verify_customer(username: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{CUSTOMER_SERVICE_URL}/customers/{username}")
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Customer not found")
+    if await _cached_exists("customer", username, customer_exists) is False:
+        raise HTTPException(status_code=404, detail="Customer not found")
 
 async def verify_item(item_id: int):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{INVENTORY_SERVICE_URL}/items/{item_id}")
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Item not found")
+    if await _cached_exists("item", item_id, item_exists) is False:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+def rating_bucket(rating: float) -> int:
+    return min(max(int(rating), 1), 5)
+
+def apply_summary_delta(db: Session, item_id: int, delta: dict):
+    """
+    Add ``delta`` (``review_count``, ``rating_sum`` and ``rating_<n>``
+    increments) to the item's summary inside the caller's transaction.
+    """
+    columns = {getattr(ReviewSummary, name): value for name, value in delta.items() if value}
+    if not columns:
+        return
+    result = db.execute(
+        update(ReviewSummary)
+        .where(ReviewSummary.item_id == item_id)
+        .values({column: column + value for column, value in columns.items()})
+    )
+    if result.rowcount == 0 and delta.get("review_count", 0) > 0:
+        db.add(ReviewSummary(item_id=item_id, **{
+            "review_count": 0, "rating_sum": 0.0,
+            **{f"rating_{n}": 0 for n in RATING_BUCKETS},
+            **delta
+        }))
+        db.flush()
+
+def rating_delta(rating: float, sign: int) -> dict:
+    return {
+        "review_count": sign,
+        "rating_sum": sign * rating,
+        f"rating_{rating_bucket(rating)}": sign
+    }
+
+def adjust_review_summary(db: Session, item_id: int, rating: float, sign: int):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) one approved rating from the
+    item's summary inside the caller's transaction.
+    """
+    apply_summary_delta(db, item_id, rating_delta(rating, sign))
+
+def _summary_stats(summary: Optional[ReviewSummary]) -> dict:
+    if summary is None or not summary.review_count:
+        return {
+            "average_rating": 0,
+            "total_reviews": 0,
+            "rating_distribution": {n: 0 for n in RATING_BUCKETS}
+        }
+    return {
+        "average_rating": summary.rating_sum / summary.review_count,
+        "total_reviews": summary.review_count,
+        "rating_distribution": {n: getattr(summary, f"rating_{n}") for n in RATING_BUCKETS}
+    }
+
+REVIEW_SORT_COLUMNS = {
+    ReviewSort.CREATED_AT: Review.created_at,
+    ReviewSort.RATING: Review.rating
+}
+
+def encode_cursor(sort: ReviewSort, review: Review) -> str:
+    value = getattr(review, sort.value)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort.value, value, review.id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(sort: ReviewSort, cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, review_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort.value:
+            raise ValueError("cursor was issued for a different sort order")
+        if sort == ReviewSort.CREATED_AT:
+            value = datetime.fromisoformat(value)
+        return value, int(review_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate_reviews(query, sort: ReviewSort, cursor: Optional[str], limit: int, response: Response):
+    """
+    Return one page of ``query`` in descending ``sort`` order.
+
+    Pages are addressed by the last row's (sort value, id) rather than an
+    OFFSET, so fetching page 1000 costs the same as page 1. The cursor for the
+    next page is returned in the ``X-Next-Cursor`` header.
+    """
+    column = REVIEW_SORT_COLUMNS[sort]
+    ordered = query.order_by(column.desc(), Review.id.desc())
+    if not cursor:
+        reviews = ordered.limit(limit + 1).all()
+    else:
+        # Finish the cursor's tie group, then continue below its value. Two
+        # bounded index seeks; a single (column, id) < (value, id) predicate
+        # only bounds the index range on ``column`` and would rescan large
+        # tie groups such as every 5-star review.
+        value, last_id = decode_cursor(sort, cursor)
+        reviews = (
+            query.filter(column == value, Review.id < last_id)
+            .order_by(Review.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        if len(reviews) <= limit:
+            reviews += ordered.filter(column < value).limit(limit + 1 - len(reviews)).all()
+
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(sort, reviews[-1])
+    return reviews
+
+def fetch_unscored_reviews(limit: int) -> list:
+    db = database.SessionLocal()
+    try:
+        return [
+            tuple(row) for row in db.query(Review.id, Review.comment, Review.updated_at)
+            .filter(Review.status == ReviewStatus.PENDING, Review.auto_score.is_(None))
+            .order_by(Review.id)
+            .limit(limit)
+        ]
+    finally:
+        db.close()
+
+SCORING_STATUSES = {APPROVE: ReviewStatus.APPROVED, FLAG: ReviewStatus.FLAGGED}
+
+def apply_review_scores(batch: list, results: list) -> int:
+    """
+    Store scoring results for ``batch`` in one transaction, skipping reviews
+    that were moderated or edited while they were being scored. Reviews
+    leased to a moderator get their score but keep their status.
+    """
+    db = database.SessionLocal()
+    try:
+        scored_at = {review_id: updated_at for review_id, _, updated_at in batch}
+        current = (
+            db.query(
+                Review.id, Review.item_id, Review.rating, Review.updated_at,
+                Review.claimed_by, Review.lease_expires_at
+            )
+            .filter(
+                Review.id.in_(scored_at),
+                Review.status == ReviewStatus.PENDING,
+                Review.auto_score.is_(None)
+            )
+            .with_for_update()
+            .all()
+        )
+        unchanged = {row.id: row for row in current if row.updated_at == scored_at[row.id]}
+        now = datetime.utcnow()
+
+        updates = []
+        deltas = {}
+        for (review_id, _, _), (decision, score, comment) in zip(batch, results):
+            row = unchanged.get(review_id)
+            if row is None:
+                continue
+            status = SCORING_STATUSES.get(decision, ReviewStatus.PENDING)
+            if row.claimed_by is not None and row.lease_expires_at >= now:
+                status = ReviewStatus.PENDING
+            updates.append({
+                "review_id": review_id,
+                "status": status.value,
+                "auto_score": score,
+                "moderation_comment": comment
+            })
+            if status == ReviewStatus.APPROVED:
+                delta = deltas.setdefault(row.item_id, {})
+                for name, value in rating_delta(row.rating, 1).items():
+                    delta[name] = delta.get(name, 0) + value
+
+        if updates:
+            # Bulk UPDATE by primary key, executed as one executemany
+            db.execute(update(Review.__table__).where(
+                Review.__table__.c.id == bindparam("review_id")
+            ).values(
+                status=bindparam("status"),
+                auto_score=bindparam("auto_score"),
+                moderation_comment=bindparam("moderation_comment")
+            ), updates)
+            for item_id, delta in deltas.items():
+                apply_summary_delta(db, item_id, delta)
+        db.commit()
+        return len(updates)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+scoring_pipeline = ReviewScoringPipeline(
+    fetch_unscored_reviews,
+    apply_review_scores,
+    ScoringConfig(
+        blocked_terms=os.getenv("REVIEW_BLOCKED_TERMS", ",".join(DEFAULT_BLOCKED_TERMS)).split(","),
+        approve_below=float(os.getenv("REVIEW_AUTO_APPROVE_BELOW", "0.2")),
+        flag_above=float(os.getenv("REVIEW_AUTO_FLAG_ABOVE", "0.6"))
+    ),
+    batch_size=int(os.getenv("REVIEW_SCORING_BATCH_SIZE", "200")),
+    max_workers=int(os.getenv("REVIEW_SCORING_WORKERS", "2"))
+)
 
 # API Endpoints
-@app.post("/reviews/", response_model=ReviewResponse)
+@router.post("/reviews/", response_model=ReviewResponse)
 async def create_review(
     review: ReviewCreate,
     customer_username: str,
@@ -120,8 +462,7 @@ async def create_review(
 ):
     try:
         # Verify customer and item exist
-        await verify_customer(customer_username)
-        await verify_item(review.item_id)
+        await asyncio.gather(verify_customer(customer_username), verify_item(review.item_id))
         
         # Create review object
         db_review = Review(
@@ -135,14 +476,18 @@ async def create_review(
         db.add(db_review)
         db.commit()
         db.refresh(db_review)
+        scoring_pipeline.notify()
         
         return db_review
         
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.put("/reviews/{review_id}", response_model=ReviewResponse)
+@router.put("/reviews/{review_id}", response_model=ReviewResponse)
 async def update_review(
     review_id: int,
     review_update: ReviewUpdate,
@@ -157,16 +502,23 @@ async def update_review(
     if db_review.customer_username != customer_username:
         raise HTTPException(status_code=403, detail="Not authorized to update this review")
     
+    if db_review.status == ReviewStatus.APPROVED:
+        adjust_review_summary(db, db_review.item_id, db_review.rating, -1)
+    
     for key, value in review_update.dict().items():
         setattr(db_review, key, value)
     
     db_review.updated_at = datetime.utcnow()
     db_review.status = ReviewStatus.PENDING  # Reset status for re-moderation
+    db_review.auto_score = None
+    db_review.claimed_by = None
+    db_review.lease_expires_at = None
     db.commit()
     db.refresh(db_review)
+    scoring_pipeline.notify()
     return db_review
 
-@app.delete("/reviews/{review_id}")
+@router.delete("/reviews/{review_id}")
 async def delete_review(
     review_id: int,
     customer_username: str,
@@ -181,55 +533,196 @@ async def delete_review(
     if not is_admin and db_review.customer_username != customer_username:
         raise HTTPException(status_code=403, detail="Not authorized to delete this review")
     
+    if db_review.status == ReviewStatus.APPROVED:
+        adjust_review_summary(db, db_review.item_id, db_review.rating, -1)
     db.delete(db_review)
     db.commit()
     return {"message": "Review deleted successfully"}
 
-@app.get("/reviews/product/{item_id}", response_model=List[ReviewResponse])
+@router.get("/reviews/product/{item_id}", response_model=List[ReviewResponse])
 async def get_product_reviews(
     item_id: int,
+    response: Response,
     status: Optional[ReviewStatus] = ReviewStatus.APPROVED,
-    db: Session = Depends(get_db)
+    sort: ReviewSort = ReviewSort.CREATED_AT,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db)
 ):
-    """Get all reviews for a specific product"""
+    """Get a page of reviews for a specific product, newest or highest rated first"""
     query = db.query(Review).filter(Review.item_id == item_id)
     if status:
         query = query.filter(Review.status == status)
-    return query.all()
+    return paginate_reviews(query, sort, cursor, limit, response)
 
-@app.get("/reviews/customer/{customer_username}", response_model=List[ReviewResponse])
+@router.get("/reviews/customer/{customer_username}", response_model=List[ReviewResponse])
 async def get_customer_reviews(
     customer_username: str,
-    db: Session = Depends(get_db)
+    response: Response,
+    sort: ReviewSort = ReviewSort.CREATED_AT,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db)
 ):
-    """Get all reviews by a specific customer"""
-    return db.query(Review).filter(Review.customer_username == customer_username).all()
+    """Get a page of reviews by a specific customer"""
+    query = db.query(Review).filter(Review.customer_username == customer_username)
+    return paginate_reviews(query, sort, cursor, limit, response)
 
-@app.put("/reviews/{review_id}/moderate", response_model=ReviewResponse)
+@router.put(
+    "/reviews/{review_id}/moderate",
+    response_model=ReviewResponse,
+    dependencies=[Depends(require_admin)]
+)
 async def moderate_review(
     review_id: int,
     moderation: ReviewModeration,
-    is_admin: bool = True,  # In production, this should be properly authenticated
     db: Session = Depends(get_db)
 ):
     """Moderate a review (admin only)"""
-    if not is_admin:
-        raise HTTPException(status_code=403, detail="Only administrators can moderate reviews")
-    
     db_review = db.query(Review).filter(Review.id == review_id).first()
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     
-    db_review.status = moderation.status
+    was_approved = db_review.status == ReviewStatus.APPROVED
+    is_approved = moderation.status == ReviewStatus.APPROVED
+    if was_approved != is_approved:
+        adjust_review_summary(db, db_review.item_id, db_review.rating, 1 if is_approved else -1)
+    
+    db_review.status = moderation.status.value
     db_review.moderation_comment = moderation.moderation_comment
+    db_review.claimed_by = None
+    db_review.lease_expires_at = None
     db.commit()
     db.refresh(db_review)
     return db_review
 
-@app.get("/reviews/{review_id}", response_model=ReviewResponse)
+def _lease_available(moderator: Optional[str], now: datetime):
+    # Unclaimed, expired, or already held by ``moderator``
+    conditions = [Review.claimed_by.is_(None), Review.lease_expires_at < now]
+    if moderator is not None:
+        conditions.append(Review.claimed_by == moderator)
+    return or_(*conditions)
+
+@router.post("/reviews/moderation/claim", response_model=List[ReviewResponse])
+async def claim_moderation_batch(
+    claim: ModerationClaimRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Lease up to ``batch_size`` of the oldest pending reviews to a moderator.
+
+    Leased reviews are skipped by other moderators' claims until the lease
+    expires or the review is moderated. The claim is a conditional UPDATE, so
+    concurrent claimers never receive the same review.
+    """
+    now = datetime.utcnow()
+    lease_expires_at = now + timedelta(seconds=claim.lease_seconds)
+    candidates = [
+        review_id for review_id, in db.query(Review.id)
+        .filter(Review.status == ReviewStatus.PENDING, _lease_available(None, now))
+        .order_by(Review.created_at, Review.id)
+        .limit(claim.batch_size)
+    ]
+    if not candidates:
+        return []
+
+    db.execute(
+        update(Review)
+        .where(
+            Review.id.in_(candidates),
+            Review.status == ReviewStatus.PENDING,
+            _lease_available(None, now)
+        )
+        .values(claimed_by=claim.moderator, lease_expires_at=lease_expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return (
+        db.query(Review)
+        .filter(
+            Review.id.in_(candidates),
+            Review.claimed_by == claim.moderator,
+            Review.lease_expires_at == lease_expires_at
+        )
+        .order_by(Review.created_at, Review.id)
+        .all()
+    )
+
+@router.post("/reviews/moderation/bulk", dependencies=[Depends(require_admin)])
+async def bulk_moderate_reviews(
+    moderation: BulkModerationRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Apply one moderation status to many reviews with a single UPDATE, adjusting
+    rating summaries in the same transaction. Returns the ids that were updated
+    and those skipped because they do not exist or are leased to someone else.
+    """
+    review_ids = list(dict.fromkeys(moderation.review_ids))
+    available = and_(
+        Review.id.in_(review_ids),
+        _lease_available(moderation.moderator, datetime.utcnow())
+    )
+    targets = (
+        db.query(Review.id, Review.item_id, Review.rating, Review.status)
+        .filter(available)
+        .with_for_update()
+        .all()
+    )
+
+    is_approved = moderation.status == ReviewStatus.APPROVED
+    deltas = {}
+    for target in targets:
+        if (target.status == ReviewStatus.APPROVED) == is_approved:
+            continue
+        delta = deltas.setdefault(target.item_id, {})
+        for name, value in rating_delta(target.rating, 1 if is_approved else -1).items():
+            delta[name] = delta.get(name, 0) + value
+
+    updated_ids = [target.id for target in targets]
+    try:
+        if updated_ids:
+            db.execute(
+                update(Review)
+                .where(Review.id.in_(updated_ids))
+                .values(
+                    status=moderation.status.value,
+                    moderation_comment=moderation.moderation_comment,
+                    claimed_by=None,
+                    lease_expires_at=None,
+                    updated_at=datetime.utcnow()
+                )
+                .execution_options(synchronize_session=False)
+            )
+            for item_id, delta in deltas.items():
+                apply_summary_delta(db, item_id, delta)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    updated = set(updated_ids)
+    return {
+        "updated": sorted(updated),
+        "skipped": [review_id for review_id in review_ids if review_id not in updated]
+    }
+
+@router.get("/reviews/stats")
+async def get_review_stats_batch(
+    item_ids: List[int] = Query(..., max_length=MAX_STATS_BATCH_SIZE),
+    db: Session = Depends(get_read_db)
+):
+    """Get review statistics for many items with a single query, keyed by item id"""
+    summaries = {
+        summary.item_id: summary
+        for summary in db.query(ReviewSummary).filter(ReviewSummary.item_id.in_(item_ids))
+    }
+    return {item_id: _summary_stats(summaries.get(item_id)) for item_id in item_ids}
+
+@router.get("/reviews/{review_id}", response_model=ReviewResponse)
 async def get_review_details(
     review_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get detailed information about a specific review"""
     db_review = db.query(Review).filter(Review.id == review_id).first()
@@ -238,29 +731,30 @@ async def get_review_details(
     return db_review
 
 # Additional useful endpoints
-@app.get("/reviews/product/{item_id}/stats")
+@router.get("/reviews/product/{item_id}/stats")
 async def get_product_review_stats(
     item_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get statistical information about product reviews"""
-    reviews = db.query(Review).filter(
-        Review.item_id == item_id,
-        Review.status == ReviewStatus.APPROVED
-    ).all()
-    
-    if not reviews:
-        return {
-            "average_rating": 0,
-            "total_reviews": 0,
-            "rating_distribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        }
-    
-    ratings = [r.rating for r in reviews]
-    rating_dist = {i: ratings.count(i) for i in range(1, 6)}
-    
-    return {
-        "average_rating": sum(ratings) / len(ratings),
-        "total_reviews": len(reviews),
-        "rating_distribution": rating_dist
-    }
\ No newline at end of file
+    return _summary_stats(db.get(ReviewSummary, item_id))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with database.lifespan(app):
+        scoring_pipeline.start()
+        yield
+        await scoring_pipeline.stop()
+
+def create_app() -> FastAPI:
+    """Build the reviews service app; the schema is checked during lifespan startup."""
+    app = FastAPI(lifespan=lifespan)
+    setup_jwt_auth(app)
+    app.include_router(router)
+    setup_tracing(app, "reviews")
+    setup_metrics(app, "reviews")
+    setup_query_profiler(app, "reviews")
+    setup_read_routing(app, database)
+    return app
+
+app = create_app()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCKED_TERMS = (
+    "scam", "fake", "viagra", "casino", "crypto", "giveaway", "whatsapp", "telegram"
+)
+
+APPROVE = "approve"
+FLAG = "flag"
+REVIEW = "review"
+
+FEATURES = ("blocked_terms", "repetition", "url_density", "uppercase")
+# Score contribution of each feature at full strength; the sum is clipped to 1.
+FEATURE_WEIGHTS = np.array([0.7, 0.8, 2.0, 0.4])
+
+_TOKEN_RE = re.compile(r"https?://\S+|www\.\S+|[a-z0-9']+")
+_UPPER_RE = re.compile(r"[A-Z]")
+_LETTER_RE = re.compile(r"[A-Za-z]")
+
+
+class ScoringConfig:
+    """Blocked terms and the score thresholds for automatic decisions."""
+
+    def __init__(self, blocked_terms: Sequence[str] = DEFAULT_BLOCKED_TERMS,
+                 approve_below: float = 0.2, flag_above: float = 0.6):
+        if approve_below > flag_above:
+            raise ValueError("approve_below must not exceed flag_above")
+        self.blocked_terms = sorted({term.strip().lower() for term in blocked_terms if term.strip()})
+        self.approve_below = approve_below
+        self.flag_above = flag_above
+
+    def to_dict(self) -> dict:
+        return {
+            "blocked_terms": self.blocked_terms,
+            "approve_below": self.approve_below,
+            "flag_above": self.flag_above
+        }
+
+
+def extract_features(comments: Sequence[str], blocked_terms: Sequence[str]) -> np.ndarray:
+    """
+    Return an ``(n, len(FEATURES))`` array of per-comment features in ``[0, 1]``.
+
+    Comments are tokenised once; the token-level checks (blocked terms,
+    links, distinct tokens) then run over the whole batch as array
+    operations, with per-comment totals gathered by ``bincount``.
+    """
+    n = len(comments)
+    token_lists = [_TOKEN_RE.findall(comment.lower()) for comment in comments]
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=n)
+    owner = np.repeat(np.arange(n), lengths)
+    tokens = np.array([token for tokens in token_lists for token in tokens], dtype=str)
+
+    blocked = np.bincount(owner, weights=np.isin(tokens, blocked_terms), minlength=n)
+    urls = np.bincount(
+        owner,
+        weights=np.char.startswith(tokens, "http") | np.char.startswith(tokens, "www."),
+        minlength=n
+    )
+    if tokens.size:
+        _, token_ids = np.unique(tokens, return_inverse=True)
+        pairs = np.unique(owner * (token_ids.max() + 1) + token_ids)
+        distinct = np.bincount(pairs // (token_ids.max() + 1), minlength=n)
+    else:
+        distinct = np.zeros(n)
+
+    letters = np.fromiter((len(_LETTER_RE.findall(c)) for c in comments), dtype=np.float64, count=n)
+    upper = np.fromiter((len(_UPPER_RE.findall(c)) for c in comments), dtype=np.float64, count=n)
+
+    safe_lengths = np.maximum(lengths, 1)
+    features = np.empty((n, len(FEATURES)))
+    features[:, 0] = np.minimum(blocked, 2) / 2
+    # Short comments can't meaningfully repeat or shout
+    features[:, 1] = np.where(lengths >= 6, 1 - distinct / safe_lengths, 0)
+    features[:, 2] = np.minimum(urls / safe_lengths, 1)
+    features[:, 3] = np.where(letters >= 12, upper / np.maximum(letters, 1), 0)
+    return features
+
+
+def _reasons(features: np.ndarray) -> List[str]:
+    blocked, repetition, url_density, uppercase = features
+    reasons = []
+    if blocked:
+        reasons.append("blocked terms")
+    if repetition >= 0.5:
+        reasons.append(f"repetitive text ({repetition:.0%} repeated words)")
+    if url_density:
+        reasons.append(f"links ({url_density:.0%} of words)")
+    if uppercase >= 0.7:
+        reasons.append("mostly uppercase")
+    return reasons
+
+
+def score_comments(comments: Sequence[str], config: dict) -> List[Tuple[str, float, str]]:
+    """
+    Score a batch of comments; runs in the scoring worker processes.
+
+    Returns ``(decision, score, moderation_comment)`` per comment, where the
+    decision is ``approve``, ``flag`` or ``review`` (left for a moderator).
+    """
+    if not comments:
+        return []
+    features = extract_features(comments, config["blocked_terms"])
+    scores = np.minimum(features @ FEATURE_WEIGHTS, 1.0)
+
+    results = []
+    for score, row in zip(scores.tolist(), features):
+        reasons = ", ".join(_reasons(row)) or "no risk signals"
+        if score < config["approve_below"]:
+            results.append((APPROVE, score, f"Auto-approved (score {score:.2f}): {reasons}"))
+        elif score > config["flag_above"]:
+            results.append((FLAG, score, f"Auto-flagged (score {score:.2f}): {reasons}"))
+        else:
+            results.append((REVIEW, score, f"Needs review (score {score:.2f}): {reasons}"))
+    return results
+
+
+class ReviewScoringPipeline:
+    """
+    Background task that scores pending reviews in batches on a process pool.
+
+    ``fetch_batch(limit)`` returns ``[(review_id, comment, updated_at), ...]``
+    for unscored reviews and ``apply_results(batch, results)`` stores the
+    decisions; both are blocking database calls and run on the default
+    thread pool, so neither they nor the scoring hold up the event loop.
+    ``notify`` wakes the task early after new reviews are written; otherwise
+    it polls every ``poll_interval`` seconds.
+    """
+
+    def __init__(self, fetch_batch: Callable[[int], list],
+                 apply_results: Callable[[list, list], Optional[int]],
+                 config: ScoringConfig, batch_size: int = 200, max_workers: int = 2,
+                 poll_interval: float = 5.0):
+        self.fetch_batch = fetch_batch
+        self.apply_results = apply_results
+        self.config = config
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def run_once(self) -> int:
+        """Score every currently unscored review; returns how many were scored."""
+        loop = asyncio.get_running_loop()
+        config = self.config.to_dict()
+        scored = 0
+        while True:
+            batch = await loop.run_in_executor(None, self.fetch_batch, self.batch_size)
+            if not batch:
+                return scored
+            comments = [comment or "" for _, comment, _ in batch]
+            results = await loop.run_in_executor(self.executor, score_comments, comments, config)
+            await loop.run_in_executor(None, self.apply_results, batch, results)
+            scored += len(batch)
+            if len(batch) < self.batch_size:
+                return scored
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning("Review scoring batch failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
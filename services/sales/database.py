@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from utils.database import create_service_engine, database_url
+
 SQLALCHEMY_DATABASE_URL = "sqlite:///./sales.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_service_engine(database_url("sales", SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
@@ -1,40 +1,25 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request
+from sqlalchemy import Column, Integer, String, Float, DateTime, select
+from sqlalchemy.orm import declarative_base, Session
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 import httpx
 from typing import List, Optional
-from prometheus_client import Counter, Histogram, generate_latest
-import time
+from prometheus_client import Counter
 from utils.exceptions import ResourceNotFoundException, InsufficientFundsException
 from utils.version import VersionedAPI
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from .models import Purchase, Base
-from .database import engine, SessionLocal
-from fastapi import FastAPI, HTTPException, Depends, Request
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel, ConfigDict
-from datetime import datetime
-import httpx
-from typing import List, Optional
-from prometheus_client import Counter, Histogram, generate_latest
-import time
-from utils.exceptions import ResourceNotFoundException, InsufficientFundsException
-from utils.version import VersionedAPI
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from .models.purchase import Purchase, Base
-from .database import engine, SessionLocal
-from sqlalchemy.orm import declarative_base  # Updated import
+from utils.batch_loader import BatchLoader
+from utils.auth import service_auth_headers, setup_jwt_auth
+from utils.db_optimization import setup_query_profiler
+from utils.metrics import setup_metrics
+from utils.tracing import setup_tracing
+from utils.database import ServiceDatabase, setup_read_routing
+from utils.streaming import stream_rows
+
 # Database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./sales.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bump whenever a table is added so existing databases pick it up on startup.
+SCHEMA_VERSION = 1
 Base = declarative_base()
 
 # Service URLs
@@ -91,32 +76,28 @@ class PurchaseCreate(BaseModel):
     item_id: int
     quantity: int = 1
 
-# FastAPI app
-app = FastAPI()
-versioned_api = VersionedAPI(app)
-
-# Add version middleware
-app.middleware("http")(versioned_api.version_middleware)
+database = ServiceDatabase(
+    "sales", SQLALCHEMY_DATABASE_URL, Base.metadata, schema_version=SCHEMA_VERSION
+)
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
+get_read_db = database.get_read_db
+
+router = APIRouter()
+versioned_api = VersionedAPI(router)
 
 # Version 1 endpoints
 @versioned_api.version("v1")
-@app.get("/sales/", response_model=List[PurchaseResponse])
-async def list_sales_v1(db: Session = Depends(get_db)):
+@router.get("/sales/", response_model=List[PurchaseResponse])
+async def list_sales_v1(db: Session = Depends(get_read_db)):
     return db.query(Purchase).all()
 
 # Version 2 endpoints with enhanced features
 @versioned_api.version("v2")
-@app.get("/sales/", response_model=List[PurchaseResponse])
+@router.get("/sales/", response_model=List[PurchaseResponse])
 async def list_sales_v2(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100,
     sort_by: str = "purchase_date"
@@ -126,20 +107,27 @@ async def list_sales_v2(
         query = query.order_by(getattr(Purchase, sort_by).desc())
     return query.offset(skip).limit(limit).all()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 # Helper functions
+async def fetch_customers_batch(usernames: List[str]) -> dict:
+    async with httpx.AsyncClient(headers=service_auth_headers("sales")) as client:
+        response = await client.post(
+            f"{CUSTOMER_SERVICE_URL}/customers/batch",
+            json={"usernames": usernames}
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=502, detail="Customer lookup failed")
+        return response.json()
+
+customer_loader = BatchLoader(fetch_customers_batch, max_batch_size=500)
+
 async def get_customer_balance(username: str) -> float:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{CUSTOMER_SERVICE_URL}/customers/{username}")
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        response_data = await response.json()  # Add await here
-        return float(response_data.get('wallet_balance', 0.0))
+    customer = await customer_loader.load(username)
+    if not customer or not customer.get("exists"):
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return float(customer.get('wallet_balance', 0.0))
 
 async def deduct_customer_balance(username: str, amount: float):
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(headers=service_auth_headers("sales")) as client:
         response = await client.post(
             f"{CUSTOMER_SERVICE_URL}/customers/{username}/deduct",
             params={"amount": amount}
@@ -148,7 +136,7 @@ async def deduct_customer_balance(username: str, amount: float):
             raise HTTPException(status_code=400, detail="Failed to deduct money from wallet")
 
 async def get_item_details(item_id: int) -> ItemBase:
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(headers=service_auth_headers("sales")) as client:
         response = await client.get(f"{INVENTORY_SERVICE_URL}/items/{item_id}")
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail="Item not found")
@@ -156,7 +144,7 @@ async def get_item_details(item_id: int) -> ItemBase:
         return ItemBase(**response_json)
 
 async def deduct_item_stock(item_id: int, quantity: int):
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(headers=service_auth_headers("sales")) as client:
         response = await client.post(
             f"{INVENTORY_SERVICE_URL}/items/{item_id}/deduct",
             params={"quantity": quantity}
@@ -218,11 +206,14 @@ async def process_purchase(purchase: PurchaseRequest, db: Session) -> Purchase:
     return db_purchase
 
 # API Endpoints
-@app.get("/items/", response_model=List[ItemBrief])
+@router.get("/items/", response_model=List[ItemBrief])
 async def list_available_items():
     """Display available goods with basic information"""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{INVENTORY_SERVICE_URL}/items/")
+    async with httpx.AsyncClient(headers=service_auth_headers("sales")) as client:
+        response = await client.get(
+            f"{INVENTORY_SERVICE_URL}/items/",
+            params={"fields": "name,price,stock_count"}
+        )
         items = response.json()
         return [
             ItemBrief(name=item["name"], price=item["price"])
@@ -230,33 +221,40 @@ async def list_available_items():
             if item["stock_count"] > 0
         ]
 
-@app.get("/items/{item_id}", response_model=ItemBase)
+@router.get("/items/{item_id}", response_model=ItemBase)
 async def get_item_details_api(item_id: int):
     """Get full details of a specific item"""
     return await get_item_details(item_id)
 
-# Prometheus metrics
-SALES_COUNTER = Counter('total_sales', 'Total number of sales')
-REQUEST_TIME = Histogram('request_processing_seconds', 'Time spent processing request')
+@router.get("/sales/feed")
+def get_purchase_feed(
+    after_id: int = 0,
+    limit: int = Query(5000, ge=1, le=50000)
+):
+    """
+    Purchases with ``id > after_id`` in id order, for incremental consumers
+    such as the analytics service. Page by passing the last id seen.
+    """
+    database.ensure_schema()
+    return stream_rows(
+        database.read_engine(),
+        select(
+            Purchase.id, Purchase.purchase_date, Purchase.customer_username,
+            Purchase.item_id, Purchase.quantity, Purchase.total_price
+        ).where(Purchase.id > after_id).order_by(Purchase.id).limit(limit)
+    )
 
-# Add this endpoint to expose metrics
-@app.get("/metrics")
-def metrics():
-    return generate_latest()
+# Prometheus metrics; request latency and /metrics come from utils.metrics
+SALES_COUNTER = Counter('total_sales', 'Total number of sales')
 
-# Modify the make_purchase endpoint to include metrics
-@app.post("/sales/", response_model=PurchaseResponse)
+@router.post("/sales/", response_model=PurchaseResponse)
 async def make_purchase(purchase: PurchaseRequest, db: Session = Depends(get_db)):
-    start_time = time.time()
-    try:
-        result = await process_purchase(purchase, db)
-        SALES_COUNTER.inc()
-        return result
-    finally:
-        REQUEST_TIME.observe(time.time() - start_time)
-
-@app.get("/purchases/{customer_username}", response_model=List[PurchaseResponse])
-async def get_customer_purchases(customer_username: str, db: Session = Depends(get_db)):
+    result = await process_purchase(purchase, db)
+    SALES_COUNTER.inc()
+    return result
+
+@router.get("/purchases/{customer_username}", response_model=List[PurchaseResponse])
+async def get_customer_purchases(customer_username: str, db: Session = Depends(get_read_db)):
     """Get purchase history for a customer"""
     purchases = db.query(Purchase).filter(
         Purchase.customer_username == customer_username
@@ -265,7 +263,7 @@ async def get_customer_purchases(customer_username: str, db: Session = Depends(g
     return purchases
 
 # Example of using custom exceptions
-@app.post("/sales/", response_model=PurchaseResponse)
+@router.post("/sales/", response_model=PurchaseResponse)
 async def make_purchase(purchase: PurchaseRequest, db: Session = Depends(get_db)):
     try:
         balance = await get_customer_balance(purchase.customer_username)
@@ -332,7 +330,7 @@ class Purchase(Base):
     __tablename__ = "purchases"
     # ... existing columns ...
 
-@app.post("/purchases/", response_model=PurchaseResponse)
+@router.post("/purchases/", response_model=PurchaseResponse)
 async def create_purchase(
     purchase: PurchaseCreate,
     db: Session = Depends(get_db)
@@ -360,4 +358,19 @@ async def create_purchase(
             - 404: Item or customer not found
             - 409: Concurrent transaction conflict
     """
-    # Implementation...
\ No newline at end of file
+    # Implementation...
+
+def create_app() -> FastAPI:
+    """Build the sales service app; the schema is checked during lifespan startup."""
+    app = FastAPI(lifespan=database.lifespan)
+    setup_jwt_auth(app)
+    # Add version middleware
+    app.middleware("http")(versioned_api.version_middleware)
+    app.include_router(router)
+    setup_tracing(app, "sales")
+    setup_metrics(app, "sales")
+    setup_query_profiler(app, "sales")
+    setup_read_routing(app, database)
+    return app
+
+app = create_app()
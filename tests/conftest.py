@@ -8,6 +8,20 @@ from services.reviews.reviews_service import Base as ReviewBase
 from services.sales.sales_service import Base as SaleBase
 from services.reviews.reviews_service import app
 from services.reviews.database import SessionLocal
+from services.analytics import analytics_service
+from services.customer import customer_service
+from services.inventory import inventory_service
+from services.reviews import reviews_service
+from services.sales import sales_service
+from utils.cache import get_redis_client
+
+SERVICE_MODULES = {
+    "analytics": analytics_service,
+    "customer": customer_service,
+    "inventory": inventory_service,
+    "reviews": reviews_service,
+    "sales": sales_service,
+}
 
 @pytest.fixture(autouse=True)
 def setup_test_env():
@@ -15,6 +29,28 @@ def setup_test_env():
     yield
     os.environ.pop("TESTING", None)
 
+@pytest.fixture(autouse=True)
+def service_databases(tmp_path):
+    """
+    Point every service database at a fresh SQLite file under ``tmp_path``
+    so tests never touch the repository's databases or each other's rows.
+    """
+    saved = []
+    for service, module in SERVICE_MODULES.items():
+        database = module.database
+        saved.append((database, {
+            name: getattr(database, name) for name in ("url", "_engine", "_sessionmaker", "_schema_ready")
+        }))
+        database.url = f"sqlite:///{tmp_path / service}.db"
+        database._engine, database._sessionmaker, database._schema_ready = None, None, False
+    # Cached responses are keyed by row id, which restarts in each database
+    get_redis_client().flushall()
+    yield
+    for database, values in reversed(saved):
+        database.dispose()
+        for name, value in values.items():
+            setattr(database, name, value)
+
 @pytest.fixture(scope="function")
 def test_db():
     # Create test database in memory
@@ -0,0 +1,265 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, Mock, patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from services.analytics import analytics_service
+from services.analytics.analytics_service import (
+    ROLLUP_RETENTION, CustomerMetrics, MetricRollup, app, apply_rollups, database, prune_rollups,
+    refresh_customer_snapshot, sync_purchase_facts
+)
+from services.analytics.fact_store import PurchaseFactStore
+from services.analytics.heavy_hitters import SpaceSaving, WindowedHeavyHitters
+from services.analytics.hyperloglog import HyperLogLog
+from services.analytics.quantiles import DDSketch
+from services.analytics.rollups import plan_resolution
+from utils.cache import StaleWhileRevalidateCache
+
+client = TestClient(app)
+
+def make_purchases(count, start, step=timedelta(minutes=30), first_id=1):
+    return [
+        {
+            "id": first_id + i,
+            "purchase_date": (start + i * step).isoformat(),
+            "customer_username": f"customer{i % 4}",
+            "item_id": i % 3,
+            "quantity": 1 + i % 2,
+            "total_price": 10.0 * (1 + i % 2)
+        }
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def fact_store(monkeypatch):
+    database.ensure_schema()
+    store = PurchaseFactStore(initial_capacity=4)
+    monkeypatch.setattr(analytics_service, "fact_store", store)
+    monkeypatch.setattr(analytics_service, "_rollup_watermark", None)
+    monkeypatch.setattr(analytics_service, "heavy_hitters", WindowedHeavyHitters(capacity=8))
+    monkeypatch.setattr(analytics_service, "_sketches_loaded", False)
+    monkeypatch.setattr(analytics_service, "item_categories", {})
+    analytics_service.result_cache.clear()
+    return store
+
+def test_fact_store_ranges_and_late_facts():
+    store = PurchaseFactStore(initial_capacity=4)
+    start = datetime(2024, 1, 1)
+    purchases = make_purchases(96, start)
+    store.append(purchases[:50])
+    store.append(purchases[40:])  # overlapping page is ignored
+
+    assert store.size == 96
+    summary = store.summary(start, start + timedelta(days=1))
+    assert summary["total_orders"] == 48
+    assert summary["total_revenue"] == 720.0
+    assert summary["average_order_value"] == 15.0
+
+    store.append(make_purchases(1, start - timedelta(hours=1), first_id=1000))
+    assert store.summary(start - timedelta(days=1), start)["total_orders"] == 1
+    assert store.summary(start, start + timedelta(days=2))["total_orders"] == 96
+
+def test_dashboard_reads_synced_facts(fact_store):
+    now = datetime.utcnow()
+    purchases = make_purchases(10, now - timedelta(hours=9))
+
+    async def feed(url, **kwargs):
+        if url.endswith("/items/"):
+            categories = [{"id": 0, "category": "food"}, {"id": 1, "category": "clothes"}]
+            return Mock(status_code=200, raise_for_status=Mock(), json=Mock(return_value=categories))
+        after_id = kwargs["params"]["after_id"]
+        return Mock(status_code=200, json=Mock(return_value=[p for p in purchases if p["id"] > after_id]))
+
+    with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+        mock_get.side_effect = feed
+        assert asyncio.run(sync_purchase_facts()) == 10
+        assert asyncio.run(sync_purchase_facts()) == 0
+
+        response = client.get("/analytics/dashboard", params={"time_range": "24h"})
+        # Only the two syncs (and one category lookup) touched the network
+        assert mock_get.call_count == 3
+
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["total_orders"] == 10
+    assert metrics["total_revenue"] == 150.0
+    assert metrics["top_selling_items"][0] == {"item_id": 0, "units_sold": 6, "max_overcount": 0}
+    assert metrics["active_customers"] == 4
+    assert metrics["order_value_percentiles"]["p50"] == pytest.approx(10.0, rel=0.01)
+    assert metrics["order_value_percentiles"]["p99"] == pytest.approx(20.0, rel=0.01)
+
+    response = client.get("/analytics/percentiles", params={"metric": "quantity", "category": "clothes"})
+    assert response.json()["count"] == 3
+    assert response.json()["p90"] == pytest.approx(2.0, rel=0.01)
+    assert client.get("/analytics/percentiles", params={"metric": "visits"}).status_code == 400
+
+    response = client.get("/analytics/trends", params={"metric": "orders", "time_range": "2d"})
+    assert sum(point["value"] for point in response.json()) == 10
+    assert client.get("/analytics/trends", params={"metric": "visits"}).status_code == 400
+
+    too_long = {"metric": "orders", "time_range": "99999999d"}
+    assert client.get("/analytics/trends", params=too_long).status_code == 400
+    assert client.get("/analytics/top-selling", params={"time_range": "99999999d"}).status_code == 400
+    too_fine = {"metric": "orders", "time_range": "3650d", "interval": "minute"}
+    assert client.get("/analytics/trends", params=too_fine).status_code == 400
+
+def test_rollups_are_idempotent_and_pruned(fact_store):
+    start = datetime(2024, 3, 1)
+    purchases = make_purchases(48, start)
+    fact_store.append(purchases)
+
+    assert apply_rollups(purchases[:30]) == 30
+    assert apply_rollups(purchases) == 48  # replayed rows are skipped
+
+    db = database.SessionLocal()
+    day = db.get(MetricRollup, ("day", start))
+    assert (day.orders, day.units, day.revenue, day.new_customers) == (48, 72, 720.0, 4)
+    assert db.get(MetricRollup, ("month", start)).orders == 48
+    assert db.query(MetricRollup).filter_by(resolution="hour").count() == 24
+    db.close()
+
+    prune_rollups(now=start + timedelta(days=3))
+    db = database.SessionLocal()
+    assert db.query(MetricRollup).filter_by(resolution="minute").count() == 0
+    assert db.query(MetricRollup).filter_by(resolution="hour").count() == 24
+    db.close()
+
+def test_customer_snapshot_keeps_one_row_per_hour(fact_store, monkeypatch):
+    customers = {"total_customers": 3, "average_age": 30.0}
+    monkeypatch.setattr(analytics_service, "fetch_customer_data", AsyncMock(return_value=customers))
+    asyncio.run(refresh_customer_snapshot())
+    customers["total_customers"] = 4
+    asyncio.run(refresh_customer_snapshot())
+
+    db = database.SessionLocal()
+    snapshots = db.query(CustomerMetrics).all()
+    db.close()
+    assert len(snapshots) == 1
+    assert snapshots[0].total_customers == 4
+
+def test_trend_resolution_planner():
+    now = datetime(2024, 6, 1)
+    plan = lambda days: plan_resolution(now - timedelta(days=days), now, now, ROLLUP_RETENTION, 500)
+    assert plan(0.25) == "minute"
+    assert plan(1) == "hour"
+    assert plan(365) == "day"
+    assert plan(20 * 365) == "month"
+
+def test_stale_while_revalidate_cache():
+    cache = StaleWhileRevalidateCache("test")
+    calls = []
+
+    async def compute():
+        calls.append(len(calls))
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def scenario():
+        # Concurrent misses share one computation
+        first = await asyncio.gather(*(cache.get("key", compute, 60, 60) for _ in range(20)))
+        assert first == [1] * 20
+        assert await cache.get("key", compute, 60, 60) == 1
+        
+        # Past fresh_for: stale value returned at once, refreshed once in the background
+        stale = await asyncio.gather(*(cache.get("key", compute, 0, 60) for _ in range(5)))
+        assert stale == [1] * 5
+        await asyncio.sleep(0.05)
+        assert await cache.get("key", compute, 60, 60) == 2
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    stats = cache.stats()
+    assert (stats["miss"], stats["stale"], stats["hit"]) == (20, 5, 2)
+
+def test_space_saving_bounds_and_merge():
+    true_counts = {item: 1000 // item for item in range(1, 200)}
+    summaries = [SpaceSaving(capacity=32) for _ in range(3)]
+    for item, count in true_counts.items():
+        for i in range(count):
+            summaries[(item + i) % 3].add(item)
+
+    merged = SpaceSaving.merge([SpaceSaving.from_bytes(s.to_bytes()) for s in summaries])
+    assert merged.total == sum(true_counts.values())
+    for entry in merged.top(32):
+        true = true_counts[entry["item_id"]]
+        assert entry["units_sold"] - entry["max_overcount"] <= true <= entry["units_sold"]
+        assert entry["max_overcount"] <= merged.total / 32
+    assert [entry["item_id"] for entry in merged.top(3)] == [1, 2, 3]
+
+def test_top_selling_sketches_survive_restart(fact_store, monkeypatch):
+    now = datetime.utcnow()
+    purchases = make_purchases(30, now - timedelta(days=3), step=timedelta(hours=2))
+    analytics_service.heavy_hitters.add_rows(purchases)
+    asyncio.run(analytics_service.persist_item_sketches())
+
+    restarted = WindowedHeavyHitters(capacity=8)
+    records, restarted.last_id = analytics_service.read_item_sketches()
+    restarted.load(records)
+    assert restarted.last_id == 30
+    monkeypatch.setattr(analytics_service, "heavy_hitters", restarted)
+
+    response = client.get("/analytics/top-selling", params={"time_range": "7d", "limit": 2})
+    assert response.status_code == 200
+    top = response.json()
+    assert top["total_units"] == 45
+    # Every item sold 15 units; ties rank by item id
+    assert top["items"] == [
+        {"item_id": 0, "units_sold": 15, "max_overcount": 0},
+        {"item_id": 1, "units_sold": 15, "max_overcount": 0}
+    ]
+    assert client.get("/analytics/top-selling", params={"limit": 0}).status_code == 400
+
+def test_hyperloglog_estimates_and_merges():
+    first, second = HyperLogLog(), HyperLogLog()
+    first.add(f"customer{i}" for i in range(30000))
+    second.add(f"customer{i}" for i in range(20000, 50000))
+    assert abs(first.count() - 30000) < 30000 * 0.05
+
+    union = HyperLogLog.union([HyperLogLog.from_bytes(first.to_bytes()), second])
+    assert abs(union.count() - 50000) < 50000 * 0.05
+
+    small = HyperLogLog()
+    small.add(["a", "b", "c", "a"])
+    assert small.count() == 3
+    assert len(small.to_bytes()) < 16  # sparse encoding for nearly empty sketches
+
+def test_active_customers_from_rollup_sketches(fact_store):
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    purchases = make_purchases(2000, now - timedelta(days=60), step=timedelta(minutes=43))
+    for i, purchase in enumerate(purchases):
+        purchase["customer_username"] = f"buyer{i * 7 % 1500}"
+    fact_store.append(purchases)
+    apply_rollups(purchases[:1000])
+    apply_rollups(purchases)
+
+    recent = {
+        p["customer_username"] for p in purchases
+        if datetime.fromisoformat(p["purchase_date"]) >= now - timedelta(days=30)
+    }
+    response = client.get("/analytics/active-customers", params={"time_range": "30d"})
+    assert response.status_code == 200
+    active = response.json()
+    assert abs(active["active_customers"] - len(recent)) <= len(recent) * 0.05
+    assert active["sketches_merged"] < 100
+
+    response = client.get(
+        "/analytics/trends", params={"metric": "active_customers", "time_range": "3d", "interval": "day"}
+    )
+    assert all(point["value"] > 0 for point in response.json()[:-1])
+
+def test_ddsketch_quantiles_merge_within_accuracy():
+    values = np.random.default_rng(7).lognormal(mean=3, sigma=1.5, size=20000)
+    parts = [DDSketch() for _ in range(4)]
+    for i, part in enumerate(parts):
+        part.add(values[i::4])
+        part.add([0.0])
+
+    merged = DDSketch.union([DDSketch.from_bytes(part.to_bytes()) for part in parts])
+    assert merged.count == 20004 and merged.zero_count == 4
+    for q in (0.5, 0.9, 0.99):
+        assert merged.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.02)
+    assert merged.quantile(0) == 0.0
+    assert DDSketch().quantile(0.5) is None
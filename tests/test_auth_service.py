@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, AsyncMock, patch
+from jose import jwt
+from services.auth.auth_service import (
+    app, login_throttle, pwd_context, SECRET_KEY, ALGORITHM, BCRYPT_ROUNDS, dummy_password_hash
+)
+from services.auth.hashing import PasswordHasher, PasswordPoolBusy
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def reset_throttle():
+    login_throttle._entries.clear()
+    yield
+
+@pytest.fixture
+def customer_store():
+    store = {"testuser": {"username": "testuser", "password": "testpass123", "is_active": True}}
+
+    async def mock_get(url, *args, **kwargs):
+        username = url.rstrip("/").split("/")[-2]
+        response = Mock()
+        if username in store:
+            response.status_code = 200
+            response.json.return_value = dict(store[username])
+        else:
+            response.status_code = 404
+        return response
+
+    async def mock_put(url, *args, **kwargs):
+        username = url.rstrip("/").split("/")[-2]
+        store[username]["password"] = kwargs["json"]["password_hash"]
+        return Mock(status_code=200)
+
+    with patch('httpx.AsyncClient.get', new_callable=AsyncMock) as get_mock, \
+            patch('httpx.AsyncClient.put', new_callable=AsyncMock) as put_mock:
+        get_mock.side_effect = mock_get
+        put_mock.side_effect = mock_put
+        yield store
+
+def login(username, password):
+    return client.post("/token", data={"username": username, "password": password})
+
+def test_login_issues_token_and_upgrades_plaintext_hash(customer_store):
+    response = login("testuser", "testpass123")
+    assert response.status_code == 200
+    claims = jwt.decode(response.json()["access_token"], SECRET_KEY, algorithms=[ALGORITHM])
+    assert claims["sub"] == "testuser"
+
+    stored = customer_store["testuser"]["password"]
+    assert stored.startswith("$2b$")
+    assert pwd_context.verify("testpass123", stored)
+
+def test_login_rejects_wrong_password_and_unknown_user(customer_store):
+    assert login("testuser", "wrong").status_code == 401
+    assert login("nobody", "testpass123").status_code == 401
+
+def test_login_locks_out_after_repeated_failures(customer_store):
+    for _ in range(login_throttle.max_failures):
+        assert login("testuser", "wrong").status_code == 401
+
+    response = login("testuser", "testpass123")
+    assert response.status_code == 429
+
+def test_dummy_hash_costs_the_same_as_real_hashes():
+    assert asyncio.run(dummy_password_hash()).startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+
+def test_password_pool_rejects_when_queue_is_full():
+    hasher = PasswordHasher(pwd_context, max_workers=1, max_pending=0)
+    with pytest.raises(PasswordPoolBusy):
+        asyncio.run(hasher.hash("testpass123"))
+
+def test_revoked_token_is_rejected(customer_store):
+    token = login("testuser", "testpass123").json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/token/revoke", headers=headers).status_code == 200
+    assert len(client.get("/revocations").json()["revoked"]) == 1
+    assert client.post("/token/revoke", headers=headers).status_code == 401
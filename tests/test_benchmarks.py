@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from profiling_scripts.benchmark_endpoints import compare_results, parse_rows, run_benchmarks
+from services.inventory import inventory_service
+
+def result(p50, p99, rps, errors=0):
+    return {
+        "service": "inventory", "endpoint": "GET /items/{item_id}", "concurrency": 8,
+        "errors": errors, "throughput_rps": rps, "latency_ms": {"p50": p50, "p99": p99}
+    }
+
+def test_parse_rows():
+    assert parse_rows("1k") == 1000
+    assert parse_rows("250") == 250
+    assert parse_rows("1M") == 1000000
+
+def test_compare_flags_regressions_past_threshold():
+    baseline = {"results": [result(2.0, 10.0, 500)]}
+    assert not compare_results(baseline, {"results": [result(2.1, 10.5, 480)]}, 0.10)[0]["regressed"]
+    assert compare_results(baseline, {"results": [result(2.5, 10.0, 500)]}, 0.10)[0]["regressed"]
+    assert compare_results(baseline, {"results": [result(2.0, 10.0, 400)]}, 0.10)[0]["regressed"]
+    assert compare_results(baseline, {"results": [result(2.0, 10.0, 500, errors=3)]}, 0.10)[0]["regressed"]
+
+def test_benchmark_runs_in_process_against_seeded_database(tmp_path):
+    url = inventory_service.database.url
+    results = asyncio.run(run_benchmarks(
+        ["inventory"], rows=200, concurrency_levels=[1, 4], requests=10, warmup=1,
+        workdir=str(tmp_path), endpoint_filter="GET /items/"
+    ))
+
+    assert {(r["endpoint"], r["concurrency"]) for r in results} == {
+        ("GET /items/{item_id}", 1), ("GET /items/{item_id}", 4), ("GET /items/", 1), ("GET /items/", 4)
+    }
+    assert all(r["errors"] == 0 and r["statuses"] == {"200": 10} for r in results)
+    assert all(r["latency_ms"]["p50"] <= r["latency_ms"]["max"] for r in results)
+    assert (tmp_path / "inventory.db").exists()
+    assert inventory_service.database.url == url
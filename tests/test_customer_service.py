@@ -1,6 +1,13 @@
+import time
+
 import pytest
 from fastapi.testclient import TestClient
-from services.customer.customer_service import app, Customer
+from jose import jwt
+from services.customer.customer_service import (
+    SCHEMA_VERSION, Base, Customer, CustomerAggregate, app, database
+)
+from utils.database import ServiceDatabase
+from utils.auth import service_auth_headers
 
 client = TestClient(app)
 
@@ -22,24 +29,115 @@ def sample_customer_data():
         "preferences": {}
     }
 
+@pytest.fixture
+def customer(sample_customer_data):
+    response = client.post("/customers/", json=sample_customer_data)
+    assert response.status_code == 200
+    return response.json()
+
 def test_create_customer(test_db, sample_customer_data):
-    test_db.query(Customer).delete()
-    test_db.commit()
-    
     response = client.post("/customers/", json=sample_customer_data)
     assert response.status_code == 200
     assert response.json()["username"] == sample_customer_data["username"]
+    assert "password" not in response.json()
 
-def test_get_customer(test_db, sample_customer_data):
+def test_get_customer(test_db, sample_customer_data, customer):
     response = client.get(f"/customers/{sample_customer_data['username']}")
     assert response.status_code == 200
     assert response.json()["username"] == sample_customer_data["username"]
+    assert "password" not in response.json()
 
-def test_update_customer(test_db, sample_customer_data):
+def test_update_customer(test_db, sample_customer_data, customer):
     update_data = {"full_name": "Updated Name", "age": 31}
     response = client.put(
         f"/customers/{sample_customer_data['username']}", 
         json=update_data
     )
     assert response.status_code == 200
-    assert response.json()["full_name"] == "Updated Name"
\ No newline at end of file
+    assert response.json()["full_name"] == "Updated Name"
+
+def test_batch_lookup(test_db, sample_customer_data, customer):
+    username = sample_customer_data["username"]
+    response = client.post(
+        "/customers/batch",
+        json={"usernames": [username, "ghost", username]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert list(data) == [username, "ghost"]
+    assert data[username]["exists"] is True
+    assert data[username]["is_active"] is True
+    assert data["ghost"] == {"exists": False, "is_active": False, "wallet_balance": 0.0}
+
+def test_customer_metrics(test_db, sample_customer_data, customer):
+    response = client.get("/customers/metrics")
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["total_customers"] == 1
+    assert metrics["active_customers"] == 1
+    assert metrics["average_age"] == 30
+    assert metrics["age_histogram"] == {"30-39": 1}
+
+def test_reconcile_customer_metrics(test_db, sample_customer_data, customer):
+    assert client.post("/customers/metrics/reconcile").status_code == 401
+    claims = {"sub": "ops", "role": "admin", "exp": int(time.time()) + 60}
+    admin = {"Authorization": f"Bearer {jwt.encode(claims, 'your-secret-key', algorithm='HS256')}"}
+    response = client.post("/customers/metrics/reconcile", headers=admin)
+    assert response.status_code == 200
+    assert response.json()["corrections"] == {}
+    assert client.get("/customers/metrics").json()["total_customers"] == 1
+
+def test_upgrade_backfills_customer_aggregates(tmp_path):
+    url = f"sqlite:///{tmp_path / 'customers.db'}"
+    old = ServiceDatabase("customer", url, Base.metadata, schema_version=1)
+    old.ensure_schema()
+    with old.engine.begin() as conn:
+        conn.execute(Customer.__table__.insert().values(
+            username="early", full_name="Early Adopter", email="early@example.com",
+            password="x", age=42, is_active=True, wallet_balance=0.0
+        ))
+    old.dispose()
+
+    upgraded = ServiceDatabase(
+        "customer", url, Base.metadata, schema_version=SCHEMA_VERSION, migrations=database.migrations
+    )
+    upgraded.ensure_schema()
+    with upgraded.SessionLocal() as db:
+        counters = {row.name: row.value for row in db.query(CustomerAggregate)}
+    upgraded.dispose()
+    assert counters["total_customers"] == 1 and counters["age_sum"] == 42
+
+def test_get_all_customers_with_fields(test_db, sample_customer_data, customer):
+    response = client.get("/customers/", params={"fields": "username,wallet_balance"})
+    assert response.status_code == 200
+    assert response.json() == [
+        {"username": sample_customer_data["username"], "wallet_balance": 0.0}
+    ]
+
+def test_get_all_customers_rejects_unknown_fields(test_db):
+    response = client.get("/customers/", params={"fields": "username,secret"})
+    assert response.status_code == 400
+    assert client.get("/customers/", params={"fields": "username,password"}).status_code == 400
+
+def test_get_all_customers_defaults_to_every_public_column(test_db, sample_customer_data, customer):
+    customers = client.get("/customers/").json()
+    assert customers == [customer]
+    assert "password" not in customers[0]
+
+def test_customer_credentials(test_db, sample_customer_data, customer):
+    username = sample_customer_data["username"]
+    url = f"/customers/{username}/credentials"
+    assert client.put(url, json={"password_hash": "$2b$12$newhash"}).status_code == 401
+    assert client.get(url).status_code == 401
+
+    headers = service_auth_headers("auth")
+    response = client.put(url, json={"password_hash": "$2b$12$newhash"}, headers=headers)
+    assert response.status_code == 200
+    
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "username": username,
+        "password": "$2b$12$newhash",
+        "is_active": True
+    }
@@ -0,0 +1,183 @@
+import shutil
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, Request, Response
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, String, inspect, text
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import QueuePool
+from utils.database import (
+    ServiceDatabase, SchemaVersionError, create_service_engine, database_url, engine_options,
+    replication_heartbeats, setup_read_routing
+)
+
+Base = declarative_base()
+
+class Widget(Base):
+    __tablename__ = "widgets"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'service.db'}"
+
+def test_ensure_schema_keeps_existing_rows(db_url):
+    database = ServiceDatabase("widgets", db_url, Base.metadata)
+    database.ensure_schema()
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO widgets (name) VALUES ('kept')"))
+    database.dispose()
+
+    restarted = ServiceDatabase("widgets", db_url, Base.metadata)
+    restarted.ensure_schema()
+    with restarted.engine.connect() as conn:
+        assert conn.execute(text("SELECT name FROM widgets")).scalar() == "kept"
+        assert conn.execute(text("SELECT version FROM schema_versions")).scalar() == 1
+
+def test_ensure_schema_adds_tables_on_version_bump(db_url):
+    ServiceDatabase("widgets", db_url, Base.metadata).ensure_schema()
+
+    class Gadget(Base):
+        __tablename__ = "gadgets"
+        id = Column(Integer, primary_key=True)
+
+    try:
+        upgraded = ServiceDatabase("widgets", db_url, Base.metadata, schema_version=2)
+        upgraded.ensure_schema()
+        assert "gadgets" in inspect(upgraded.engine).get_table_names()
+    finally:
+        Base.metadata.remove(Gadget.__table__)
+
+def test_ensure_schema_rejects_newer_database(db_url):
+    ServiceDatabase("widgets", db_url, Base.metadata, schema_version=3).ensure_schema()
+    with pytest.raises(SchemaVersionError):
+        ServiceDatabase("widgets", db_url, Base.metadata, schema_version=2).ensure_schema()
+
+def test_sqlite_connections_get_tuned_pragmas(db_url):
+    database = ServiceDatabase("widgets", db_url, Base.metadata)
+    with database.engine.connect() as conn:
+        pragma = lambda name: conn.execute(text(f"PRAGMA {name}")).scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == 5000
+        assert pragma("cache_size") == -65536
+    assert isinstance(database.engine.pool, QueuePool)
+    database.dispose()
+
+def test_database_url_prefers_environment(monkeypatch):
+    assert database_url("widgets", "sqlite:///./widgets.db") == "sqlite:///./widgets.db"
+    monkeypatch.setenv("DATABASE_URL", "postgresql://db/shared")
+    assert database_url("widgets", "sqlite:///./widgets.db") == "postgresql://db/shared"
+    monkeypatch.setenv("WIDGETS_DATABASE_URL", "postgresql://db/widgets")
+    assert ServiceDatabase("widgets", "sqlite://", Base.metadata).url == "postgresql://db/widgets"
+
+def test_server_databases_get_sized_pool_with_pre_ping(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    options = engine_options("postgresql://user:secret@db:5432/sales")
+    assert options["poolclass"] is QueuePool
+    assert options["pool_size"] == 20 and options["pool_pre_ping"] is True
+    assert "poolclass" not in engine_options("sqlite://")
+
+def test_sqlite_connect_args_are_not_sent_to_other_backends(db_url):
+    with patch("utils.database.create_engine") as create_engine:
+        create_service_engine("postgresql://user:secret@db:5432/sales", connect_args={"timeout": 5})
+        assert "connect_args" not in create_engine.call_args.kwargs
+
+        create_service_engine(db_url, connect_args={"timeout": 5})
+        assert create_engine.call_args.kwargs["connect_args"] == {"check_same_thread": False, "timeout": 5}
+
+@pytest.fixture
+def replicated(tmp_path, db_url):
+    """A primary with one heartbeat written and a file copy of it as the replica."""
+    primary = ServiceDatabase("widgets", db_url, Base.metadata)
+    primary.ensure_schema()
+    primary.write_heartbeat()
+    primary.dispose()
+    shutil.copy(tmp_path / "service.db", tmp_path / "replica.db")
+
+    database = ServiceDatabase(
+        "widgets", db_url, Base.metadata,
+        replica_urls=[f"sqlite:///{tmp_path / 'replica.db'}"], read_your_writes_seconds=30
+    )
+    app = FastAPI()
+
+    @app.get("/widgets")
+    def list_widgets(db: Session = Depends(database.get_read_db)):
+        return [name for name, in db.execute(text("SELECT name FROM widgets"))]
+
+    @app.post("/widgets")
+    def add_widget(db: Session = Depends(database.get_db)):
+        db.execute(text("INSERT INTO widgets (name) VALUES ('new')"))
+        db.commit()
+        return {}
+
+    # Stands in for another service that writes and returns its own pin
+    downstream = FastAPI()
+
+    @downstream.post("/stock")
+    def deduct_stock(request: Request, response: Response):
+        response.headers["X-DB-Pin-Until"] = f"{time.time() + 60:.3f}"
+        return {"forwarded_pin": request.headers.get("X-DB-Pin-Until")}
+
+    @app.post("/checkout")
+    async def checkout():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=downstream)) as client:
+            return (await client.post("http://inventory/stock")).json()
+
+    setup_read_routing(app, database)
+    yield database, TestClient(app)
+    database.dispose()
+
+def test_reads_go_to_replica_until_client_writes(replicated):
+    database, client = replicated
+    assert client.get("/widgets").json() == []
+
+    response = client.post("/widgets")
+    pinned_until = float(response.headers["x-db-pin-until"])
+    assert pinned_until > time.time() + 20
+    assert "db_pin=" in response.headers["set-cookie"]
+
+    # The write is not on the replica; the cookie pins this client to the primary
+    assert client.get("/widgets").json() == ["new"]
+    client.cookies.clear()
+    assert client.get("/widgets").json() == []
+    assert client.get("/widgets", headers={"X-DB-Pin-Until": str(pinned_until)}).json() == ["new"]
+
+def test_lagging_replica_is_skipped(replicated):
+    database, client = replicated
+    client.post("/widgets")
+    with database.replicas[0].begin() as conn:
+        conn.execute(replication_heartbeats.update().values(heartbeat_at=time.time() - 60))
+    database._lag_checked_at = 0.0
+
+    assert database.replica_lag()[0] > database.max_replica_lag
+    assert database.read_engine() is database.engine
+    assert TestClient(client.app).get("/widgets").json() == ["new"]
+
+def test_old_heartbeat_applied_on_replica_is_not_lag(replicated):
+    database, client = replicated
+    stale = time.time() - 60
+    for engine in (database.engine, database.replicas[0]):
+        with engine.begin() as conn:
+            conn.execute(replication_heartbeats.update().values(heartbeat_at=stale))
+    database._lag_checked_at = 0.0
+
+    assert database.replica_lag() == {0: 0.0}
+    assert database.read_engine() is database.replicas[0]
+
+def test_pins_cross_service_calls(replicated):
+    database, client = replicated
+    # A write made by the called service pins the client's next reads
+    response = client.post("/checkout")
+    assert response.json() == {"forwarded_pin": None}
+    pinned_until = float(response.headers["x-db-pin-until"])
+    assert pinned_until > time.time() + 50
+    assert "db_pin=" in response.headers["set-cookie"]
+
+    # and the client's pin is forwarded on later calls
+    assert float(client.post("/checkout").json()["forwarded_pin"]) == pytest.approx(pinned_until)
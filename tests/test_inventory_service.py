@@ -63,4 +63,13 @@ def test_insufficient_stock(test_db, sample_item_data):
     # Try to deduct more than available
     response = client.post(f"/items/{item_id}/deduct", params={"quantity": 20})
     assert response.status_code == 400
-    assert "Insufficient stock" in response.json()["detail"]
\ No newline at end of file
+    assert "Insufficient stock" in response.json()["detail"]
+
+def test_get_all_items_with_fields(test_db, sample_item_data):
+    client.post("/items/", json=sample_item_data)
+    
+    response = client.get("/items/", params={"fields": "id,name"})
+    assert response.status_code == 200
+    items = response.json()
+    assert items
+    assert all(set(item) == {"id", "name"} for item in items)
@@ -0,0 +1,106 @@
+import time
+import pytest
+from fastapi import FastAPI, Depends, HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from utils.auth import (
+    JWTVerifier, RevocationList, BloomFilter, setup_jwt_auth, require_service, require_user,
+    service_auth_headers
+)
+
+KEYS = {"old": "old-secret", "new": "new-secret"}
+
+def make_token(kid, jti="token-1", exp_offset=60):
+    claims = {"sub": "testuser", "jti": jti, "exp": int(time.time()) + exp_offset}
+    return jwt.encode(claims, KEYS[kid], algorithm="HS256", headers={"kid": kid})
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    setup_jwt_auth(app, JWTVerifier(KEYS))
+
+    @app.get("/me")
+    def me(user: dict = Depends(require_user)):
+        return {"username": user["sub"]}
+
+    @app.get("/public")
+    def public():
+        return {"ok": True}
+
+    return app
+
+def test_tokens_from_every_known_key_verify(app):
+    client = TestClient(app)
+    for kid in KEYS:
+        response = client.get("/me", headers={"Authorization": f"Bearer {make_token(kid)}"})
+        assert response.status_code == 200
+        assert response.json() == {"username": "testuser"}
+
+def test_invalid_or_missing_tokens(app):
+    client = TestClient(app)
+    forged = jwt.encode({"sub": "x"}, "wrong", algorithm="HS256", headers={"kid": "new"})
+    assert client.get("/me", headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+    assert client.get("/me").status_code == 401
+    assert client.get("/public").status_code == 200
+
+def test_tokens_without_expiry_are_rejected():
+    verifier = JWTVerifier(KEYS)
+    token = jwt.encode({"sub": "testuser"}, KEYS["new"], algorithm="HS256", headers={"kid": "new"})
+    with pytest.raises(HTTPException):
+        verifier.verify(token)
+
+def test_verifier_caches_claims_until_expiry():
+    verifier = JWTVerifier(KEYS, cache_size=1)
+    token = make_token("new")
+    assert verifier.verify(token) is verifier.verify(token)
+
+    verifier.verify(make_token("old", jti="token-2"))
+    assert len(verifier._cache) == 1
+
+def test_revoked_tokens_are_rejected():
+    revocations = RevocationList()
+    verifier = JWTVerifier(KEYS, revocations=revocations)
+    token = make_token("new", jti="revoked-id")
+    verifier.verify(token)
+
+    revocations.replace(["revoked-id"])
+    with pytest.raises(HTTPException):
+        verifier.verify(token)
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    items = [f"jti-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_service_tokens_pass_required_auth(monkeypatch):
+    monkeypatch.setenv("JWT_SIGNING_KEYS", '{"new": "new-secret"}')
+    monkeypatch.setenv("JWT_ACTIVE_KEY_ID", "new")
+    app = FastAPI()
+    setup_jwt_auth(app, JWTVerifier(KEYS), required=True)
+
+    @app.get("/internal")
+    def internal(caller: dict = Depends(require_service)):
+        return {"caller": caller["sub"]}
+
+    @app.get("/revocations")
+    def revocations():
+        return {"revoked": []}
+
+    @app.get("/revocations-export")
+    def revocations_export():
+        return {"revoked": []}
+
+    client = TestClient(app)
+    assert client.get("/internal").status_code == 401
+    assert client.get("/revocations").status_code == 200
+    assert client.get("/docs").status_code == 200
+    # Exempt paths match exactly, not as bare prefixes
+    assert client.get("/revocations-export").status_code == 401
+    user_headers = {"Authorization": f"Bearer {make_token('new')}"}
+    assert client.get("/internal", headers=user_headers).status_code == 403
+    response = client.get("/internal", headers=service_auth_headers("sales"))
+    assert response.json() == {"caller": "service:sales"}
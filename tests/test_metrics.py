@@ -0,0 +1,77 @@
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from utils.metrics import instrument_pool, setup_metrics
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def build_app():
+    inventory = FastAPI()
+
+    @inventory.get("/items/{item_id}")
+    def get_item(item_id: int):
+        return {"id": item_id}
+
+    app = FastAPI()
+
+    @app.get("/orders/{order_id}")
+    async def get_order(order_id: int):
+        transport = httpx.ASGITransport(app=inventory)
+        async with httpx.AsyncClient(transport=transport, base_url="http://inventory") as client:
+            item = (await client.get(f"/items/{order_id}")).json()
+        return {"id": order_id, "item": item}
+
+    setup_metrics(app, "orders")
+    return app
+
+def test_requests_are_labelled_by_templated_route():
+    client = TestClient(build_app())
+    labels = dict(service="orders", method="GET", route="/orders/{order_id}", status="200")
+    before = sample("http_request_duration_seconds_count", **labels)
+    unmatched_before = sample(
+        "http_request_duration_seconds_count",
+        service="orders", method="GET", route="<unmatched>", status="404"
+    )
+    outbound_before = sample(
+        "http_client_request_duration_seconds_count",
+        service="orders", method="GET", target="inventory", status="200"
+    )
+
+    for order_id in (1, 2, 3):
+        assert client.get(f"/orders/{order_id}").status_code == 200
+    assert client.get("/nope").status_code == 404
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 3
+    assert sample(
+        "http_request_duration_seconds_count",
+        service="orders", method="GET", route="<unmatched>", status="404"
+    ) == unmatched_before + 1
+    assert sample(
+        "http_client_request_duration_seconds_count",
+        service="orders", method="GET", target="inventory", status="200"
+    ) == outbound_before + 3
+    assert sample("http_requests_in_flight", service="orders", method="GET") == 0
+
+def test_metrics_endpoint_serves_text_exposition():
+    response = TestClient(build_app()).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+
+def test_pool_gauges_follow_checkouts():
+    engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=3)
+    instrument_pool(engine, "pool-test")
+    assert sample("db_pool_size", service="pool-test") == 3
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert sample("db_pool_checked_out", service="pool-test") == 1
+        assert sample("db_pool_connections", service="pool-test") == 1
+    assert sample("db_pool_checked_out", service="pool-test") == 0
+    engine.dispose()
+    assert sample("db_pool_connections", service="pool-test") == 0
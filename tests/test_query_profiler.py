@@ -0,0 +1,80 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, String, create_engine, text
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import StaticPool
+
+from utils.db_optimization import (
+    BACKGROUND_ENDPOINT, QueryProfiler, QueryProfilerMiddleware, analyze_query, fingerprint
+)
+
+Base = declarative_base()
+
+class Item(Base):
+    __tablename__ = "items"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, index=True)
+
+def build_app(profiler):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    profiler.instrument(engine, "test")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all([Item(id=i, name=f"item-{i}") for i in range(20)])
+        db.commit()
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with Session(engine) as db:
+            return {"name": db.get(Item, item_id).name}
+
+    @app.get("/items")
+    def list_items():
+        with Session(engine) as db:
+            ids = [row[0] for row in db.execute(text("SELECT id FROM items"))]
+            return [db.execute(text("SELECT name FROM items WHERE id = :id"), {"id": i}).scalar() for i in ids]
+
+    app.add_middleware(QueryProfilerMiddleware, service="test", profiler=profiler)
+    return app, engine
+
+def test_fingerprints_ignore_literals_and_list_lengths():
+    assert fingerprint("SELECT * FROM items WHERE id IN (?, ?, ?) AND name = 'a''b'") == \
+        fingerprint("SELECT  *  FROM items WHERE id IN (?) AND name = 'c' -- note")
+    assert fingerprint("INSERT INTO t (a, b) VALUES (%(a_0)s, %(b_0)s), (%(a_1)s, %(b_1)s)") == \
+        "INSERT INTO t (a, b) VALUES (?, ?), ..."
+    assert fingerprint("SELECT x::text FROM t1 WHERE y = :y LIMIT 10") == \
+        "SELECT x::text FROM t1 WHERE y = ? LIMIT ?"
+
+def test_statements_are_aggregated_per_endpoint_with_n_plus_one_flagged():
+    profiler = QueryProfiler(slow_ms=1e9, n_plus_one_threshold=10)
+    app, _ = build_app(profiler)
+    client = TestClient(app)
+    for item_id in (1, 2, 3):
+        assert client.get(f"/items/{item_id}").status_code == 200
+    assert len(client.get("/items").json()) == 20
+
+    report = profiler.report()["endpoints"]
+    assert BACKGROUND_ENDPOINT in report
+    [lookup] = report["GET /items/{item_id}"]
+    assert lookup["count"] == 3 and lookup["n_plus_one_requests"] == 0
+    assert "WHERE items.id = ?" in lookup["fingerprint"]
+
+    by_fingerprint = {entry["fingerprint"]: entry for entry in report["GET /items"]}
+    loop = by_fingerprint["SELECT name FROM items WHERE id = ?"]
+    assert loop["count"] == 20 and loop["n_plus_one_requests"] == 1
+    assert by_fingerprint["SELECT id FROM items"]["n_plus_one_requests"] == 0
+    assert loop["p99_ms"] >= loop["mean_ms"] > 0
+
+def test_slow_statements_capture_their_plan():
+    profiler = QueryProfiler(slow_ms=0)
+    app, engine = build_app(profiler)
+    TestClient(app).get("/items/5")
+    plans = profiler.report()["slow_plans"]
+    plan = next(entry["plan"] for key, entry in plans.items() if "WHERE items.id = ?" in key)
+    assert any("USING INTEGER PRIMARY KEY" in line for line in plan)
+
+    with Session(engine) as db:
+        query_plan = analyze_query(db, db.query(Item).filter(Item.name == "item-3"))
+    assert any("INDEX ix_items_name" in line for line in query_plan)
@@ -1,11 +1,23 @@
 import pytest
 from fastapi.testclient import TestClient
-from services.reviews.reviews_service import app, Review
+from services.reviews.reviews_service import app, Review, existence_cache, scoring_pipeline
+from services.reviews.scoring import ScoringConfig, score_comments
+from utils import events
+from utils.events import publish_deletion, subscribe_deletions
 from unittest.mock import patch, Mock, AsyncMock
+import asyncio
+import fakeredis
 import httpx
+import time
+from jose import jwt
 
 client = TestClient(app)
 
+@pytest.fixture
+def admin_headers():
+    claims = {"sub": "moderator", "role": "admin", "exp": int(time.time()) + 60}
+    return {"Authorization": f"Bearer {jwt.encode(claims, 'your-secret-key', algorithm='HS256')}"}
+
 @pytest.fixture
 def sample_review_data():
     return {
@@ -33,8 +45,19 @@ def mock_external_services():
             }
         return mock
 
-    with patch('httpx.AsyncClient.get', new_callable=AsyncMock) as mock_get:
+    async def mock_batch_response(*args, **kwargs):
+        mock = Mock()
+        mock.status_code = 200
+        mock.json.return_value = {
+            username: {"exists": True, "is_active": True, "wallet_balance": 0.0}
+            for username in kwargs["json"]["usernames"]
+        }
+        return mock
+
+    with patch('httpx.AsyncClient.get', new_callable=AsyncMock) as mock_get, \
+            patch('httpx.AsyncClient.post', new_callable=AsyncMock) as mock_post:
         mock_get.side_effect = mock_response
+        mock_post.side_effect = mock_batch_response
         yield mock_get
 
 def test_create_review(test_db, sample_review_data, mock_external_services):
@@ -86,5 +109,216 @@ def test_get_product_reviews(test_db, sample_review_data, mock_external_services
     response = client.get(f"/reviews/product/{sample_review_data['item_id']}")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+
+def test_review_stats_follow_moderation(test_db, mock_external_services, admin_headers):
+    item_id = 987654
+    ratings = [4.5, 5, 2]
+    review_ids = []
+    for rating in ratings:
+        response = client.post(
+            "/reviews/",
+            json={"item_id": item_id, "rating": rating, "comment": "Solid product"},
+            params={"customer_username": "testuser"}
+        )
+        review_ids.append(response.json()["id"])
+    
+    # Pending reviews don't count towards the stats
+    assert client.get(f"/reviews/product/{item_id}/stats").json()["total_reviews"] == 0
+    
+    # Only administrators moderate
+    assert client.put(f"/reviews/{review_ids[0]}/moderate", json={"status": "approved"}).status_code == 401
+    claims = {"sub": "testuser", "role": "customer", "exp": int(time.time()) + 60}
+    customer = {"Authorization": f"Bearer {jwt.encode(claims, 'your-secret-key', algorithm='HS256')}"}
+    response = client.post(
+        "/reviews/moderation/bulk", json={"review_ids": review_ids, "status": "approved"}, headers=customer
+    )
+    assert response.status_code == 403
+    
+    for review_id in review_ids:
+        client.put(f"/reviews/{review_id}/moderate", json={"status": "approved"}, headers=admin_headers)
+    client.put(f"/reviews/{review_ids[2]}/moderate", json={"status": "rejected"}, headers=admin_headers)
+    
+    stats = client.get(f"/reviews/product/{item_id}/stats").json()
+    assert stats["total_reviews"] == 2
+    assert stats["average_rating"] == 4.75
+    assert stats["rating_distribution"] == {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}
+    
+    client.delete(f"/reviews/{review_ids[1]}", params={"customer_username": "testuser"})
+    response = client.get("/reviews/stats", params={"item_ids": [item_id, 123456789]})
+    assert response.status_code == 200
+    batch = response.json()
+    assert batch[str(item_id)]["total_reviews"] == 1
+    assert batch[str(item_id)]["average_rating"] == 4.5
+    assert batch["123456789"]["total_reviews"] == 0
+
+def test_product_reviews_keyset_pagination(test_db, mock_external_services, admin_headers):
+    item_id = 987655
+    for rating in [1, 2, 3, 4, 5]:
+        response = client.post(
+            "/reviews/",
+            json={"item_id": item_id, "rating": rating, "comment": "Paged review"},
+            params={"customer_username": "testuser"}
+        )
+        client.put(f"/reviews/{response.json()['id']}/moderate", json={"status": "approved"}, headers=admin_headers)
+    
+    seen = []
+    cursor = None
+    while True:
+        params = {"sort": "rating", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"/reviews/product/{item_id}", params=params)
+        assert response.status_code == 200
+        seen.extend(review["rating"] for review in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    
+    assert seen == [5, 4, 3, 2, 1]
+    
+    response = client.get(f"/reviews/product/{item_id}", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+def test_moderation_queue_leases_and_bulk_moderation(test_db, mock_external_services, admin_headers):
+    # Lease out whatever is already pending so only this test's reviews remain
+    while client.post("/reviews/moderation/claim", json={"moderator": "backlog", "batch_size": 100}).json():
+        pass
+    
+    item_id = 987656
+    review_ids = [
+        client.post(
+            "/reviews/",
+            json={"item_id": item_id, "rating": rating, "comment": "Queued review"},
+            params={"customer_username": "testuser"}
+        ).json()["id"]
+        for rating in [4, 5, 2]
+    ]
+    
+    alice = client.post("/reviews/moderation/claim", json={"moderator": "alice", "batch_size": 2})
+    bob = client.post("/reviews/moderation/claim", json={"moderator": "bob", "batch_size": 2})
+    alice_ids = [review["id"] for review in alice.json()]
+    bob_ids = [review["id"] for review in bob.json()]
+    assert alice_ids == review_ids[:2]
+    assert bob_ids == review_ids[2:]
+    
+    # Bob cannot moderate reviews leased to Alice
+    response = client.post(
+        "/reviews/moderation/bulk",
+        json={"review_ids": alice_ids, "status": "approved", "moderator": "bob"},
+        headers=admin_headers
+    )
+    assert response.json() == {"updated": [], "skipped": alice_ids}
     
-    
\ No newline at end of file
+    response = client.post(
+        "/reviews/moderation/bulk",
+        json={"review_ids": alice_ids + [0], "status": "approved", "moderator": "alice"},
+        headers=admin_headers
+    )
+    assert response.json() == {"updated": alice_ids, "skipped": [0]}
+    
+    stats = client.get(f"/reviews/product/{item_id}/stats").json()
+    assert stats["total_reviews"] == 2
+    assert stats["average_rating"] == 4.5
+    
+    client.post(
+        "/reviews/moderation/bulk",
+        json={"review_ids": alice_ids[:1], "status": "rejected"},
+        headers=admin_headers
+    )
+    stats = client.get(f"/reviews/product/{item_id}/stats").json()
+    assert stats["total_reviews"] == 1
+    assert stats["rating_distribution"]["5"] == 1
+    
+    # Editing a leased review releases the lease so it can be claimed again
+    response = client.put(
+        f"/reviews/{bob_ids[0]}",
+        json={"item_id": item_id, "rating": 3, "comment": "Edited review"},
+        params={"customer_username": "testuser"}
+    )
+    assert response.status_code == 200
+    carol = client.post("/reviews/moderation/claim", json={"moderator": "carol", "batch_size": 2})
+    assert [review["id"] for review in carol.json()] == bob_ids
+
+def test_existence_checks_are_cached_until_deleted(test_db, mock_external_services):
+    item_id = 987657
+    existence_cache.clear()
+    review = {"item_id": item_id, "rating": 4, "comment": "Cached check"}
+    
+    client.post("/reviews/", json=review, params={"customer_username": "testuser"})
+    calls = mock_external_services.call_count
+    response = client.post("/reviews/", json=review, params={"customer_username": "testuser"})
+    assert response.status_code == 200
+    assert mock_external_services.call_count == calls
+    
+    publish_deletion("item", item_id)
+    deadline = time.monotonic() + 2
+    while existence_cache.get(("item", item_id)) is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    
+    # The item is gone: the 404 is returned and cached as a miss
+    mock_external_services.side_effect = None
+    mock_external_services.return_value = Mock(status_code=404)
+    response = client.post("/reviews/", json=review, params={"customer_username": "testuser"})
+    assert response.status_code == 404
+    assert existence_cache.get(("item", item_id)) is False
+    
+    response = client.post("/reviews/", json=review, params={"customer_username": "testuser"})
+    assert response.status_code == 404
+    assert mock_external_services.call_count == calls + 1
+
+def test_score_comments_decisions():
+    results = score_comments([
+        "Comfortable shoes, true to size and they survived a rainy week.",
+        "cheap cheap cheap cheap cheap deal http://spam.example http://spam.example",
+        "Not a scam, not fake either, just a decent charger."
+    ], ScoringConfig().to_dict())
+    
+    assert [decision for decision, _, _ in results] == ["approve", "flag", "flag"]
+    assert "links" in results[1][2]
+    assert "blocked terms" in results[2][2]
+
+def test_scoring_pipeline_moderates_pending_reviews(test_db, mock_external_services):
+    item_id = 987658
+    for comment in ["Lovely lamp, warm light and easy to assemble.", "casino casino casino casino http://win.example"]:
+        client.post(
+            "/reviews/",
+            json={"item_id": item_id, "rating": 5, "comment": comment},
+            params={"customer_username": "testuser"}
+        )
+    
+    async def score():
+        try:
+            return await scoring_pipeline.run_once()
+        finally:
+            await scoring_pipeline.stop()
+    
+    assert asyncio.run(score()) >= 2
+    reviews = client.get(f"/reviews/product/{item_id}", params={"status": "flagged"}).json()
+    assert len(reviews) == 1
+    stats = client.get(f"/reviews/product/{item_id}/stats").json()
+    assert stats["total_reviews"] == 1
+
+def test_deletion_events_reach_subscribers_on_other_connections(monkeypatch):
+    server = fakeredis.FakeServer()
+    clients = []
+
+    def connect(url):
+        clients.append(fakeredis.FakeStrictRedis(server=server))
+        return clients[-1]
+
+    monkeypatch.setenv("REDIS_URL", "redis://events:6379/0")
+    monkeypatch.setattr(events, "_publisher", None)
+    received = []
+    with patch("redis.Redis.from_url", side_effect=connect):
+        worker = subscribe_deletions(lambda entity, key: received.append((entity, key)), poll_interval=0.01)
+        try:
+            publish_deletion("customer", "alice")
+            deadline = time.monotonic() + 2
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            worker.stop()
+
+    # One connection for the subscriber, another for the publisher
+    assert len(clients) == 2 and clients[0] is not clients[1]
+    assert received == [("customer", "alice")]
@@ -5,6 +5,8 @@ from unittest.mock import patch
 from unittest.mock import Mock, patch
 from unittest.mock import AsyncMock
 import httpx
+import asyncio
+from services.sales.sales_service import Purchase, database, get_customer_balance
 client = TestClient(app)
 
 @pytest.fixture
@@ -44,8 +46,18 @@ def mock_external_services(monkeypatch):
             }
         )
     
+    async def mock_post(*args, **kwargs):
+        if "batch" in str(args):
+            response = Mock(status_code=200)
+            response.json.return_value = {
+                username: {"exists": True, "is_active": True, "wallet_balance": 1000.0}
+                for username in kwargs["json"]["usernames"]
+            }
+            return response
+        return MockResponse(200, {"message": "Success"})
+    
     get_mock = AsyncMock(side_effect=mock_get)
-    post_mock = AsyncMock(return_value=MockResponse(200, {"message": "Success"}))
+    post_mock = AsyncMock(side_effect=mock_post)
     
     with monkeypatch.context() as m:
         m.setattr(httpx.AsyncClient, "get", get_mock)
@@ -64,4 +76,45 @@ def test_get_customer_purchases(test_db, sample_purchase_data, mock_external_ser
     # Get purchase history
     response = client.get(f"/purchases/{sample_purchase_data['customer_username']}")
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
\ No newline at end of file
+    assert isinstance(response.json(), list)
+
+def test_customer_balance_lookups_are_batched(mock_external_services):
+    get_mock, post_mock = mock_external_services
+    
+    async def lookup():
+        return await asyncio.gather(
+            get_customer_balance("alice"),
+            get_customer_balance("bob"),
+            get_customer_balance("alice")
+        )
+    
+    assert asyncio.run(lookup()) == [1000.0, 1000.0, 1000.0]
+    assert post_mock.call_count == 1
+    assert post_mock.call_args.kwargs["json"] == {"usernames": ["alice", "bob"]}
+
+def test_purchase_feed_pages_by_id():
+    database.ensure_schema()
+    db = database.SessionLocal()
+    try:
+        db.add_all([
+            Purchase(customer_username="feeduser", item_id=1, item_name="Item", quantity=1,
+                     price_per_item=2.0, total_price=2.0)
+            for _ in range(5)
+        ])
+        db.commit()
+        ids = [purchase.id for purchase in db.query(Purchase).order_by(Purchase.id)]
+    finally:
+        db.close()
+
+    def page(after_id):
+        response = client.get("/sales/feed", params={"after_id": after_id, "limit": 2})
+        assert response.status_code == 200
+        return [row["id"] for row in response.json()]
+
+    # The feed is read-only, so it is served from a replica when one is healthy
+    with patch.object(database, "read_engine", wraps=database.read_engine) as read_engine:
+        assert page(0) == ids[:2]
+        assert page(ids[1]) == ids[2:4]
+        assert page(ids[3]) == ids[4:]
+        assert page(ids[4]) == []
+    assert read_engine.call_count == 4
@@ -0,0 +1,68 @@
+import time
+
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from services.analytics import analytics_service
+from services.analytics.analytics_service import app
+from utils.sampling_profiler import SamplingProfiler
+
+client = TestClient(app)
+
+def make_token(username):
+    claims = {"sub": username, "exp": int(time.time()) + 60}
+    return {"Authorization": f"Bearer {jwt.encode(claims, 'your-secret-key', algorithm='HS256')}"}
+
+def busy_checkout_handler(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+def test_sampler_records_only_sampled_requests():
+    profiler = SamplingProfiler(sample_rate_hz=200, request_probability=1.0, enabled=True)
+    try:
+        with profiler.request() as sampled:
+            assert sampled
+            busy_checkout_handler(0.3)
+        stats = profiler.stats()
+        assert stats["sampled_requests"] == 1
+        assert stats["samples"] > 5
+        assert stats["overhead_ratio"] < 0.02
+
+        top_stack, count = profiler.collapsed().splitlines()[0].rsplit(" ", 1)
+        assert top_stack.endswith("test_sampling_profiler.py:busy_checkout_handler")
+        assert int(count) > 5
+
+        profiler.configure(request_probability=0.0)
+        samples = profiler.samples
+        with profiler.request() as sampled:
+            assert not sampled
+            busy_checkout_handler(0.1)
+        assert profiler.samples == samples
+    finally:
+        profiler.stop()
+
+def test_profiling_admin_endpoint(monkeypatch):
+    monkeypatch.setenv("ADMIN_USERNAMES", "ops")
+    profiler = analytics_service.profiling_manager.profiler
+    assert client.get("/admin/profiling").status_code == 401
+    assert client.get("/admin/profiling", headers=make_token("shopper")).status_code == 403
+
+    admin = make_token("ops")
+    try:
+        response = client.put(
+            "/admin/profiling", json={"enabled": True, "request_probability": 1.0}, headers=admin
+        )
+        assert response.status_code == 200
+        assert response.json()["enabled"] is True
+
+        client.get("/analytics/top-selling", params={"limit": 0})
+        assert profiler.stats()["sampled_requests"] >= 1
+        assert client.get("/admin/profiling/flamegraph", headers=admin).status_code == 200
+        assert client.put("/admin/profiling", json={"request_probability": 2}, headers=admin).status_code == 422
+    finally:
+        client.put("/admin/profiling", json={"enabled": False}, headers=admin)
+        client.delete("/admin/profiling/samples", headers=admin)
+    assert profiler.enabled is False
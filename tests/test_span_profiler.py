@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.analytics import analytics_service
+from utils import span_profiler
+from utils.span_profiler import SpanRecorder, profile_span, run_in_executor_with_context, span
+
+def burn_cpu(seconds):
+    deadline = time.thread_time() + seconds
+    while time.thread_time() < deadline:
+        pass
+
+def test_async_spans_split_cpu_blocked_and_awaited_time():
+    recorder = SpanRecorder()
+
+    @profile_span("load_rows", kind="db", recorder=recorder)
+    def load_rows():
+        time.sleep(0.02)
+
+    @profile_span("handler", kind="endpoint", recorder=recorder)
+    async def handler(delay_first):
+        if delay_first:
+            await asyncio.sleep(0.01)
+        burn_cpu(0.03)
+        await asyncio.sleep(0.05)
+        await run_in_executor_with_context(load_rows)
+        with span("render", recorder=recorder):
+            burn_cpu(0.005)
+
+    async def scenario():
+        # Two interleaved requests: neither may be charged the other's CPU
+        await asyncio.gather(handler(False), handler(True))
+
+    asyncio.run(scenario())
+    report = recorder.report()
+    assert set(report) == {"handler"}
+
+    endpoint = report["handler"]
+    assert endpoint["wall_ms"]["count"] == 2
+    assert endpoint["cpu_ms"]["max"] == pytest.approx(35, abs=8)
+    assert endpoint["awaited_ms"]["mean"] >= 70
+    assert endpoint["mean_ms_by_kind"]["db"] == pytest.approx(20, abs=10)
+    assert endpoint["spans"]["load_rows"]["blocked_ms"]["mean"] >= 15
+    assert endpoint["spans"]["render"]["wall_ms"]["count"] == 2
+
+def test_analytics_routes_record_endpoint_spans():
+    recorder = span_profiler.recorder
+    recorder.reset()
+    analytics_service.result_cache.clear()
+    client = TestClient(analytics_service.app)
+
+    assert client.get("/analytics/trends", params={"metric": "orders", "time_range": "2d"}).status_code == 200
+    assert client.get("/analytics/percentiles", params={"metric": "visits"}).status_code == 400
+
+    report = recorder.report()
+    assert report["GET /analytics/percentiles"]["wall_ms"]["count"] == 1
+    trends = report["GET /analytics/trends"]
+    assert trends["spans"]["load_trend"]["kind"] == "db"
+    assert "db" in trends["mean_ms_by_kind"]
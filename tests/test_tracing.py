@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from profiling_scripts.merge_traces import assemble_trace, load_spans
+from utils import tracing
+from utils.tracing import (
+    NdjsonFileExporter, TraceSpan, critical_path, instrument_engine, parse_traceparent, setup_tracing
+)
+
+@pytest.fixture
+def traced(monkeypatch):
+    monkeypatch.setattr(tracing.tracer, "sample_rate", 1.0)
+    tracing.tracer.buffer.clear()
+    yield tracing.tracer
+    tracing.tracer.buffer.clear()
+
+def build_services():
+    engine = create_engine("sqlite:///:memory:")
+    instrument_engine(engine, "inventory")
+
+    inventory = FastAPI()
+
+    @inventory.post("/items/{item_id}/deduct")
+    def deduct(item_id: int):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT :id"), {"id": item_id})
+        return {"ok": True}
+
+    setup_tracing(inventory, "inventory")
+
+    sales = FastAPI()
+
+    @sales.post("/sales/")
+    async def purchase():
+        transport = httpx.ASGITransport(app=inventory)
+        async with httpx.AsyncClient(transport=transport, base_url="http://inventory") as client:
+            response = await client.post("/items/7/deduct")
+        return response.json()
+
+    setup_tracing(sales, "sales")
+    return sales
+
+def test_trace_spans_services_http_and_sql(traced):
+    response = TestClient(build_services()).post("/sales/")
+    assert response.status_code == 200
+    trace_id, _, sampled = parse_traceparent(response.headers["traceparent"])
+    assert sampled
+
+    spans = {span["name"]: span for span in traced.buffer.spans(trace_id)}
+    assert set(spans) == {"POST testserver/sales/", "POST /sales/", "POST inventory/items/7/deduct", "POST /items/{item_id}/deduct", "inventory SELECT"}
+    server, client, downstream, query = (
+        spans["POST /sales/"], spans["POST inventory/items/7/deduct"],
+        spans["POST /items/{item_id}/deduct"], spans["inventory SELECT"]
+    )
+    assert spans["POST testserver/sales/"]["parent_id"] is None
+    assert server["parent_id"] == spans["POST testserver/sales/"]["span_id"] and server["service"] == "sales"
+    assert client["parent_id"] == server["span_id"]
+    assert downstream["parent_id"] == client["span_id"] and downstream["service"] == "inventory"
+    assert query["parent_id"] == downstream["span_id"] and query["kind"] == "db"
+
+    path = critical_path(traced.buffer.spans(trace_id))
+    assert [step["name"] for step in path] == [
+        "POST testserver/sales/", "POST /sales/", "POST inventory/items/7/deduct", "POST /items/{item_id}/deduct", "inventory SELECT"
+    ]
+    assert all(step["self_ms"] <= step["duration_ms"] for step in path)
+
+def test_unsampled_traces_propagate_but_are_not_exported(traced):
+    client = TestClient(build_services())
+    parent = "00-" + "ab" * 16 + "-" + "cd" * 8 + "-00"
+    response = client.post("/sales/", headers={"traceparent": parent})
+    assert response.headers["traceparent"].startswith("00-" + "ab" * 16)
+    assert traced.buffer.spans() == []
+    assert parse_traceparent("00-" + "0" * 32 + "-" + "cd" * 8 + "-01") is None
+
+def test_ndjson_exporter_appends_spans(tmp_path):
+    exporter = NdjsonFileExporter(str(tmp_path / "spans.ndjson"))
+    for name in ("first", "second"):
+        exporter.export(TraceSpan("ab" * 16, None, name, "internal", "sales", True))
+    exporter.close()
+    lines = (tmp_path / "spans.ndjson").read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["first", "second"]
+
+def test_merged_span_files_give_cross_service_critical_path(traced, tmp_path):
+    response = TestClient(build_services()).post("/sales/")
+    trace_id = parse_traceparent(response.headers["traceparent"])[0]
+
+    # One export file per service, as in a one-container-per-service deployment
+    for service in ("sales", "inventory"):
+        with open(tmp_path / f"{service}.ndjson", "w") as f:
+            for span in traced.buffer.spans(trace_id):
+                if span["service"] == service:
+                    f.write(json.dumps(span) + "\n")
+            f.write('{"truncated')
+
+    files = [str(tmp_path / "sales.ndjson"), str(tmp_path / "inventory.ndjson")]
+    trace = assemble_trace(load_spans(files), trace_id)
+    assert trace["services"] == ["inventory", "sales"]
+    assert [step["service"] for step in trace["critical_path"]][-2:] == ["inventory", "inventory"]
+    assert trace["critical_path"][-1]["name"] == "inventory SELECT"
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY_ID = "default"
+DEFAULT_EXEMPT_PATHS = (
+    "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json", "/metrics", "/token", "/revocations"
+)
+SERVICE_ROLE = "service"
+SERVICE_TOKEN_TTL_SECONDS = 300
+
+
+def load_signing_keys() -> Dict[str, str]:
+    """
+    Read the key-id -> secret map shared by the auth service and verifiers.
+
+    ``JWT_SIGNING_KEYS`` holds a JSON object such as ``{"2024-06": "s3cret"}``.
+    Keeping retired keys in the map lets tokens they signed verify until they
+    expire, while new tokens are signed with ``JWT_ACTIVE_KEY_ID``.
+    """
+    raw = os.getenv("JWT_SIGNING_KEYS")
+    if raw:
+        return json.loads(raw)
+    return {DEFAULT_KEY_ID: os.getenv("JWT_SECRET_KEY", "your-secret-key")}
+
+
+def active_key_id(keys: Dict[str, str]) -> str:
+    kid = os.getenv("JWT_ACTIVE_KEY_ID")
+    if kid:
+        return kid
+    return DEFAULT_KEY_ID if DEFAULT_KEY_ID in keys else next(iter(keys))
+
+
+_service_tokens: Dict[str, Tuple[str, float]] = {}
+
+
+def service_token(service: str) -> str:
+    """
+    Short-lived token identifying ``service`` on calls to the other
+    services: ``sub`` is ``service:<name>`` and ``role`` is ``service``.
+    Signed with the active shared key and reused until close to expiry.
+    """
+    cached = _service_tokens.get(service)
+    now = time.time()
+    if cached is not None and cached[1] - now > SERVICE_TOKEN_TTL_SECONDS / 5:
+        return cached[0]
+    keys = load_signing_keys()
+    kid = active_key_id(keys)
+    expires = now + SERVICE_TOKEN_TTL_SECONDS
+    token = jwt.encode(
+        {"sub": f"service:{service}", "role": SERVICE_ROLE, "exp": int(expires)},
+        keys[kid], algorithm="HS256", headers={"kid": kid}
+    )
+    _service_tokens[service] = (token, expires)
+    return token
+
+
+def service_auth_headers(service: str) -> Dict[str, str]:
+    """Authorization header for an inter-service request made by ``service``."""
+    return {"Authorization": f"Bearer {service_token(service)}"}
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for ``capacity`` items at ``error_rate``."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationList:
+    """
+    Set of revoked token ids (``jti``), checked on every authenticated request.
+
+    Lookups go through a Bloom filter first, so the common not-revoked case
+    never touches the exact set; positives are confirmed against the set.
+    ``fetch`` is polled at most every ``refresh_interval`` seconds, in a
+    background task, to replace the contents.
+    """
+
+    def __init__(self, fetch: Optional[Callable[[], Awaitable[Iterable[str]]]] = None,
+                 refresh_interval: float = 30.0):
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self._revoked = frozenset()
+        self._bloom = BloomFilter(1)
+        self._last_refresh = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def replace(self, revoked: Iterable[str]):
+        revoked = frozenset(revoked)
+        bloom = BloomFilter(len(revoked))
+        for item in revoked:
+            bloom.add(item)
+        self._revoked, self._bloom = revoked, bloom
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self._bloom and token_id in self._revoked
+
+    def maybe_refresh(self):
+        if self.fetch is None or time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._last_refresh = time.monotonic()
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def _refresh(self):
+        try:
+            self.replace(await self.fetch())
+        except Exception as e:
+            logger.warning("Failed to refresh token revocation list: %s", e)
+
+
+class JWTVerifier:
+    """
+    In-process JWT verification with a bounded LRU of decoded claims.
+
+    Cache entries are keyed by the SHA-256 of the token and are only served
+    until the token's ``exp``. The signing key is chosen by the ``kid``
+    header, so several keys can be valid during a rotation.
+    """
+
+    def __init__(self, keys: Dict[str, str], algorithms=("HS256",), cache_size: int = 10000,
+                 revocations: Optional[RevocationList] = None):
+        self.keys = keys
+        self.algorithms = list(algorithms)
+        self.cache_size = cache_size
+        self.revocations = revocations or RevocationList()
+        self._cache: "OrderedDict[bytes, dict]" = OrderedDict()
+
+    def _decode(self, token: str) -> dict:
+        try:
+            kid = jwt.get_unverified_header(token).get("kid", DEFAULT_KEY_ID)
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        key = self.keys.get(kid)
+        if key is None:
+            raise HTTPException(status_code=401, detail="Unknown signing key")
+        try:
+            return jwt.decode(token, key, algorithms=self.algorithms, options={"require_exp": True})
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+    def verify(self, token: str) -> dict:
+        cache_key = hashlib.sha256(token.encode()).digest()
+        claims = self._cache.get(cache_key)
+        if claims is not None and claims["exp"] > time.time():
+            self._cache.move_to_end(cache_key)
+        else:
+            self._cache.pop(cache_key, None)
+            claims = self._decode(token)
+            self._cache[cache_key] = claims
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        token_id = claims.get("jti")
+        if token_id and token_id in self.revocations:
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        return claims
+
+
+async def fetch_revocations_from_auth_service() -> Iterable[str]:
+    import httpx
+
+    auth_url = os.getenv("AUTH_SERVICE_URL", "http://auth_service:8000")
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        response = await client.get(f"{auth_url}/revocations")
+        response.raise_for_status()
+        return response.json()["revoked"]
+
+
+def is_exempt(path: str, exempt_paths) -> bool:
+    """Whether ``path`` equals an exempt path or lies under one ending in ``/``."""
+    return any(path == exempt or (exempt.endswith("/") and path.startswith(exempt))
+               for exempt in exempt_paths)
+
+
+def setup_jwt_auth(app: FastAPI, verifier: Optional[JWTVerifier] = None,
+                   required: Optional[bool] = None, exempt_paths=DEFAULT_EXEMPT_PATHS):
+    """
+    Install bearer-token verification on ``app``.
+
+    Verified claims are stored on ``request.state.user``. Requests with an
+    invalid, expired or revoked token get a 401. Requests without a token
+    pass through unless ``required`` (default: ``JWT_AUTH_REQUIRED``) is set.
+    Services call each other with ``service_auth_headers``.
+    """
+    if verifier is None:
+        verifier = JWTVerifier(
+            load_signing_keys(),
+            revocations=RevocationList(fetch_revocations_from_auth_service)
+        )
+    if required is None:
+        required = os.getenv("JWT_AUTH_REQUIRED", "").lower() in ("1", "true", "yes")
+    app.state.jwt_verifier = verifier
+
+    async def jwt_auth_middleware(request: Request, call_next):
+        request.state.user = None
+        authorization = request.headers.get("Authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if token and scheme.lower() == "bearer":
+            verifier.revocations.maybe_refresh()
+            try:
+                request.state.user = verifier.verify(token)
+            except HTTPException as e:
+                return JSONResponse(
+                    status_code=e.status_code,
+                    content={"detail": e.detail},
+                    headers={"WWW-Authenticate": "Bearer"}
+                )
+        elif required and not is_exempt(request.url.path, exempt_paths):
+            return JSONResponse(
+                status_code=401,
+                content={"detail": "Not authenticated"},
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        return await call_next(request)
+
+    app.middleware("http")(jwt_auth_middleware)
+    return verifier
+
+
+def require_user(request: Request) -> dict:
+    """Dependency returning the verified token claims, or 401 when absent."""
+    user = getattr(request.state, "user", None)
+    if user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return user
+
+
+def require_admin(request: Request) -> dict:
+    """
+    Dependency for operator endpoints: the verified claims of an admin, else
+    401/403. Admins are tokens with ``role: admin`` or subjects listed in
+    the comma-separated ``ADMIN_USERNAMES``.
+    """
+    user = require_user(request)
+    admins = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+    if user.get("role") != "admin" and user.get("sub") not in admins:
+        raise HTTPException(status_code=403, detail="Administrator access required")
+    return user
+
+
+def require_service(request: Request) -> dict:
+    """Dependency for internal endpoints: the verified claims of a service token, else 401/403."""
+    user = require_user(request)
+    if user.get("role") != SERVICE_ROLE:
+        raise HTTPException(status_code=403, detail="Service access required")
+    return user
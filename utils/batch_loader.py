@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class BatchLoader:
+    """
+    Coalesce individual key lookups issued within one event-loop tick into a
+    single call to ``batch_fn`` (the DataLoader pattern).
+
+    ``batch_fn`` receives a list of unique keys and returns a mapping of key to
+    value. Keys missing from the mapping resolve to ``None``.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        max_batch_size: int = 100
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self._pending: Optional[Dict[Hashable, List[asyncio.Future]]] = None
+        self._pending_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def load(self, key: Hashable) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._pending is None or self._pending_loop is not loop:
+            self._pending = {}
+            self._pending_loop = loop
+            loop.create_task(self._dispatch())
+
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        return await future
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    async def _dispatch(self):
+        # Detach the batch first so keys requested while the lookup is in
+        # flight start a new batch instead of being dropped.
+        batch, self._pending = self._pending, None
+        self._pending_loop = None
+        if not batch:
+            return
+
+        keys = list(batch)
+        chunks = [
+            keys[i:i + self.max_batch_size]
+            for i in range(0, len(keys), self.max_batch_size)
+        ]
+        results = await asyncio.gather(
+            *(self.batch_fn(chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+
+        for chunk, result in zip(chunks, results):
+            for key in chunk:
+                for future in batch[key]:
+                    if future.done():
+                        continue
+                    if isinstance(result, BaseException):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result.get(key))
@@ -1,19 +1,40 @@
 from fastapi import FastAPI
-import redis
+import asyncio
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Optional, Callable
+from typing import Awaitable, Callable, Dict, Hashable, Optional
 import os
-import fakeredis
 from pydantic import BaseModel
+from prometheus_client import Counter
 
-redis_client = fakeredis.FakeStrictRedis()
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = Counter(
+    "result_cache_requests_total",
+    "Result cache lookups by outcome (hit, stale or miss)",
+    ["cache", "result"]
+)
+
+_redis_client = None
+
+def get_redis_client():
+    """Return the shared cache client, importing fakeredis on first use."""
+    global _redis_client
+    if _redis_client is None:
+        import fakeredis
+        _redis_client = fakeredis.FakeStrictRedis()
+    return _redis_client
 
 def cache_response(expire_time_seconds=300):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
+            redis_client = get_redis_client()
             cached_response = redis_client.get(cache_key)
             
             if cached_response:
@@ -40,5 +61,130 @@ def cache_response(expire_time_seconds=300):
 
 def invalidate_cache(pattern: str):
     """Invalidate cache entries matching the pattern"""
+    redis_client = get_redis_client()
     for key in redis_client.scan_iter(pattern):
-        redis_client.delete(key)
\ No newline at end of file
+        redis_client.delete(key)
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after a per-entry TTL.
+
+    Thread-safe, so event subscriber threads can invalidate entries while
+    request handlers read them. ``get`` returns ``None`` for missing or
+    expired keys, so ``None`` itself cannot be cached.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StaleWhileRevalidateCache:
+    """
+    Async result cache that serves stale values while refreshing them.
+
+    An entry younger than ``fresh_for`` is a hit. Up to ``stale_for``
+    seconds after that it is still returned immediately, and a single
+    background task recomputes it. Older or missing entries are computed
+    inline; concurrent callers for the same key share that one computation,
+    so the load on ``compute`` does not grow with the number of callers.
+    Keys should be normalised by the caller.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.counts = {"hit": 0, "stale": 0, "miss": 0}
+
+    def _record(self, result: str):
+        self.counts[result] += 1
+        CACHE_REQUESTS.labels(cache=self.name, result=result).inc()
+
+    def _store(self, key: Hashable, value):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _refresh(self, key: Hashable, compute: Callable[[], Awaitable]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        # Tasks from a loop that has since been closed can never finish
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return task
+
+        async def run():
+            try:
+                value = await compute()
+                self._store(key, value)
+                return value
+            finally:
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+
+        task = self._inflight[key] = asyncio.get_running_loop().create_task(run())
+        task.add_done_callback(self._log_refresh_failure)
+        return task
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable],
+                  fresh_for: float, stale_for: float):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, computed_at = entry
+            age = time.monotonic() - computed_at
+            if age < fresh_for:
+                self._record("hit")
+                return value
+            if age < fresh_for + stale_for:
+                self._record("stale")
+                self._refresh(key, compute)
+                return value
+
+        self._record("miss")
+        return await asyncio.shield(self._refresh(key, compute))
+
+    def _log_refresh_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Refreshing %s cache entry failed: %s", self.name, task.exception())
+
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        served = self.counts["hit"] + self.counts["stale"]
+        return {
+            **self.counts,
+            "entries": len(self._entries),
+            "hit_ratio": served / total if total else 0.0
+        }
+
+    def clear(self):
+        self._entries.clear()
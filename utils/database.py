@@ -0,0 +1,535 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from http.cookies import CookieError, SimpleCookie
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine, event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from utils.db_optimization import query_profiler
+from utils.metrics import instrument_pool
+from utils.tracing import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# Kept on its own MetaData so service create_all/drop_all calls never touch it.
+_version_metadata = MetaData()
+schema_versions = Table(
+    "schema_versions",
+    _version_metadata,
+    Column("service", String, primary_key=True),
+    Column("version", Integer, nullable=False),
+)
+# Written to the primary every HEARTBEAT_INTERVAL seconds while replicas are
+# configured; a replica's copy of the row tells how far behind it is.
+replication_heartbeats = Table(
+    "replication_heartbeats",
+    _version_metadata,
+    Column("service", String, primary_key=True),
+    Column("heartbeat_at", Float, nullable=False),
+)
+
+HEARTBEAT_INTERVAL = 1.0
+LAG_CHECK_INTERVAL = 1.0
+READ_YOUR_WRITES_COOKIE = "db_pin"
+READ_YOUR_WRITES_HEADER = "x-db-pin-until"
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "UPSERT", "MERGE")
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def database_url(service: str, default: str) -> str:
+    """
+    The database URL for ``service``: ``<SERVICE>_DATABASE_URL`` if set,
+    then ``DATABASE_URL`` (one database per container, as in
+    docker-compose), then ``default``.
+    """
+    return os.getenv(f"{service.upper()}_DATABASE_URL") or os.getenv("DATABASE_URL") or default
+
+
+def replica_database_urls(service: str) -> List[str]:
+    """Comma-separated ``<SERVICE>_REPLICA_URLS``, then ``DATABASE_REPLICA_URLS``."""
+    value = os.getenv(f"{service.upper()}_REPLICA_URLS") or os.getenv("DATABASE_REPLICA_URLS") or ""
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+class _RoutingState:
+    """
+    Per-request read routing: the caller's pin, whether this request wrote,
+    and the latest pin returned by services it called.
+    """
+
+    __slots__ = ("pinned_until", "wrote", "downstream_pin")
+
+    def __init__(self, pinned_until: float = 0.0):
+        self.pinned_until = pinned_until
+        self.wrote = False
+        self.downstream_pin = 0.0
+
+
+_routing_state: contextvars.ContextVar[Optional[_RoutingState]] = contextvars.ContextVar(
+    "db_routing_state", default=None
+)
+_httpx_instrumented = False
+
+
+def _parse_pin(value) -> float:
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def sqlite_pragmas() -> dict:
+    """
+    Pragmas applied to every SQLite connection. WAL lets readers run
+    alongside the single writer instead of waiting on it. With WAL,
+    ``synchronous=NORMAL`` only syncs at checkpoints and is still safe
+    against corruption. Writers that find the database locked retry for
+    ``busy_timeout`` ms instead of failing immediately.
+    """
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        # Negative cache_size is in KiB: 64 MiB of page cache per connection
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "temp_store": "MEMORY",
+    }
+
+
+def engine_options(url: str) -> dict:
+    """
+    ``create_engine`` keyword arguments tuned for ``url``'s backend.
+
+    File-backed SQLite and server databases get a sized ``QueuePool``
+    (``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``, ``DB_POOL_TIMEOUT``). Server
+    databases also get ``pool_pre_ping`` and ``DB_POOL_RECYCLE`` so
+    connections dropped by the server or a proxy are replaced, not
+    handed to a request. In-memory SQLite keeps SQLAlchemy's default
+    pool, because each new connection would be a new empty database.
+    """
+    parsed = make_url(url)
+    pool = {
+        "poolclass": QueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+    if parsed.get_backend_name() != "sqlite":
+        return {**pool, "pool_pre_ping": True, "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800"))}
+    options = {"connect_args": {"check_same_thread": False}}
+    if parsed.database and parsed.database != ":memory:" and parsed.query.get("mode") != "memory":
+        options.update(pool)
+    return options
+
+
+def create_service_engine(url: str, pragmas: Optional[dict] = None, **kwargs):
+    """
+    Engine for ``url`` with ``engine_options``; ``kwargs`` override them.
+    SQLite connections get ``pragmas`` (default ``sqlite_pragmas()``) as
+    they are opened. A caller's ``connect_args`` are meant for SQLite's
+    driver and are dropped for other backends, so the same call works when
+    ``DATABASE_URL`` points a service at Postgres.
+    """
+    options = engine_options(url)
+    connect_args = kwargs.pop("connect_args", None)
+    if connect_args and make_url(url).get_backend_name() == "sqlite":
+        kwargs["connect_args"] = {**options.get("connect_args", {}), **connect_args}
+    engine = create_engine(url, **{**options, **kwargs})
+
+    if engine.dialect.name == "sqlite":
+        statements = [
+            f"PRAGMA {name}={value}"
+            for name, value in (sqlite_pragmas() if pragmas is None else pragmas).items()
+        ]
+
+        @event.listens_for(engine, "connect")
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+            finally:
+                cursor.close()
+
+    return engine
+
+
+class ServiceDatabase:
+    """
+    Lazily-initialised database handle for a single service.
+
+    ``url`` is the fallback when neither ``<SERVICE>_DATABASE_URL`` nor
+    ``DATABASE_URL`` is set; the engine comes from ``create_service_engine``.
+
+    Nothing touches the database at import time: the engine is built on first
+    use, and the schema is checked once per process, either from the app
+    lifespan or from the first ``get_db`` call. Instead of dropping and
+    recreating tables, ``ensure_schema`` compares the version recorded in
+    ``schema_versions`` with ``schema_version`` and only runs ``create_all``
+    (which adds missing tables) when the database is behind.
+
+    ``migrations`` maps a schema version to a callable taking the open
+    connection; it runs after ``create_all`` whenever the database is
+    upgraded past that version, e.g. to backfill a newly added table.
+
+    Read-only handlers can depend on ``get_read_db`` instead of ``get_db``
+    to read from a replica (``replica_urls``, default from the environment).
+    A replica is only used while its heartbeat lag is at most
+    ``max_replica_lag`` seconds. A client that just wrote is pinned to the
+    primary for ``read_your_writes_seconds`` through a cookie and header
+    set by ``ReadYourWritesMiddleware``. Without replicas, ``get_read_db``
+    is ``get_db``.
+    """
+
+    def __init__(self, service: str, url: str, metadata: MetaData,
+                 schema_version: int = 1, migrations=None,
+                 replica_urls: Optional[Sequence[str]] = None,
+                 max_replica_lag: Optional[float] = None,
+                 read_your_writes_seconds: Optional[float] = None, **engine_kwargs):
+        self.service = service
+        self.url = database_url(service, url)
+        self.metadata = metadata
+        self.schema_version = schema_version
+        self.migrations = migrations or {}
+        self.replica_urls = list(replica_urls) if replica_urls is not None else replica_database_urls(service)
+        self.max_replica_lag = (
+            max_replica_lag if max_replica_lag is not None
+            else float(os.getenv("MAX_REPLICA_LAG_SECONDS", "2"))
+        )
+        self.read_your_writes_seconds = (
+            read_your_writes_seconds if read_your_writes_seconds is not None
+            else float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+        )
+        self.engine_kwargs = engine_kwargs
+        self._engine = None
+        self._sessionmaker = None
+        self._schema_ready = False
+        self._replicas = None
+        self._replica_sessionmakers: Dict[int, sessionmaker] = {}
+        self._replica_lag: Dict[int, Optional[float]] = {}
+        self._lag_checked_at = 0.0
+        self._next_replica = 0
+        self._lock = threading.RLock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_service_engine(self.url, **self.engine_kwargs)
+                    self._instrument(engine, self.service)
+
+                    @event.listens_for(engine, "after_cursor_execute")
+                    def mark_write(conn, cursor, statement, parameters, context, executemany):
+                        state = _routing_state.get()
+                        if state is not None and not state.wrote:
+                            state.wrote = statement.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+                    self._engine = engine
+        return self._engine
+
+    @staticmethod
+    def _instrument(engine, name: str):
+        instrument_engine(engine, name)
+        instrument_pool(engine, name)
+        query_profiler.instrument(engine, name)
+
+    @property
+    def replicas(self) -> list:
+        if self._replicas is None:
+            with self._lock:
+                if self._replicas is None:
+                    replicas = []
+                    for index, url in enumerate(self.replica_urls):
+                        engine = create_service_engine(url, **self.engine_kwargs)
+                        self._instrument(engine, f"{self.service}-replica{index}")
+                        replicas.append(engine)
+                    self._replicas = replicas
+        return self._replicas
+
+    def _read_heartbeat(self, engine, name: str) -> Optional[float]:
+        try:
+            with engine.connect() as conn:
+                return conn.execute(
+                    select(replication_heartbeats.c.heartbeat_at)
+                    .where(replication_heartbeats.c.service == self.service)
+                ).scalar()
+        except Exception as e:
+            logger.warning("%s %s unavailable: %s", self.service, name, e)
+            return None
+
+    def replica_lag(self) -> Dict[int, Optional[float]]:
+        """
+        Seconds each replica is behind the primary, or None when it is
+        unreachable or has no heartbeat. Lag is the primary's heartbeat
+        minus the replica's copy, read together, so neither the heartbeat
+        interval nor the ``LAG_CHECK_INTERVAL`` between checks counts as lag.
+        """
+        now = time.time()
+        if now - self._lag_checked_at < LAG_CHECK_INTERVAL:
+            return self._replica_lag
+        primary = self._read_heartbeat(self.engine, "primary")
+        reference = primary if primary is not None else now
+        lag = {}
+        for index, engine in enumerate(self.replicas):
+            heartbeat = self._read_heartbeat(engine, f"replica {index}")
+            lag[index] = max(reference - heartbeat, 0.0) if heartbeat is not None else None
+        self._replica_lag, self._lag_checked_at = lag, now
+        return lag
+
+    def read_engine(self):
+        """
+        A replica within ``max_replica_lag``, round-robin among those, or
+        the primary when there are none or the caller is pinned to it.
+        """
+        if not self.replica_urls:
+            return self.engine
+        state = _routing_state.get()
+        if state is not None and state.pinned_until > time.time():
+            return self.engine
+        healthy = [
+            index for index, lag in sorted(self.replica_lag().items())
+            if lag is not None and lag <= self.max_replica_lag
+        ]
+        if not healthy:
+            return self.engine
+        self._next_replica = (self._next_replica + 1) % len(healthy)
+        return self.replicas[healthy[self._next_replica]]
+
+    def write_heartbeat(self):
+        now = time.time()
+        with self.engine.begin() as conn:
+            updated = conn.execute(
+                replication_heartbeats.update()
+                .where(replication_heartbeats.c.service == self.service)
+                .values(heartbeat_at=now)
+            ).rowcount
+            if not updated:
+                conn.execute(replication_heartbeats.insert().values(service=self.service, heartbeat_at=now))
+
+    @property
+    def SessionLocal(self):
+        if self._sessionmaker is None:
+            self._sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        return self._sessionmaker
+
+    def ensure_schema(self):
+        if self._schema_ready:
+            return
+        with self._lock:
+            if self._schema_ready:
+                return
+            self._upgrade_schema()
+            self._schema_ready = True
+
+    def _upgrade_schema(self):
+        with self.engine.begin() as conn:
+            schema_versions.create(conn, checkfirst=True)
+            replication_heartbeats.create(conn, checkfirst=True)
+            current = conn.execute(
+                select(schema_versions.c.version).where(schema_versions.c.service == self.service)
+            ).scalar()
+
+            if current == self.schema_version:
+                return
+            if current is not None and current > self.schema_version:
+                raise SchemaVersionError(
+                    f"{self.service} database schema is at version {current}, "
+                    f"but this build expects {self.schema_version}"
+                )
+
+            logger.info(
+                "Upgrading %s schema from version %s to %s",
+                self.service, current, self.schema_version
+            )
+            self.metadata.create_all(conn)
+            for version in sorted(self.migrations):
+                if (current is None or version > current) and version <= self.schema_version:
+                    self.migrations[version](conn)
+            if current is None:
+                conn.execute(schema_versions.insert().values(
+                    service=self.service, version=self.schema_version
+                ))
+            else:
+                conn.execute(
+                    schema_versions.update()
+                    .where(schema_versions.c.service == self.service)
+                    .values(version=self.schema_version)
+                )
+
+    def reset(self):
+        """Drop and recreate all service tables. Only meant for tests and tooling."""
+        self.metadata.drop_all(bind=self.engine)
+        self.metadata.create_all(bind=self.engine)
+
+    def dispose(self):
+        if self._engine is not None:
+            self._engine.dispose()
+        for replica in self._replicas or []:
+            replica.dispose()
+
+    def get_db(self):
+        self.ensure_schema()
+        db = self.SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def get_read_db(self):
+        """Session for read-only handlers; see the class docstring for routing."""
+        self.ensure_schema()
+        engine = self.read_engine()
+        if engine is self._engine:
+            db = self.SessionLocal()
+        else:
+            index = self.replicas.index(engine)
+            if index not in self._replica_sessionmakers:
+                self._replica_sessionmakers[index] = sessionmaker(
+                    autocommit=False, autoflush=False, bind=engine
+                )
+            db = self._replica_sessionmakers[index]()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.write_heartbeat)
+            except Exception as e:
+                logger.warning("%s heartbeat failed: %s", self.service, e)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        self.ensure_schema()
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat_loop()) if self.replica_urls else None
+        try:
+            yield
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            self.dispose()
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware pinning a client's reads to the primary after it
+    writes. A request that runs an INSERT/UPDATE/DELETE on the primary
+    gets a ``db_pin`` cookie and an ``X-DB-Pin-Until`` header holding the
+    epoch time until which ``get_read_db`` ignores replicas. Later requests
+    send either one back.
+
+    With ``instrument_httpx``, the pin also crosses services: outbound
+    calls forward the caller's pin, and a pin returned by a called service
+    is passed back on this response, so a write made downstream still
+    pins the client's next read.
+    """
+
+    def __init__(self, app, database: ServiceDatabase):
+        self.app = app
+        self.database = database
+
+    @staticmethod
+    def _pinned_until(headers: dict) -> float:
+        value = headers.get(READ_YOUR_WRITES_HEADER.encode())
+        if value is None and b"cookie" in headers:
+            try:
+                morsel = SimpleCookie(headers[b"cookie"].decode("latin-1")).get(READ_YOUR_WRITES_COOKIE)
+            except CookieError:
+                morsel = None
+            value = morsel.value if morsel is not None else None
+        return _parse_pin(value)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = _RoutingState(self._pinned_until(dict(scope.get("headers") or [])))
+        token = _routing_state.set(state)
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start":
+                until = state.downstream_pin
+                if state.wrote and self.database.replica_urls:
+                    until = max(until, time.time() + self.database.read_your_writes_seconds)
+                remaining = until - time.time()
+                if remaining > 0:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (READ_YOUR_WRITES_HEADER.encode(), f"{until:.3f}".encode()),
+                        (b"set-cookie", (
+                            f"{READ_YOUR_WRITES_COOKIE}={until:.3f}; Max-Age={int(remaining) + 1}; "
+                            "Path=/; HttpOnly; SameSite=Lax"
+                        ).encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            _routing_state.reset(token)
+
+
+def instrument_httpx():
+    """
+    Carry read-your-writes pins across service calls: outbound httpx
+    requests get the caller's active pin as ``X-DB-Pin-Until``, and pins
+    in their responses are kept for this request's own response. Patches
+    ``Client.send`` / ``AsyncClient.send`` once per process.
+    """
+    global _httpx_instrumented
+    if _httpx_instrumented:
+        return
+    _httpx_instrumented = True
+
+    import httpx
+
+    async_send, sync_send = httpx.AsyncClient.send, httpx.Client.send
+
+    def forward(request):
+        state = _routing_state.get()
+        if state is not None and state.pinned_until > time.time():
+            request.headers.setdefault(READ_YOUR_WRITES_HEADER, f"{state.pinned_until:.3f}")
+        return state
+
+    def collect(state, response):
+        if state is not None:
+            pin = _parse_pin(response.headers.get(READ_YOUR_WRITES_HEADER))
+            state.downstream_pin = max(state.downstream_pin, pin)
+
+    async def pinned_async_send(self, request, **kwargs):
+        state = forward(request)
+        response = await async_send(self, request, **kwargs)
+        collect(state, response)
+        return response
+
+    def pinned_sync_send(self, request, **kwargs):
+        state = forward(request)
+        response = sync_send(self, request, **kwargs)
+        collect(state, response)
+        return response
+
+    httpx.AsyncClient.send = pinned_async_send
+    httpx.Client.send = pinned_sync_send
+
+
+def setup_read_routing(app, database: ServiceDatabase):
+    """Pin ``app``'s clients to ``database``'s primary after writes, across service calls too."""
+    instrument_httpx()
+    app.add_middleware(ReadYourWritesMiddleware, database=database)
@@ -1,32 +1,312 @@
-from sqlalchemy import text
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, FastAPI
+from prometheus_client import Counter, Histogram as PrometheusHistogram
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-def analyze_query(db: Session, query):
-    """Analyze SQL query performance using EXPLAIN ANALYZE"""
-    
-    # Get the SQL statement from the SQLAlchemy query
-    sql = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
-    
-    # Execute EXPLAIN ANALYZE
-    explain_sql = f"EXPLAIN ANALYZE {sql}"
-    result = db.execute(text(explain_sql))
-    
-    # Return the query execution plan
-    return [row[0] for row in result]
+from utils.auth import require_admin
+from utils.metrics import UNMATCHED_ROUTE
+from utils.span_profiler import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Statements run outside an HTTP request (startup, background syncs)
+BACKGROUND_ENDPOINT = "<background>"
+# Fingerprints past MAX_FINGERPRINTS per endpoint are counted together
+OTHER_FINGERPRINT = "<other statements>"
+MAX_FINGERPRINTS = 2000
+# Statement types whose plans are captured; EXPLAIN of DDL can fail or has no plan
+EXPLAINABLE = frozenset({"SELECT", "WITH", "INSERT", "UPDATE", "DELETE"})
+
+DB_STATEMENT_DURATION = PrometheusHistogram(
+    "db_statement_duration_seconds",
+    "SQL statement execution time, by statement type",
+    ["service", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+DB_N_PLUS_ONE = Counter(
+    "db_n_plus_one_total",
+    "Requests that ran one SELECT fingerprint at least N_PLUS_ONE_THRESHOLD times",
+    ["service", "endpoint"]
+)
+
+_COMMENTS_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_LITERALS_RE = re.compile(
+    r"'(?:[^']|'')*'"                   # string literals
+    r"|%\(\w+\)s|%s|(?<!:):\w+|\$\d+|\?"  # bound parameters, in every paramstyle
+    r"|\b\d+(?:\.\d+)?\b"               # numbers
+)
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_ROW = r"\(\s*\?(?:\s*,\s*\?)*\s*\)"
+_VALUES_RE = re.compile(rf"({_ROW})(?:\s*,\s*{_ROW})+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """
+    Normalise ``statement`` so executions differing only in literal values,
+    ``IN`` list lengths or multi-row ``VALUES`` counts share one fingerprint.
+    """
+    normalised = _COMMENTS_RE.sub(" ", statement)
+    normalised = _LITERALS_RE.sub("?", normalised)
+    normalised = _IN_LIST_RE.sub("IN (...)", normalised)
+    normalised = _VALUES_RE.sub(r"\1, ...", normalised)
+    return _WHITESPACE_RE.sub(" ", normalised).strip()
+
+
+def explain_plan(dbapi_connection, dialect_name: str, statement: str, parameters=None) -> List[str]:
+    """
+    Estimated plan of ``statement`` with its bound ``parameters``, without
+    running it: ``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` elsewhere
+    (Postgres, MySQL).
+    """
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters if parameters is not None else ())
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if dialect_name == "sqlite":
+        # (id, parent, notused, detail); indent each step under its parent
+        depth = {0: -1}
+        lines = []
+        for row in rows:
+            depth[row[0]] = depth.get(row[1], -1) + 1
+            lines.append("  " * depth[row[0]] + str(row[3]))
+        return lines
+    return [" ".join(str(column) for column in row) for row in rows]
+
+
+class _RequestQueries:
+    __slots__ = ("statements",)
+
+    def __init__(self):
+        # fingerprint -> [(operation, seconds), ...]
+        self.statements: Dict[str, List[Tuple[str, float]]] = {}
+
+
+class _FingerprintStats:
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.latency = Histogram()
+        self.n_plus_one_requests = 0
+
+    def report(self) -> dict:
+        return {
+            "operation": self.operation,
+            "count": self.latency.count,
+            "total_ms": round(self.latency.sum, 3),
+            "mean_ms": round(self.latency.sum / self.latency.count, 3) if self.latency.count else 0.0,
+            "p99_ms": self.latency.quantile(0.99),
+            "max_ms": round(self.latency.max, 3),
+            "n_plus_one_requests": self.n_plus_one_requests
+        }
+
+
+_request_queries: contextvars.ContextVar[Optional[_RequestQueries]] = contextvars.ContextVar(
+    "request_queries", default=None
+)
+
+
+class QueryProfiler:
+    """
+    Aggregates every SQL statement run on instrumented engines by endpoint
+    and statement fingerprint: count, total time and latency percentiles.
+
+    Statements are collected per request and folded into the aggregates
+    when the request ends, which is also when N+1 patterns are detected: a
+    request running the same SELECT fingerprint ``n_plus_one_threshold``
+    times or more. The first time a fingerprint takes longer than
+    ``slow_ms``, its plan is captured with ``explain_plan``.
+    """
+
+    def __init__(self, slow_ms: float = 100.0, n_plus_one_threshold: int = 10,
+                 max_fingerprints: int = MAX_FINGERPRINTS):
+        self.slow_ms = slow_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, _FingerprintStats]] = {}
+        self.plans: Dict[str, dict] = {}
+
+    @classmethod
+    def from_env(cls) -> "QueryProfiler":
+        return cls(
+            slow_ms=float(os.getenv("SLOW_QUERY_MS", "100")),
+            n_plus_one_threshold=int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+        )
+
+    def instrument(self, engine, service: Optional[str] = None):
+        """Profile every statement run on ``engine``."""
+        service = service or "db"
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._query_started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - context._query_started
+            key = fingerprint(statement)
+            operation = key.split(" ", 1)[0].upper() or "SQL"
+            DB_STATEMENT_DURATION.labels(service, operation).observe(elapsed)
+
+            if (elapsed * 1000 >= self.slow_ms and operation in EXPLAINABLE and not executemany
+                    and key not in self.plans):
+                self._capture_plan(conn, key, statement, parameters, elapsed)
+
+            queries = _request_queries.get()
+            if queries is None:
+                self._record(BACKGROUND_ENDPOINT, key, operation, [elapsed])
+            else:
+                queries.statements.setdefault(key, []).append((operation, elapsed))
+
+    def _capture_plan(self, conn, key: str, statement: str, parameters, elapsed: float):
+        try:
+            plan = explain_plan(conn.connection.dbapi_connection, conn.dialect.name, statement, parameters)
+        except Exception as e:
+            plan = [f"plan unavailable: {type(e).__name__}: {e}"]
+        self.plans[key] = {"duration_ms": round(elapsed * 1000, 3), "captured_at": time.time(), "plan": plan}
+        logger.warning("Slow statement (%.1fms): %s\n%s", elapsed * 1000, key, "\n".join(plan))
+
+    def _record(self, endpoint: str, key: str, operation: str, durations: List[float],
+                n_plus_one: bool = False):
+        with self._lock:
+            by_fingerprint = self._stats.setdefault(endpoint, {})
+            stats = by_fingerprint.get(key)
+            if stats is None:
+                if len(by_fingerprint) >= self.max_fingerprints:
+                    key = OTHER_FINGERPRINT
+                    stats = by_fingerprint.get(key)
+                if stats is None:
+                    stats = by_fingerprint[key] = _FingerprintStats(operation)
+            for duration in durations:
+                stats.latency.observe(duration * 1000)
+            if n_plus_one:
+                stats.n_plus_one_requests += 1
+
+    def begin_request(self):
+        return _request_queries.set(_RequestQueries())
+
+    def end_request(self, token, endpoint: str, service: str):
+        queries = _request_queries.get()
+        _request_queries.reset(token)
+        if queries is None:
+            return
+        for key, executions in queries.statements.items():
+            operation = executions[0][0]
+            n_plus_one = operation == "SELECT" and len(executions) >= self.n_plus_one_threshold
+            if n_plus_one:
+                DB_N_PLUS_ONE.labels(service, endpoint).inc()
+                logger.warning(
+                    "Possible N+1 in %s: %d executions of %s", endpoint, len(executions), key
+                )
+            self._record(endpoint, key, operation, [duration for _, duration in executions],
+                         n_plus_one=n_plus_one)
+
+    def report(self, limit: int = 50) -> dict:
+        """Per endpoint, the ``limit`` fingerprints with the most total time."""
+        with self._lock:
+            endpoints = {
+                endpoint: sorted(
+                    ({"fingerprint": key, **stats.report()} for key, stats in by_fingerprint.items()),
+                    key=lambda entry: -entry["total_ms"]
+                )[:limit]
+                for endpoint, by_fingerprint in sorted(self._stats.items())
+            }
+        return {"endpoints": endpoints, "slow_plans": dict(self.plans)}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.plans.clear()
+
+
+query_profiler = QueryProfiler.from_env()
+
+
+class QueryProfilerMiddleware:
+    """
+    ASGI middleware collecting a request's statements so they are reported
+    under its templated route, e.g. ``GET /items/{item_id}``.
+    """
+
+    def __init__(self, app, service: str, profiler: QueryProfiler = query_profiler):
+        self.app = app
+        self.service = service
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = self.profiler.begin_request()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            self.profiler.end_request(token, f"{scope['method']} {route}", self.service)
+
+
+def create_query_profiler_router(profiler: QueryProfiler = query_profiler) -> APIRouter:
+    """Admin endpoints over the statement aggregates and captured slow-query plans."""
+    router = APIRouter(prefix="/admin/queries", dependencies=[Depends(require_admin)])
+
+    @router.get("")
+    def get_query_report(limit: int = 50):
+        return profiler.report(limit)
+
+    @router.delete("")
+    def reset_query_report():
+        profiler.reset()
+        return {}
+
+    return router
+
+
+def setup_query_profiler(app: FastAPI, service: str):
+    """
+    Attribute ``app``'s statements to its routes and serve
+    ``/admin/queries``. Engines are instrumented by ``ServiceDatabase``.
+    """
+    app.add_middleware(QueryProfilerMiddleware, service=service)
+    app.include_router(create_query_profiler_router())
+
+
+def analyze_query(db: Session, query) -> List[str]:
+    """Estimated plan of an ORM ``query`` on the session's database."""
+    compiled = query.statement.compile(dialect=db.bind.dialect)
+    connection = db.connection()
+    params = compiled.construct_params()
+    parameters = (
+        tuple(params[name] for name in compiled.positiontup)
+        if compiled.positional else params
+    )
+    return explain_plan(
+        connection.connection.dbapi_connection, connection.dialect.name, str(compiled), parameters
+    )
+
 
 def log_slow_queries(db: Session, query, threshold_ms: float = 100):
-    """Log queries that take longer than the threshold"""
-    import time
-    
-    start_time = time.time()
+    """Run ``query.all()``, logging its plan when it takes longer than ``threshold_ms``."""
+    start_time = time.perf_counter()
     result = query.all()
-    execution_time = (time.time() - start_time) * 1000
-    
+    execution_time = (time.perf_counter() - start_time) * 1000
+
     if execution_time > threshold_ms:
-        query_plan = analyze_query(db, query)
-        print(f"Slow query detected ({execution_time:.2f}ms):")
-        print("Query plan:")
-        for line in query_plan:
-            print(line)
-    
-    return result
\ No newline at end of file
+        logger.warning(
+            "Slow query detected (%.2fms):\n%s", execution_time, "\n".join(analyze_query(db, query))
+        )
+
+    return result
@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+from typing import Callable, Hashable
+
+from utils.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+DELETION_CHANNEL = "entity-deleted"
+
+_publisher = None
+
+
+def event_client():
+    """
+    A new Redis client for the event channels, connected to ``REDIS_URL``.
+
+    Every service must share that Redis for events to reach other
+    processes. Without ``REDIS_URL`` the in-process cache client is used,
+    so events only reach subscribers in the same process.
+    """
+    url = os.getenv("REDIS_URL")
+    if not url:
+        logger.warning("REDIS_URL is not set; deletion events stay within this process")
+        return get_redis_client()
+    import redis
+    return redis.Redis.from_url(url)
+
+
+def publish_deletion(entity: str, key: Hashable):
+    """
+    Announce that ``entity`` ``key`` (e.g. ``"customer", "alice"``) was deleted.
+
+    Delivery is best effort: a failed publish is logged and never fails the
+    delete, so subscribers must also bound how long they trust cached data.
+    """
+    global _publisher
+    try:
+        if _publisher is None:
+            _publisher = event_client()
+        _publisher.publish(DELETION_CHANNEL, json.dumps({"entity": entity, "key": key}))
+    except Exception as e:
+        logger.warning("Failed to publish %s deletion for %r: %s", entity, key, e)
+
+
+def subscribe_deletions(handler: Callable[[str, Hashable], None], poll_interval: float = 1.0):
+    """
+    Call ``handler(entity, key)`` for every deletion event, on a daemon thread.
+
+    The subscription has its own connection, separate from the publisher's.
+    Returns the worker thread; call ``stop()`` on it to unsubscribe.
+    """
+    def on_message(message):
+        try:
+            event = json.loads(message["data"])
+            handler(event["entity"], event["key"])
+        except Exception as e:
+            logger.warning("Ignoring malformed deletion event %r: %s", message.get("data"), e)
+
+    pubsub = event_client().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{DELETION_CHANNEL: on_message})
+    return pubsub.run_in_thread(sleep_time=poll_interval, daemon=True)
@@ -0,0 +1,193 @@
+import contextvars
+import os
+import time
+from typing import Optional
+
+from fastapi import FastAPI, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+# Seconds; spans fast cached reads up to slow cross-service purchases
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Requests that matched no route share one label so bad URLs can't grow the series count
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Gauges are summed over live processes in multiprocess mode; see metrics_response
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle an HTTP request, by templated route",
+    ["service", "method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ["service", "method"],
+    multiprocess_mode="livesum"
+)
+HTTP_CLIENT_DURATION = Histogram(
+    "http_client_request_duration_seconds",
+    "Time for outbound HTTP calls to other services, by target host",
+    ["service", "method", "target", "status"],
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured connection pool size",
+    ["service"],
+    multiprocess_mode="livesum"
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Open database connections",
+    ["service"],
+    multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections currently checked out of the pool",
+    ["service"],
+    multiprocess_mode="livesum"
+)
+
+_current_service: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "metrics_service", default=None
+)
+_httpx_instrumented = False
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware recording request latency by templated route (``/items/{item_id}``
+    rather than every concrete id), method and status, and the number of
+    requests in flight.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        token = _current_service.set(self.service)
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(self.service, method)
+        in_flight.inc()
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            HTTP_REQUEST_DURATION.labels(self.service, method, route_path, str(status)).observe(
+                time.perf_counter() - started
+            )
+            in_flight.dec()
+            _current_service.reset(token)
+
+
+def instrument_httpx():
+    """
+    Time every outbound httpx request, labelled with the calling service
+    and the target host. Patches ``Client.send`` / ``AsyncClient.send``
+    once per process.
+    """
+    global _httpx_instrumented
+    if _httpx_instrumented:
+        return
+    _httpx_instrumented = True
+
+    import httpx
+
+    async_send, sync_send = httpx.AsyncClient.send, httpx.Client.send
+
+    def observe(request, status, started):
+        HTTP_CLIENT_DURATION.labels(
+            _current_service.get() or "unknown", request.method, request.url.host or "", status
+        ).observe(time.perf_counter() - started)
+
+    async def timed_async_send(self, request, **kwargs):
+        started, status = time.perf_counter(), "error"
+        try:
+            response = await async_send(self, request, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            observe(request, status, started)
+
+    def timed_sync_send(self, request, **kwargs):
+        started, status = time.perf_counter(), "error"
+        try:
+            response = sync_send(self, request, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            observe(request, status, started)
+
+    httpx.AsyncClient.send = timed_async_send
+    httpx.Client.send = timed_sync_send
+
+
+def instrument_pool(engine, service: str):
+    """Track ``engine``'s open and checked-out connections through pool events."""
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        DB_POOL_SIZE.labels(service).set(size())
+    connections = DB_POOL_CONNECTIONS.labels(service)
+    checked_out = DB_POOL_CHECKED_OUT.labels(service)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        connections.inc()
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, connection_record):
+        connections.dec()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+
+def metrics_response() -> Response:
+    """
+    Prometheus exposition of this process's metrics or, when
+    ``PROMETHEUS_MULTIPROC_DIR`` is set, of every worker writing to that
+    directory. Multi-worker servers must set it to an empty directory
+    before starting; gunicorn should also call
+    ``prometheus_client.multiprocess.mark_process_dead(worker.pid)`` from
+    its ``child_exit`` hook so live gauges drop exited workers.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app: FastAPI, service: str):
+    """
+    Instrument ``app`` as ``service`` and serve ``GET /metrics``. Database
+    pools are instrumented by ``ServiceDatabase`` engines.
+    """
+    instrument_httpx()
+    app.add_middleware(PrometheusMiddleware, service=service)
+    app.add_api_route("/metrics", metrics_response, methods=["GET"], include_in_schema=False)
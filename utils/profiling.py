@@ -1,13 +1,18 @@
 from functools import wraps
+import asyncio
 import cProfile
 import pstats
 import io
 import time
-from memory_profiler import profile as memory_profile
-import coverage
+
+from utils.span_profiler import profile_span
 
 def performance_profile(output_file=None):
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            # cProfile.runcall would only time creating the coroutine
+            return profile_span()(func)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             profiler = cProfile.Profile()
@@ -26,8 +31,15 @@ def performance_profile(output_file=None):
     return decorator
 
 def track_memory_usage(func):
+    # memory_profiler pulls in IPython when available, so only import it
+    # the first time a decorated function actually runs.
+    profiled = None
+
     @wraps(func)
-    @memory_profile
     def wrapper(*args, **kwargs):
-        return func(*args, **kwargs)
+        nonlocal profiled
+        if profiled is None:
+            from memory_profiler import profile as memory_profile
+            profiled = memory_profile(func)
+        return profiled(*args, **kwargs)
     return wrapper
\ No newline at end of file
@@ -1,11 +1,18 @@
 from functools import wraps
+import asyncio
 import cProfile
 import pstats
 import io
 import time
 
+from utils.span_profiler import profile_span
+
 def detailed_profile(output_prefix=None):
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            # cProfile.runcall would only time creating the coroutine
+            return profile_span()(func)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             profiler = cProfile.Profile()
@@ -1,42 +1,28 @@
-import coverage
 from contextlib import contextmanager
 import time
-import psutil
 import logging
-from pathlib import Path
+from typing import Optional
+
+from utils.sampling_profiler import SamplingProfiler
 
 class ProfilingManager:
-    def __init__(self):
-        config_file = str(Path(__file__).parent.parent / ".coveragerc")
-        self.cov = coverage.Coverage(config_file=config_file)
+    def __init__(self, profiler: Optional[SamplingProfiler] = None):
+        # Statistical sampling replaces per-request coverage tracing, which
+        # multiplied request cost and wasn't safe with concurrent requests.
+        self.profiler = profiler or SamplingProfiler.from_env()
         self.logger = logging.getLogger(__name__)
     
     @contextmanager
     def profile_request(self, request_id: str):
-        start_time = time.time()
-        process = psutil.Process()
-        start_memory = process.memory_info().rss / 1024 / 1024  # MB
-        
-        try:
-            self.cov.start()
-            yield
-        finally:
-            self.cov.stop()
-            end_time = time.time()
-            end_memory = process.memory_info().rss / 1024 / 1024
-            
-            metrics = {
-                'request_id': request_id,
-                'execution_time': end_time - start_time,
-                'memory_used': end_memory - start_memory,
-                'total_memory': end_memory
-            }
-            
-            self.logger.info(f"Request profiling metrics: {metrics}")
-            
-    def generate_coverage_report(self):
-        self.cov.save()
-        return self.cov.report()
+        start_time = time.perf_counter()
+        with self.profiler.request() as sampled:
+            try:
+                yield
+            finally:
+                if sampled:
+                    self.logger.debug(
+                        "Sampled request %s took %.4fs", request_id, time.perf_counter() - start_time
+                    )
 
     def profile_database(self, query):
         start_time = time.time()
@@ -44,4 +30,4 @@ class ProfilingManager:
             return query()
         finally:
             execution_time = time.time() - start_time
-            self.logger.info(f"Database query execution time: {execution_time:.4f}s")
\ No newline at end of file
+            self.logger.info(f"Database query execution time: {execution_time:.4f}s")
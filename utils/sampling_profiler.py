@@ -0,0 +1,231 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+from utils.auth import require_admin
+from utils import span_profiler
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames of threads that are parked rather than working; samples ending
+# in one of these are dropped so idle pool workers don't swamp the profile.
+IDLE_FRAMES = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+})
+TRUNCATED_STACK = "[other stacks]"
+
+
+class SamplingProfiler:
+    """
+    Statistical stack sampler for always-on production profiling.
+
+    A daemon thread wakes ``sample_rate_hz`` times a second and, while at
+    least one sampled request is in flight, records the current stack of
+    every other thread from ``sys._current_frames()``. Stacks are kept as
+    counts of collapsed ``file:function;file:function`` strings, the input
+    format of flamegraph tools. Requests are sampled with probability
+    ``request_probability``; unsampled requests cost one ``random()`` call.
+
+    The time spent taking samples is measured, and the sampling interval is
+    stretched whenever it would exceed ``max_overhead`` of wall time.
+    """
+
+    def __init__(self, sample_rate_hz: float = 100.0, request_probability: float = 0.05,
+                 max_overhead: float = 0.02, max_depth: int = 64, max_stacks: int = 10000,
+                 enabled: bool = False):
+        self.sample_rate_hz = sample_rate_hz
+        self.request_probability = request_probability
+        self.max_overhead = max_overhead
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._active = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._file_names: Dict[str, str] = {}
+        self._interval = 1.0 / sample_rate_hz
+        self._reset_stats()
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        return cls(
+            sample_rate_hz=float(os.getenv("PROFILER_SAMPLE_RATE_HZ", "100")),
+            request_probability=float(os.getenv("PROFILER_REQUEST_PROBABILITY", "0.05")),
+            enabled=os.getenv("PROFILER_ENABLED", "").lower() in ("1", "true", "yes")
+        )
+
+    def _reset_stats(self):
+        self.samples = 0
+        self.requests = 0
+        self.sampled_requests = 0
+        self._sampling_seconds = 0.0
+        self._since = time.monotonic()
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate_hz: Optional[float] = None,
+                  request_probability: Optional[float] = None):
+        if sample_rate_hz is not None:
+            self.sample_rate_hz = sample_rate_hz
+            self._interval = 1.0 / sample_rate_hz
+        if request_probability is not None:
+            self.request_probability = request_probability
+        if enabled is not None:
+            self.enabled = enabled
+            if not enabled:
+                self.stop()
+
+    @contextmanager
+    def request(self):
+        """Context for one request; yields whether it is being sampled."""
+        if not self.enabled:
+            yield False
+            return
+        self.requests += 1
+        if random.random() >= self.request_probability:
+            yield False
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._active += 1
+            self.sampled_requests += 1
+        try:
+            yield True
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            if not self._active:
+                continue
+            started = time.perf_counter()
+            self.sample(exclude=own_id)
+            cost = time.perf_counter() - started
+            self._sampling_seconds += cost
+            self._interval = max(1.0 / self.sample_rate_hz, cost / self.max_overhead)
+
+    def sample(self, exclude: Optional[int] = None):
+        """Record the current stack of every thread except ``exclude``."""
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == exclude:
+                continue
+            stack = self._collapse(frame)
+            if stack is None:
+                continue
+            with self._lock:
+                if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                    stack = TRUNCATED_STACK
+                self._stacks[stack] += 1
+                self.samples += 1
+
+    def _collapse(self, frame) -> Optional[str]:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            file_name = self._file_names.get(code.co_filename)
+            if file_name is None:
+                file_name = self._file_names[code.co_filename] = os.path.basename(code.co_filename)
+            names.append((file_name, code.co_name))
+            frame = frame.f_back
+        if not names or names[0] in IDLE_FRAMES:
+            return None
+        return ";".join(f"{file_name}:{function}" for file_name, function in reversed(names))
+
+    def collapsed(self) -> str:
+        """Aggregated stacks as ``stack count`` lines, most frequent first."""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks)
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._reset_stats()
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self._since, 1e-9)
+        return {
+            "enabled": self.enabled,
+            "sample_rate_hz": self.sample_rate_hz,
+            "effective_sample_rate_hz": round(1.0 / self._interval, 2),
+            "request_probability": self.request_probability,
+            "requests": self.requests,
+            "sampled_requests": self.sampled_requests,
+            "samples": self.samples,
+            "distinct_stacks": len(self._stacks),
+            "overhead_ratio": round(self._sampling_seconds / elapsed, 5)
+        }
+
+
+class ProfilerSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate_hz: Optional[float] = Field(None, gt=0, le=1000)
+    request_probability: Optional[float] = Field(None, ge=0, le=1)
+
+
+def create_profiling_router(profiler: SamplingProfiler) -> APIRouter:
+    """
+    Admin endpoints to inspect, toggle and download a service's sampling
+    profile, plus the span timings aggregated by ``utils.span_profiler``.
+    """
+    router = APIRouter(prefix="/admin/profiling", dependencies=[Depends(require_admin)])
+
+    @router.get("")
+    def get_profiler_status():
+        return profiler.stats()
+
+    @router.put("")
+    def update_profiler(settings: ProfilerSettings):
+        profiler.configure(**settings.model_dump())
+        logger.info("Sampling profiler reconfigured: %s", profiler.stats())
+        return profiler.stats()
+
+    @router.get("/flamegraph", response_class=PlainTextResponse)
+    def get_flamegraph():
+        """Collapsed stacks, ready for flamegraph.pl or speedscope."""
+        return profiler.collapsed()
+
+    @router.delete("/samples")
+    def reset_samples():
+        profiler.reset()
+        return profiler.stats()
+
+    @router.get("/spans")
+    def get_span_report():
+        """Per-endpoint wall/CPU/blocked/awaited histograms and time by span kind."""
+        return span_profiler.recorder.report()
+
+    @router.delete("/spans")
+    def reset_spans():
+        span_profiler.recorder.reset()
+        return {}
+
+    return router
@@ -0,0 +1,279 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+# Histogram bucket upper bounds in milliseconds
+BUCKET_BOUNDS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+SPAN_KINDS = ("endpoint", "db", "http", "compute", "internal")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are bucket upper bounds."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS_MS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+        self.max = max(self.max, value_ms)
+
+    def quantile(self, q: float) -> float:
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKET_BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3)
+        }
+
+
+class Span:
+    """
+    One timed operation. ``cpu`` is thread CPU time while the span's code
+    ran, ``blocked`` the rest of that running time (sync I/O, lock waits)
+    and ``awaited`` the time it was suspended at ``await`` points, so
+    ``wall = cpu + blocked + awaited``. Times are seconds and inclusive of
+    nested spans.
+    """
+
+    __slots__ = ("name", "kind", "parent", "root", "wall", "cpu", "running", "kind_wall", "descendants")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"]):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.wall = self.cpu = self.running = 0.0
+        # Root only: wall time per span kind and every finished descendant
+        self.kind_wall: Dict[str, float] = {}
+        self.descendants: List["Span"] = []
+
+    @property
+    def blocked(self) -> float:
+        return max(self.running - self.cpu, 0.0)
+
+    @property
+    def awaited(self) -> float:
+        return max(self.wall - self.running, 0.0)
+
+    def _finish(self, recorder: "SpanRecorder"):
+        if self.parent is None:
+            recorder.record(self)
+            return
+        ancestor = self.parent
+        while ancestor is not None and ancestor.kind != self.kind:
+            ancestor = ancestor.parent
+        if ancestor is None:
+            # Outermost span of its kind, so nested db/http spans aren't counted twice
+            self.root.kind_wall[self.kind] = self.root.kind_wall.get(self.kind, 0.0) + self.wall
+        self.root.descendants.append(self)
+
+
+class _SpanStats:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.blocked = Histogram()
+        self.awaited = Histogram()
+        self.kind_wall: Dict[str, float] = {}
+        self.children: Dict[str, "_SpanStats"] = {}
+
+    def observe(self, span: Span):
+        self.wall.observe(span.wall * 1000)
+        self.cpu.observe(span.cpu * 1000)
+        self.blocked.observe(span.blocked * 1000)
+        self.awaited.observe(span.awaited * 1000)
+
+    def report(self, nested: bool = True) -> dict:
+        report = {
+            "kind": self.kind,
+            "wall_ms": self.wall.summary(),
+            "cpu_ms": self.cpu.summary(),
+            "blocked_ms": self.blocked.summary(),
+            "awaited_ms": self.awaited.summary(),
+        }
+        if nested:
+            count = max(self.wall.count, 1)
+            report["mean_ms_by_kind"] = {
+                kind: round(total * 1000 / count, 3) for kind, total in sorted(self.kind_wall.items())
+            }
+            report["spans"] = {name: child.report(nested=False) for name, child in self.children.items()}
+        return report
+
+
+class SpanRecorder:
+    """Aggregates finished root spans (usually endpoints) with their nested spans."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roots: Dict[str, _SpanStats] = {}
+
+    def record(self, root: Span):
+        with self._lock:
+            stats = self._roots.get(root.name)
+            if stats is None:
+                stats = self._roots[root.name] = _SpanStats(root.kind)
+            stats.observe(root)
+            for kind, wall in root.kind_wall.items():
+                stats.kind_wall[kind] = stats.kind_wall.get(kind, 0.0) + wall
+            for span in root.descendants:
+                child = stats.children.get(span.name)
+                if child is None:
+                    child = stats.children[span.name] = _SpanStats(span.kind)
+                child.observe(span)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {name: stats.report() for name, stats in sorted(self._roots.items())}
+
+    def reset(self):
+        with self._lock:
+            self._roots.clear()
+
+
+recorder = SpanRecorder()
+
+
+class span:
+    """
+    Context manager timing a synchronous block::
+
+        with span("reviews.load", kind="db"):
+            rows = db.query(...).all()
+
+    Don't ``await`` inside it: other tasks' CPU time would be counted. Use
+    ``profile_span`` on an ``async def`` for awaited work.
+    """
+
+    def __init__(self, name: str, kind: str = "internal", recorder: SpanRecorder = recorder):
+        self._span = Span(name, kind, _current_span.get())
+        self._recorder = recorder
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self._span)
+        self._start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self._span
+
+    def __exit__(self, *exc_info):
+        current = self._span
+        current.cpu = time.thread_time() - self._cpu_start
+        current.wall = current.running = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        current._finish(self._recorder)
+
+
+class _TracedCoroutine:
+    """Drives a coroutine one step at a time, timing each step's CPU and wall time."""
+
+    def __init__(self, coro, current: Span, recorder: SpanRecorder):
+        self.coro = coro
+        self.span = current
+        self.recorder = recorder
+
+    def __await__(self):
+        current, coro = self.span, self.coro
+        token = _current_span.set(current)
+        started = time.perf_counter()
+        value, error = None, None
+        try:
+            while True:
+                step_start, cpu_start = time.perf_counter(), time.thread_time()
+                try:
+                    if error is not None:
+                        yielded = coro.throw(error)
+                    else:
+                        yielded = coro.send(value)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    current.cpu += time.thread_time() - cpu_start
+                    current.running += time.perf_counter() - step_start
+                try:
+                    value, error = (yield yielded), None
+                except GeneratorExit:
+                    coro.close()
+                    raise
+                except BaseException as e:
+                    value, error = None, e
+        finally:
+            current.wall = time.perf_counter() - started
+            _current_span.reset(token)
+            current._finish(self.recorder)
+
+
+def profile_span(name: Optional[str] = None, kind: str = "internal",
+                 recorder: SpanRecorder = recorder) -> Callable:
+    """
+    Decorator recording a span per call of a sync or ``async`` function.
+
+    Coroutines are stepped through directly, so ``cpu`` only includes the
+    function's own steps (and spans nested in it), never other tasks that
+    ran while it awaited. Spans nest through a context variable, so
+    child spans in tasks it creates, or in ``run_in_executor_with_context``
+    calls, attach to it.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                current = Span(span_name, kind, _current_span.get())
+                return await _TracedCoroutine(func(*args, **kwargs), current, recorder)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind, recorder):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_in_executor_with_context(func: Callable, *args, executor=None):
+    """``loop.run_in_executor`` that keeps the caller's span as the parent of ``func``'s spans."""
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, func, *args))
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class recording every request as a root ``endpoint`` span named
+    ``"METHOD /path"``; use with ``APIRouter(route_class=ProfiledRoute)``.
+    The span covers validation, the endpoint and response serialisation.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        span_name = f"{','.join(sorted(self.methods))} {self.path}"
+
+        async def profiled_handler(request):
+            current = Span(span_name, "endpoint", _current_span.get())
+            return await _TracedCoroutine(handler(request), current, recorder)
+        return profiled_handler
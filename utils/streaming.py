@@ -0,0 +1,68 @@
+import json
+from typing import Iterator, List, Optional, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    """Serialise ``obj`` to JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str, separators=(",", ":")).encode()
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str],
+                 default: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Turn a ``fields=a,b,c`` query value into a list of column names.
+
+    Returns ``default`` (every allowed field if not given) when ``fields`` is
+    empty and raises a 400 for names outside ``allowed``.
+    """
+    if not fields:
+        return list(default if default is not None else allowed)
+
+    requested = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in allowed]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return requested
+
+
+def _iter_json_array(engine, statement, chunk_size: int) -> Iterator[bytes]:
+    # Own connection rather than the request session: the body is produced
+    # after the endpoint returns, when request dependencies may be closed.
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(statement)
+        keys = list(result.keys())
+        yield b"["
+        first = True
+        for rows in result.partitions(chunk_size):
+            chunk = b",".join(dumps(dict(zip(keys, row))) for row in rows)
+            if not first:
+                chunk = b"," + chunk
+            first = False
+            yield chunk
+        yield b"]"
+
+
+def stream_rows(engine, statement, chunk_size: int = 500) -> StreamingResponse:
+    """
+    Stream the rows of a Core ``select`` as a JSON array of objects.
+
+    Rows are fetched ``chunk_size`` at a time and encoded straight from the
+    result tuples, bypassing ORM entities and Pydantic validation.
+    """
+    return StreamingResponse(
+        _iter_json_array(engine, statement, chunk_size),
+        media_type="application/json"
+    )
@@ -0,0 +1,419 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from sqlalchemy import event
+
+from utils.auth import require_admin
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+MAX_STATEMENT_LENGTH = 500
+_httpx_instrumented = False
+
+_current_span: contextvars.ContextVar[Optional["TraceSpan"]] = contextvars.ContextVar(
+    "current_trace_span", default=None
+)
+
+
+class TraceSpan:
+    """One operation in a trace; times are epoch seconds."""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind", "service",
+        "start_time", "duration", "attributes", "status", "sampled", "_started"
+    )
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str,
+                 service: Optional[str], sampled: bool, attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.service = service
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self.start_time = time.time()
+        self.duration = 0.0
+        self._started = time.perf_counter()
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self.service,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """``(trace_id, parent_span_id, sampled)`` from a W3C ``traceparent`` header."""
+    match = _TRACEPARENT_RE.match((header or "").strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class RingBufferExporter:
+    """Keeps the most recent ``capacity`` finished spans in memory."""
+
+    def __init__(self, capacity: int = 4096):
+        self._spans = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def export(self, span: TraceSpan):
+        with self._lock:
+            self._spans.append(span.to_dict())
+
+    def spans(self, trace_id: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            spans = list(self._spans)
+        return [span for span in spans if trace_id is None or span["trace_id"] == trace_id]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class NdjsonFileExporter:
+    """
+    Appends finished spans to ``path`` as one JSON object per line. Writes
+    are buffered and flushed at most every ``flush_interval`` seconds.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def export(self, span: TraceSpan):
+        line = json.dumps(span.to_dict(), separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", buffering=1 << 16)
+            self._file.write(line)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Tracer:
+    """
+    Creates spans and hands finished, sampled ones to ``exporters``.
+
+    Sampling is decided once per trace at its root (head-based) with
+    probability ``sample_rate`` and travels with the ``traceparent`` flags,
+    so every service keeps or drops the same traces. Unsampled spans still
+    get ids for propagation but are never exported.
+    """
+
+    def __init__(self, sample_rate: float = 0.1, exporters: Optional[Iterable] = None,
+                 buffer_size: int = 4096):
+        self.sample_rate = sample_rate
+        self.buffer = RingBufferExporter(buffer_size)
+        self.exporters = [self.buffer, *(exporters or [])]
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        path = os.getenv("TRACE_EXPORT_PATH")
+        return cls(
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.1")),
+            exporters=[NdjsonFileExporter(path)] if path else [],
+            buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", "4096"))
+        )
+
+    def begin(self, name: str, kind: str = "internal", service: Optional[str] = None,
+              traceparent: Optional[str] = None, attributes: Optional[dict] = None) -> TraceSpan:
+        """
+        Start a span under the current span, or under ``traceparent`` (an
+        incoming header), or as the root of a new trace. Pair with ``end``.
+        """
+        remote = parse_traceparent(traceparent) if traceparent else None
+        parent = _current_span.get()
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+            service = service or parent.service
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < self.sample_rate
+        return TraceSpan(trace_id, parent_id, name, kind, service, sampled, attributes)
+
+    def end(self, span: TraceSpan, error: Optional[BaseException] = None):
+        span.duration = time.perf_counter() - span._started
+        if error is not None:
+            span.status = "error"
+            span.attributes["error"] = f"{type(error).__name__}: {error}"
+        if not span.sampled:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.warning("Span export failed: %s", e)
+
+    @contextmanager
+    def start_span(self, name: str, kind: str = "internal", **kwargs):
+        """Context manager making the new span current; safe across ``await``."""
+        span = self.begin(name, kind, **kwargs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end(span, e)
+            raise
+        else:
+            self.end(span)
+        finally:
+            _current_span.reset(token)
+
+
+tracer = Tracer.from_env()
+
+
+def current_span() -> Optional[TraceSpan]:
+    return _current_span.get()
+
+
+def inject(headers) -> None:
+    """Add the current span's ``traceparent`` to outgoing ``headers``."""
+    span = _current_span.get()
+    if span is not None:
+        headers["traceparent"] = span.traceparent
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span per HTTP request, continuing the
+    caller's trace when a ``traceparent`` header is present. The response
+    carries the span's ``traceparent`` so callers can look the trace up.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        with tracer.start_span(
+            f"{scope['method']} {scope['path']}", kind="server", service=self.service,
+            traceparent=traceparent
+        ) as span:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.attributes["http.status_code"] = message["status"]
+                    if message["status"] >= 500:
+                        span.status = "error"
+                    message.setdefault("headers", [])
+                    message["headers"] = [
+                        *message["headers"], (b"traceparent", span.traceparent.encode("latin-1"))
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    span.name = f"{scope['method']} {route.path}"
+
+
+def instrument_httpx():
+    """
+    Trace every outbound httpx request as a client span and send its
+    ``traceparent``. Patches ``Client.send`` / ``AsyncClient.send`` once per
+    process, so clients created anywhere are covered. A ``traceparent`` set
+    explicitly on the request is continued rather than replaced.
+    """
+    global _httpx_instrumented
+    if _httpx_instrumented:
+        return
+    _httpx_instrumented = True
+
+    import httpx
+
+    async_send, sync_send = httpx.AsyncClient.send, httpx.Client.send
+
+    def attributes(request):
+        return {"http.method": request.method, "http.url": str(request.url.copy_with(query=None))}
+
+    async def traced_async_send(self, request, **kwargs):
+        with tracer.start_span(
+            f"{request.method} {request.url.host}{request.url.path}", kind="client",
+            traceparent=request.headers.get("traceparent"), attributes=attributes(request)
+        ) as span:
+            request.headers["traceparent"] = span.traceparent
+            response = await async_send(self, request, **kwargs)
+            span.attributes["http.status_code"] = response.status_code
+            return response
+
+    def traced_sync_send(self, request, **kwargs):
+        with tracer.start_span(
+            f"{request.method} {request.url.host}{request.url.path}", kind="client",
+            traceparent=request.headers.get("traceparent"), attributes=attributes(request)
+        ) as span:
+            request.headers["traceparent"] = span.traceparent
+            response = sync_send(self, request, **kwargs)
+            span.attributes["http.status_code"] = response.status_code
+            return response
+
+    httpx.AsyncClient.send = traced_async_send
+    httpx.Client.send = traced_sync_send
+
+
+def instrument_engine(engine, service: Optional[str] = None):
+    """
+    Record each SQL statement run on ``engine`` as a ``db`` child span of
+    the current span. Statements outside a sampled trace cost one context
+    variable lookup.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        context._trace_span = tracer.begin(
+            f"{service or 'db'} {verb}", kind="db", service=service,
+            attributes={
+                "db.statement": statement[:MAX_STATEMENT_LENGTH],
+                "db.executemany": executemany
+            }
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            context._trace_span = None
+            tracer.end(span)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, "_trace_span", None) if context is not None else None
+        if span is not None:
+            context._trace_span = None
+            tracer.end(span, exception_context.original_exception)
+
+
+def critical_path(spans: List[dict]) -> List[dict]:
+    """
+    Walk from the root span through the child that finished last at each
+    level: the chain of spans that determined the trace's end time.
+    ``self_ms`` is the part of each span not covered by its children.
+    """
+    if not spans:
+        return []
+    ids = {span["span_id"] for span in spans}
+    children: Dict[Optional[str], List[dict]] = {}
+    for span in spans:
+        children.setdefault(span["parent_id"] if span["parent_id"] in ids else None, []).append(span)
+
+    def end(span):
+        return span["start_time"] + span["duration_ms"] / 1000
+
+    def self_ms(span):
+        covered, cursor = 0.0, span["start_time"]
+        for child in sorted(children.get(span["span_id"], []), key=lambda c: c["start_time"]):
+            start, stop = max(child["start_time"], cursor), min(end(child), end(span))
+            if stop > start:
+                covered += stop - start
+                cursor = stop
+        return round(max(span["duration_ms"] - covered * 1000, 0.0), 3)
+
+    node = min(children[None], key=lambda span: span["start_time"])
+    path = []
+    while node is not None:
+        path.append({
+            "name": node["name"], "service": node["service"], "kind": node["kind"],
+            "duration_ms": node["duration_ms"], "self_ms": self_ms(node)
+        })
+        node = max(children.get(node["span_id"], []), key=end, default=None)
+    return path
+
+
+def trace_summaries(spans: Iterable[dict], limit: int = 50) -> List[dict]:
+    """One entry per trace, named after its earliest span, slowest first."""
+    roots: Dict[str, dict] = {}
+    for span in spans:
+        current = roots.get(span["trace_id"])
+        if current is None or span["start_time"] < current["start_time"]:
+            roots[span["trace_id"]] = span
+    ranked = sorted(roots.values(), key=lambda span: -span["duration_ms"])[:limit]
+    return [
+        {"trace_id": span["trace_id"], "name": span["name"], "service": span["service"],
+         "duration_ms": span["duration_ms"]}
+        for span in ranked
+    ]
+
+
+def create_tracing_router() -> APIRouter:
+    """
+    Admin endpoints over this process's ring buffer of sampled spans. They
+    only see this service's part of a trace; merge every service's NDJSON
+    export with ``profiling_scripts/merge_traces.py`` for the whole trace.
+    """
+    router = APIRouter(prefix="/admin/traces", dependencies=[Depends(require_admin)])
+
+    @router.get("")
+    def list_traces(limit: int = 50):
+        """Most recent traces with a span in this service, slowest root first."""
+        return trace_summaries(tracer.buffer.spans(), limit)
+
+    @router.get("/{trace_id}")
+    def get_trace(trace_id: str):
+        spans = sorted(tracer.buffer.spans(trace_id), key=lambda span: span["start_time"])
+        if not spans:
+            raise HTTPException(status_code=404, detail="Trace not found")
+        return {"trace_id": trace_id, "spans": spans, "critical_path": critical_path(spans)}
+
+    return router
+
+
+def setup_tracing(app: FastAPI, service: str):
+    """
+    Trace ``app`` as ``service``: server spans for incoming requests,
+    client spans with ``traceparent`` for outbound httpx calls, and the
+    ``/admin/traces`` endpoints. Database statements are traced by
+    ``ServiceDatabase`` engines.
+    """
+    instrument_httpx()
+    app.add_middleware(TracingMiddleware, service=service)
+    app.include_router(create_tracing_router())